@@ -12,6 +12,11 @@
 -- TABLE: options_snapshots
 -- Stores price data scraped from Eurex
 -- This is the main table that the price crawler writes to
+-- Range partitioned by quote_time (monthly by default). The partitions are
+-- created ahead of time and expired by "eurex price crawler/manage_partitions.py";
+-- rows outside every partition land in options_snapshots_default.
+-- An existing unpartitioned table is converted with
+--   python manage_partitions.py --migrate
 -- -----------------------------------------------------------------------------
 CREATE TABLE IF NOT EXISTS options_snapshots (
     -- Timestamps
@@ -43,17 +48,165 @@ CREATE TABLE IF NOT EXISTS options_snapshots (
 
     -- Primary key: unique combination of time + option
     PRIMARY KEY (quote_time, expiry_date, strike, option_type)
-);
+) PARTITION BY RANGE (quote_time);
 
--- Index for fast queries by expiry date
-CREATE INDEX IF NOT EXISTS idx_snapshots_expiry ON options_snapshots(expiry_date);
+-- Catch-all partition, manage_partitions.py moves rows out of it
+CREATE TABLE IF NOT EXISTS options_snapshots_default PARTITION OF options_snapshots DEFAULT;
 
--- Index for fast queries by option type
-CREATE INDEX IF NOT EXISTS idx_snapshots_type ON options_snapshots(option_type);
+-- Index for the history of one option (PriceChart) and per-expiry queries
+CREATE INDEX IF NOT EXISTS idx_snapshots_contract
+ON options_snapshots(expiry_date, option_type, strike, quote_time DESC);
 
 -- Index for recent data queries
 CREATE INDEX IF NOT EXISTS idx_snapshots_quote_time ON options_snapshots(quote_time DESC);
 
+-- -----------------------------------------------------------------------------
+-- TABLE: options_snapshot_state
+-- One row per option, written by the crawler's delta ingest (DELTA_INGEST=1).
+-- value_hash/quote_time describe the last snapshot actually written to
+-- options_snapshots, last_seen the last crawl that saw the option at all.
+-- Unchanged options are not written again, see options_asof() below.
+-- -----------------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS options_snapshot_state (
+    expiry_date DATE NOT NULL,
+    option_type VARCHAR(4) NOT NULL,
+    strike NUMERIC NOT NULL,
+    value_hash TEXT NOT NULL,                      -- md5 of last_trade .. ask
+    quote_time TIMESTAMP WITH TIME ZONE NOT NULL,  -- last written snapshot
+    last_seen TIMESTAMP WITH TIME ZONE NOT NULL,   -- last crawl that saw the option
+    PRIMARY KEY (expiry_date, option_type, strike)
+);
+
+-- -----------------------------------------------------------------------------
+-- TABLE: options_snapshot_ranges
+-- Validity of every snapshot written by the delta ingest: from quote_time up
+-- to last_seen, the last crawl that saw the option with these values.
+-- Snapshots written without delta ingest have no range.
+-- -----------------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS options_snapshot_ranges (
+    expiry_date DATE NOT NULL,
+    option_type VARCHAR(4) NOT NULL,
+    strike NUMERIC NOT NULL,
+    quote_time TIMESTAMP WITH TIME ZONE NOT NULL,  -- the snapshot in options_snapshots
+    last_seen TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (expiry_date, option_type, strike, quote_time)
+);
+
+-- -----------------------------------------------------------------------------
+-- TABLE: options_crawls
+-- Completed delta crawls per expiry, stamped with the earliest quote_time
+-- written for it. A crawl is recorded once all of its rows are written.
+-- -----------------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS options_crawls (
+    expiry_date DATE NOT NULL,
+    quote_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (expiry_date, quote_time)
+);
+
+-- -----------------------------------------------------------------------------
+-- TABLE: options_latest
+-- Newest snapshot of every option, expired or not, one row per contract, like
+-- the previous ROW_NUMBER() view over options_snapshots. Upserted by the
+-- crawler in the same transaction as options_snapshots (db_ingest.write_latest).
+-- With the delta ingest a sealed crawl removes the contracts it no longer saw
+-- (db_ingest.seal_crawl). Backs latest_options below.
+-- -----------------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS options_latest (
+    quote_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    crawl_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    expiry_date DATE NOT NULL,
+    monthly_weekly VARCHAR(10),
+    option_type VARCHAR(4) NOT NULL,
+    strike NUMERIC NOT NULL,
+    last_trade NUMERIC,
+    open_price NUMERIC,
+    high_price NUMERIC,
+    low_price NUMERIC,
+    daily_settlement NUMERIC,
+    last_price NUMERIC,
+    bid NUMERIC,
+    ask NUMERIC,
+    open_interest BIGINT,
+    volume BIGINT,
+    PRIMARY KEY (expiry_date, option_type, strike)
+);
+
+-- One-off backfill from the history (no-op once the crawler has written)
+INSERT INTO options_latest
+SELECT DISTINCT ON (expiry_date, option_type, strike)
+    quote_time, crawl_time, expiry_date, monthly_weekly, option_type, strike,
+    last_trade, open_price, high_price, low_price, daily_settlement,
+    last_price, bid, ask, open_interest, volume
+FROM options_snapshots
+ORDER BY expiry_date, option_type, strike, quote_time DESC
+ON CONFLICT (expiry_date, option_type, strike) DO NOTHING;
+
+-- -----------------------------------------------------------------------------
+-- TABLES: options_bars_1h / options_bars_1d
+-- OHLC bars per option for PriceChart's longer ranges. Recomputed by the
+-- crawler once per crawl for the hours/days it touched ("eurex price crawler/rollups.py",
+-- which also backfills from the history: python rollups.py). With the delta
+-- ingest a contract a crawl saw unchanged still counts as a sample of that
+-- crawl (its snapshot range in options_snapshot_ranges).
+-- Hourly buckets are UTC hours, daily buckets start at midnight Berlin time.
+-- -----------------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS options_bars_1h (
+    bucket TIMESTAMP WITH TIME ZONE NOT NULL,                 -- start of the UTC hour
+    expiry_date DATE NOT NULL,
+    option_type VARCHAR(4) NOT NULL,
+    strike NUMERIC NOT NULL,
+    bid_open NUMERIC, bid_high NUMERIC, bid_low NUMERIC, bid_close NUMERIC,
+    ask_open NUMERIC, ask_high NUMERIC, ask_low NUMERIC, ask_close NUMERIC,
+    mid_open NUMERIC, mid_high NUMERIC, mid_low NUMERIC, mid_close NUMERIC,      -- (bid + ask) / 2
+    last_open NUMERIC, last_high NUMERIC, last_low NUMERIC, last_close NUMERIC,  -- last_price
+    daily_settlement NUMERIC,                      -- last value in the bucket
+    open_interest BIGINT,                          -- last value in the bucket
+    volume BIGINT,                                 -- last value in the bucket
+    samples INTEGER NOT NULL,                      -- snapshots in the bucket
+    first_quote_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_quote_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (bucket, expiry_date, option_type, strike)
+);
+
+CREATE TABLE IF NOT EXISTS options_bars_1d (
+    bucket TIMESTAMP WITH TIME ZONE NOT NULL,                 -- midnight Berlin time
+    expiry_date DATE NOT NULL,
+    option_type VARCHAR(4) NOT NULL,
+    strike NUMERIC NOT NULL,
+    bid_open NUMERIC, bid_high NUMERIC, bid_low NUMERIC, bid_close NUMERIC,
+    ask_open NUMERIC, ask_high NUMERIC, ask_low NUMERIC, ask_close NUMERIC,
+    mid_open NUMERIC, mid_high NUMERIC, mid_low NUMERIC, mid_close NUMERIC,      -- (bid + ask) / 2
+    last_open NUMERIC, last_high NUMERIC, last_low NUMERIC, last_close NUMERIC,  -- last_price
+    daily_settlement NUMERIC,                      -- last value in the bucket
+    open_interest BIGINT,                          -- last value in the bucket
+    volume BIGINT,                                 -- last value in the bucket
+    samples INTEGER NOT NULL,                      -- snapshots in the bucket
+    first_quote_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_quote_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (bucket, expiry_date, option_type, strike)
+);
+
+-- Index for the history of one option
+CREATE INDEX IF NOT EXISTS idx_bars_1h_contract ON options_bars_1h(expiry_date, option_type, strike, bucket);
+CREATE INDEX IF NOT EXISTS idx_bars_1d_contract ON options_bars_1d(expiry_date, option_type, strike, bucket);
+
+-- -----------------------------------------------------------------------------
+-- TABLE: options_snapshots_raw
+-- Cold storage for the raw scraped row (RAW_RETENTION=cold). raw_gz is the
+-- zlib-compressed JSON that would otherwise go into options_snapshots.raw.
+-- Only read when debugging a parse, the dashboard never touches it.
+-- -----------------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS options_snapshots_raw (
+    quote_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    expiry_date DATE NOT NULL,
+    strike NUMERIC NOT NULL,
+    option_type VARCHAR(4) NOT NULL,
+    raw_gz BYTEA NOT NULL,
+    PRIMARY KEY (quote_time, expiry_date, strike, option_type)
+);
+
 -- -----------------------------------------------------------------------------
 -- TABLE: option_margins
 -- Stores margin requirements from Deutsche Börse Prisma API
@@ -69,6 +222,7 @@ CREATE TABLE IF NOT EXISTS option_margins (
     -- Margin values
     initial_margin NUMERIC,               -- Initial margin in EUR
     premium_margin NUMERIC,               -- Premium margin in EUR
+    source VARCHAR(12) NOT NULL DEFAULT 'computed',  -- "computed" (Prisma API) or "interpolated"
 
     -- Metadata
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
@@ -77,6 +231,9 @@ CREATE TABLE IF NOT EXISTS option_margins (
     UNIQUE(expiry_date, option_type, strike)
 );
 
+-- Tables created before margins could be interpolated (MARGIN_INTERPOLATE)
+ALTER TABLE option_margins ADD COLUMN IF NOT EXISTS source VARCHAR(12) NOT NULL DEFAULT 'computed';
+
 -- Index for fast lookups when joining with options_snapshots
 CREATE INDEX IF NOT EXISTS idx_margins_lookup
 ON option_margins(expiry_date, option_type, strike);
@@ -113,18 +270,10 @@ ON bookmarks(user_id);
 -- -----------------------------------------------------------------------------
 -- VIEW: latest_options
 -- Gets only the most recent snapshot for each option
--- This avoids showing duplicate rows from different crawl times
+-- Reads options_latest, so the cost follows the size of the chain and not
+-- the length of the history in options_snapshots
 -- -----------------------------------------------------------------------------
 CREATE OR REPLACE VIEW latest_options AS
-WITH ranked AS (
-    SELECT
-        *,
-        ROW_NUMBER() OVER (
-            PARTITION BY expiry_date, option_type, strike
-            ORDER BY quote_time DESC
-        ) as rn
-    FROM options_snapshots
-)
 SELECT
     quote_time,
     crawl_time,
@@ -142,8 +291,42 @@ SELECT
     last_price,
     bid,
     ask
-FROM ranked
-WHERE rn = 1;
+FROM options_latest;
+
+-- -----------------------------------------------------------------------------
+-- FUNCTION: options_asof(ts)
+-- Price of every unexpired option as of a point in time. With delta ingest a
+-- snapshot stays valid until the next written one, so this takes the latest
+-- snapshot at or before ts, unless a completed crawl of its expiry after the
+-- snapshot's last sighting (options_snapshot_ranges.last_seen) and at or
+-- before ts no longer saw the option. options_asof(now()) returns the same
+-- rows as latest_options ("eurex price crawler/benchmarks/check_asof.py").
+-- Usage: SELECT * FROM options_asof('2025-11-03 14:15+01');
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION options_asof(ts TIMESTAMP WITH TIME ZONE)
+RETURNS SETOF options_snapshots
+LANGUAGE sql STABLE AS $$
+    SELECT o.*
+    FROM (
+        SELECT DISTINCT ON (expiry_date, option_type, strike) *
+        FROM options_snapshots
+        WHERE quote_time <= ts
+          AND expiry_date >= ts::date
+        ORDER BY expiry_date, option_type, strike, quote_time DESC
+    ) o
+    LEFT JOIN options_snapshot_ranges r
+        ON r.expiry_date = o.expiry_date
+        AND r.option_type = o.option_type
+        AND r.strike = o.strike
+        AND r.quote_time = o.quote_time
+    WHERE r.last_seen IS NULL
+       OR NOT EXISTS (
+            SELECT 1 FROM options_crawls c
+            WHERE c.expiry_date = o.expiry_date
+              AND c.quote_time > r.last_seen
+              AND c.quote_time <= ts
+       )
+$$;
 
 -- -----------------------------------------------------------------------------
 -- VIEW: options_with_margins
@@ -169,7 +352,8 @@ SELECT
     o.bid,
     o.ask,
     m.initial_margin,
-    m.premium_margin
+    m.premium_margin,
+    m.source AS margin_source
 FROM latest_options o
 LEFT JOIN option_margins m ON
     o.expiry_date = m.expiry_date AND
@@ -188,6 +372,42 @@ ALTER TABLE options_snapshots ENABLE ROW LEVEL SECURITY;
 CREATE POLICY "Options are publicly readable" ON options_snapshots
     FOR SELECT USING (true);
 
+ALTER TABLE options_latest ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Latest options are publicly readable" ON options_latest
+    FOR SELECT USING (true);
+
+ALTER TABLE options_bars_1h ENABLE ROW LEVEL SECURITY;
+ALTER TABLE options_bars_1d ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Hourly bars are publicly readable" ON options_bars_1h
+    FOR SELECT USING (true);
+
+CREATE POLICY "Daily bars are publicly readable" ON options_bars_1d
+    FOR SELECT USING (true);
+
+-- Partitions are only read through options_snapshots (no policy of their own)
+ALTER TABLE options_snapshots_default ENABLE ROW LEVEL SECURITY;
+
+-- Delta ingest state is readable like the snapshots
+ALTER TABLE options_snapshot_state ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Snapshot state is publicly readable" ON options_snapshot_state
+    FOR SELECT USING (true);
+
+ALTER TABLE options_snapshot_ranges ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Snapshot ranges are publicly readable" ON options_snapshot_ranges
+    FOR SELECT USING (true);
+
+ALTER TABLE options_crawls ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Crawls are publicly readable" ON options_crawls
+    FOR SELECT USING (true);
+
+-- Raw payloads stay private (service role only, no policy)
+ALTER TABLE options_snapshots_raw ENABLE ROW LEVEL SECURITY;
+
 -- Enable RLS on bookmarks (users can only see/edit their own)
 ALTER TABLE bookmarks ENABLE ROW LEVEL SECURITY;
 
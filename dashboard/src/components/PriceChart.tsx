@@ -37,6 +37,21 @@ interface PricePoint {
   daily_settlement: number | null
 }
 
+interface HistoryRow {
+  quote_time: string
+  bid: number | null
+  ask: number | null
+  last_price: number | null
+  daily_settlement: number | null
+}
+
+// Data source per time range: raw snapshots or hourly / daily bars
+const RESOLUTIONS = {
+  today: 'raw',
+  '7d': '1h',
+  '30d': '1d',
+} as const
+
 export default function PriceChart({ expiryDate, strike, optionType }: PriceChartProps) {
   const [data, setData] = useState<PricePoint[]>([])
   const [isLoading, setIsLoading] = useState(true)
@@ -69,17 +84,33 @@ export default function PriceChart({ expiryDate, strike, optionType }: PriceChar
             break
         }
 
-        // Query historical data from options_snapshots
-        const { data: history, error: queryError } = await supabase
-          .from('options_snapshots')
-          .select('quote_time, bid, ask, last_price, daily_settlement')
-          .eq('expiry_date', expiryDate)
-          .eq('strike', strike)
-          .eq('option_type', optionType)
-          .gte('quote_time', startDate.toISOString())
-          .order('quote_time', { ascending: true })
-
-        if (queryError) throw queryError
+        // Today shows every 15-minute snapshot, longer ranges read the
+        // pre-aggregated bars (closing values per hour / day)
+        const resolution = RESOLUTIONS[timeRange]
+        let history: HistoryRow[] | null
+        if (resolution === 'raw') {
+          const result = await supabase
+            .from('options_snapshots')
+            .select('quote_time, bid, ask, last_price, daily_settlement')
+            .eq('expiry_date', expiryDate)
+            .eq('strike', strike)
+            .eq('option_type', optionType)
+            .gte('quote_time', startDate.toISOString())
+            .order('quote_time', { ascending: true })
+          if (result.error) throw result.error
+          history = result.data
+        } else {
+          const result = await supabase
+            .from(resolution === '1h' ? 'options_bars_1h' : 'options_bars_1d')
+            .select('quote_time:bucket, bid:bid_close, ask:ask_close, last_price:last_close, daily_settlement')
+            .eq('expiry_date', expiryDate)
+            .eq('strike', strike)
+            .eq('option_type', optionType)
+            .gte('bucket', startDate.toISOString())
+            .order('bucket', { ascending: true })
+          if (result.error) throw result.error
+          history = result.data
+        }
 
         // Format data for the chart
         const chartData: PricePoint[] = (history || []).map((row) => {
@@ -87,9 +118,11 @@ export default function PriceChart({ expiryDate, strike, optionType }: PriceChar
           return {
             time: row.quote_time,
             displayTime:
-              timeRange === 'today'
+              resolution === 'raw'
                 ? date.toLocaleTimeString('de-DE', { hour: '2-digit', minute: '2-digit' })
-                : date.toLocaleDateString('de-DE', { day: '2-digit', month: '2-digit' }),
+                : resolution === '1h'
+                  ? date.toLocaleString('de-DE', { day: '2-digit', month: '2-digit', hour: '2-digit' })
+                  : date.toLocaleDateString('de-DE', { day: '2-digit', month: '2-digit' }),
             bid: row.bid,
             ask: row.ask,
             last_price: row.last_price,
@@ -47,6 +47,7 @@ export interface OptionMargin {
   exercise_price: number       // Strike price
   initial_margin: number       // Required initial margin in EUR
   premium_margin: number       // Premium margin in EUR
+  source?: string              // "computed" (Prisma API) or "interpolated"
   updated_at?: string          // Last update timestamp
 }
 
@@ -54,6 +55,7 @@ export interface OptionMargin {
 export interface OptionWithMargin extends OptionSnapshot {
   initial_margin?: number | null
   premium_margin?: number | null
+  margin_source?: string | null  // "computed" or "interpolated"
 }
 
 // Bookmark for tracking favorite options
@@ -0,0 +1,161 @@
+"""
+Benchmark: execute_values INSERT vs COPY + staging merge for options_snapshots.
+
+Runs against a local Postgres given by BENCH_DATABASE_URL (never the
+production DATABASE_URL). Tables are created in a throwaway schema
+"bench_ingest" that is dropped at the end. Every size is loaded twice per
+method: once into an empty table (pure inserts) and once more with the same
+keys (all conflicts -> updates).
+
+Before timing, a few awkward records (empty and missing text, quotes,
+commas and newlines in the raw JSON) are loaded with both methods and the
+stored rows must be identical, otherwise the benchmark stops.
+
+    BENCH_DATABASE_URL=postgres://localhost/bench python benchmarks/bench_copy.py --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import psycopg2
+
+import db_ingest
+
+TABLE_SQL = """
+CREATE TABLE options_snapshots (
+    quote_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    crawl_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    expiry_date DATE NOT NULL,
+    monthly_weekly VARCHAR(10),
+    option_type VARCHAR(4) NOT NULL,
+    strike NUMERIC NOT NULL,
+    last_trade NUMERIC,
+    open_price NUMERIC,
+    high_price NUMERIC,
+    low_price NUMERIC,
+    daily_settlement NUMERIC,
+    last_price NUMERIC,
+    bid NUMERIC,
+    ask NUMERIC,
+    open_interest BIGINT,
+    volume BIGINT,
+    raw JSONB,
+    PRIMARY KEY (quote_time, expiry_date, strike, option_type)
+);
+"""
+
+
+def synthetic_records(n):
+    """n records spread over 15-minute snapshots of a 40 expiry x 150 strike chain"""
+    crawl_time = datetime.now(timezone.utc)
+    start = datetime(2025, 1, 6, 8, 0, tzinfo=timezone.utc)
+    per_snapshot = 40 * 150 * 2
+    records = []
+    for i in range(n):
+        snapshot, rest = divmod(i, per_snapshot)
+        expiry, rest = divmod(rest, 300)
+        strike_idx, side = divmod(rest, 2)
+        quote_time = start + timedelta(minutes=15 * snapshot)
+        expiry_date = date(2025, 2, 21) + timedelta(days=7 * expiry)
+        strike = 15000.0 + 50 * strike_idx
+        price = round(1000.0 / (1 + strike_idx), 2)
+        raw = {'strike': strike, 'bid': price, 'ask': price + 0.5}
+        records.append((quote_time, crawl_time, expiry_date, 'monthly', 'CALL' if side == 0 else 'PUT',
+                        strike, price, price, price + 1, price - 1, price, price, price - 0.5, price + 0.5,
+                        100 + strike_idx, strike_idx, json.dumps(raw)))
+    return records
+
+
+def edge_records():
+    """Records whose text and JSON fields are easy to get wrong in CSV"""
+    crawl_time = datetime.now(timezone.utc)
+    quote_time = datetime(2025, 1, 6, 8, 0, tzinfo=timezone.utc)
+    raws = [json.dumps({'note': 'a, "quoted"\nline'}), json.dumps({'strike': '24.000,00'}), None, '']
+    records = []
+    for i, (monthly_weekly, raw) in enumerate(zip(['monthly', '', None, 'weekly'], raws)):
+        records.append((quote_time, crawl_time, date(2025, 2, 21), monthly_weekly, 'CALL', 15000.0 + 50 * i,
+                        None, 1.5, None, 0.0, 2.25, None, 1.0, 1.5, 0 if i else None, 7, raw))
+    return records
+
+
+def stored_rows(cur):
+    cur.execute("SELECT * FROM options_snapshots ORDER BY quote_time, expiry_date, strike, option_type")
+    return cur.fetchall()
+
+
+def check_methods_agree(conn):
+    """Load edge_records with both methods, True if the stored rows are identical"""
+    cur = conn.cursor()
+    stored = {}
+    for method in ("values", "copy"):
+        cur.execute("TRUNCATE options_snapshots")
+        db_ingest.insert_records(cur, edge_records(), method=method)
+        conn.commit()
+        stored[method] = stored_rows(cur)
+    cur.execute("TRUNCATE options_snapshots")
+    conn.commit()
+    cur.close()
+    if stored["values"] != stored["copy"]:
+        print("❌ values and copy store different rows:")
+        for values_row, copy_row in zip(stored["values"], stored["copy"]):
+            if values_row != copy_row:
+                print(f"  values {values_row}\n  copy   {copy_row}")
+        return False
+    print(f"✅ values and copy store identical rows ({len(stored['copy'])} edge cases)")
+    return True
+
+
+def timed_load(conn, records, method):
+    cur = conn.cursor()
+    start = time.perf_counter()
+    db_ingest.insert_records(cur, records, method=method)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    cur.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        sys.exit("Set BENCH_DATABASE_URL to a local scratch database")
+
+    conn = psycopg2.connect(url)
+    cur = conn.cursor()
+    cur.execute("DROP SCHEMA IF EXISTS bench_ingest CASCADE; CREATE SCHEMA bench_ingest; SET search_path TO bench_ingest")
+    cur.execute(TABLE_SQL)
+    conn.commit()
+
+    if not check_methods_agree(conn):
+        cur.execute("DROP SCHEMA IF EXISTS bench_ingest CASCADE")
+        conn.commit()
+        conn.close()
+        sys.exit(1)
+
+    print(f"{'rows':>10}{'method':>8}{'insert s':>10}{'rows/s':>12}{'update s':>10}{'rows/s':>12}")
+    try:
+        for n in args.sizes:
+            records = synthetic_records(n)
+            for method in ("values", "copy"):
+                cur.execute("TRUNCATE options_snapshots")
+                conn.commit()
+                insert_s = timed_load(conn, records, method)
+                update_s = timed_load(conn, records, method)
+                print(f"{n:>10}{method:>8}{insert_s:>10.2f}{n / insert_s:>12.0f}{update_s:>10.2f}{n / update_s:>12.0f}")
+    finally:
+        cur.execute("DROP SCHEMA IF EXISTS bench_ingest CASCADE")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
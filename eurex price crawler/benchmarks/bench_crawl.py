@@ -0,0 +1,185 @@
+"""
+Benchmark: end-to-end crawl against the local Eurex replica (fixture_server.py).
+
+Runs the selected crawl designs against a synthetic chain of --expiries x
+--strikes contracts and reports rows/s, Playwright round trips and harvest
+cycles per expiry (from crawl_metrics), peak RSS of the process tree and
+whether every expected row came back. Rows are not written to the database.
+
+Every run is appended to --results as one JSON line per design; the table
+compares against the last run with the same configuration, so an
+optimization can be checked run over run:
+
+    python benchmarks/bench_crawl.py --expiries 12 --strikes 120 --designs threaded pool async
+    SCROLL_MODE=arrows python benchmarks/bench_crawl.py --designs pool
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import crawl_prices
+import crawl_prices_async
+import expiry_cache
+import page_profile
+from crawl_schedule import SCHEDULER
+from page_profile import PROFILE
+from fixture_server import FixtureServer
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results", "crawl.jsonl")
+DESIGNS = ('threaded', 'network', 'pool', 'async')
+
+
+class RowCollector:
+    """Stands in for save_snapshot_rows, keeps the (contract_date, type, strike) keys"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.keys = set()
+        self.rows = 0
+
+    def __call__(self, all_data, expiry_date):
+        with self._lock:
+            self.rows += len(all_data)
+            self.keys.update((row[2], row[4], str(row[5])) for row in all_data)
+
+
+def run_design(design, args):
+    report = {}
+    if design == 'threaded':
+        crawl_prices.scrape_options_data(report=report)
+    elif design == 'network':
+        crawl_prices.scrape_options_data(engine='network', report=report)
+    elif design == 'pool':
+        crawl_prices.scrape_options_data_pooled(pool_size=args.pool_size, report=report)
+    else:
+        crawl_prices_async.scrape_options_data_async(max_pages=args.async_pages, report=report)
+    return report
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def previous_results(path):
+    """Last result per (design, config) in the results file"""
+    previous = {}
+    if not os.path.exists(path):
+        return previous
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            previous[(result['design'], json.dumps(result['config'], sort_keys=True))] = result
+    return previous
+
+
+def _change(new, old):
+    if not old:
+        return ""
+    return f"{100 * (new - old) / old:+.0f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--designs", nargs="+", choices=DESIGNS, default=['threaded', 'pool'])
+    parser.add_argument("--expiries", type=int, default=12)
+    parser.add_argument("--strikes", type=int, default=120, help="Strikes per expiry (rows = 2 x strikes)")
+    parser.add_argument("--visible-rows", type=int, default=20, help="Rows the replica renders at once")
+    parser.add_argument("--latency-ms", type=int, default=50, help="Delay of every feed response")
+    parser.add_argument("--pool-size", type=int, default=crawl_prices.CRAWL_POOL_SIZE)
+    parser.add_argument("--async-pages", type=int, default=12)
+    parser.add_argument("--expiry-cache", choices=["warm", "off"], default="warm",
+                        help="warm: every design starts from a cached expiry list, off: discovery browser")
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSON-lines file results are appended to")
+    args = parser.parse_args()
+
+    # Benchmark the crawl only
+    crawl_prices.STREAM_INGEST = False
+    collector = RowCollector()
+    crawl_prices.save_snapshot_rows = collector
+    crawl_prices_async.save_snapshot_rows = collector
+
+    # The replica is first party for the lean profile; start from an empty asset cache
+    page_profile.FIRST_PARTY_DOMAINS = page_profile.FIRST_PARTY_DOMAINS + ('localhost',)
+    PROFILE.cache_dir = tempfile.mkdtemp(prefix="bench_crawl_assets_")
+    expiry_cache.EXPIRY_CACHE_PATH = os.path.join(PROFILE.cache_dir, "expiry_cache.json")
+    SCHEDULER.path = os.path.join(PROFILE.cache_dir, "expiry_costs.json")
+    crawl_prices.EXPIRY_CACHE = args.expiry_cache == "warm"
+
+    config = {
+        'expiries': args.expiries,
+        'strikes': args.strikes,
+        'visible_rows': args.visible_rows,
+        'latency_ms': args.latency_ms,
+        'page_profile': 'lean' if PROFILE.enabled else 'full',
+        'extraction': crawl_prices.EXTRACTION_MODE,
+        'scroll': crawl_prices.SCROLL_MODE,
+        'expiry_cache': args.expiry_cache,
+        'schedule': SCHEDULER.mode,
+    }
+    previous = previous_results(args.results)
+    results = []
+    with FixtureServer(args.expiries, args.strikes, args.visible_rows, args.latency_ms) as server:
+        crawl_prices.EUREX_URL = server.url
+        expected = server.expected_keys()
+        buttons = [{'date': d.strftime('%d.%m.%Y'), 'monthly': m} for d, m in server.expiries]
+        for design in args.designs:
+            collector.keys, collector.rows = set(), 0
+            if crawl_prices.EXPIRY_CACHE:
+                expiry_cache.save_expiries(server.url, buttons)
+            report = run_design(design, args)
+            metrics = report.get('metrics', {})
+            results.append({
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'git': git_revision(),
+                'design': report['design'],
+                'config': config,
+                'rows': collector.rows,
+                'missing': len(expected - collector.keys),
+                'unexpected': len(collector.keys - expected),
+                'elapsed_s': report['elapsed_s'],
+                'rows_per_s': round(collector.rows / report['elapsed_s'], 1) if report['elapsed_s'] else None,
+                'round_trips': metrics.get('calls_total'),
+                'cycles_per_expiry': round(metrics.get('cycles', 0) / args.expiries, 1),
+                'peak_rss_mb': report['peak_rss_mb'],
+                'browser_launches': report['browser_launches'],
+                'page_loads': report['page_loads'],
+                'phases_s': metrics.get('phases_s'),
+            })
+
+    os.makedirs(os.path.dirname(args.results), exist_ok=True)
+    with open(args.results, 'a', encoding='utf-8') as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+
+    print(f"\n{'design':<18}{'rows':>7}{'missing':>9}{'rows/s':>9}{'vs last':>9}{'round trips':>13}"
+          f"{'vs last':>9}{'cycles/exp':>12}{'vs last':>9}{'peak RSS MB':>13}{'vs last':>9}{'time s':>8}")
+    for r in results:
+        last = previous.get((r['design'], json.dumps(r['config'], sort_keys=True)), {})
+        print(f"{r['design']:<18}{r['rows']:>7}{r['missing']:>9}{r['rows_per_s'] or 0:>9}"
+              f"{_change(r['rows_per_s'] or 0, last.get('rows_per_s')):>9}{r['round_trips'] or 0:>13}"
+              f"{_change(r['round_trips'] or 0, last.get('round_trips')):>9}{r['cycles_per_expiry']:>12}"
+              f"{_change(r['cycles_per_expiry'], last.get('cycles_per_expiry')):>9}{r['peak_rss_mb']:>13}"
+              f"{_change(r['peak_rss_mb'], last.get('peak_rss_mb')):>9}{r['elapsed_s']:>8}")
+    print(f"Results appended to {args.results}")
+
+    if any(r['missing'] or r['unexpected'] for r in results):
+        print("❌ Some crawls did not return the full chain")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
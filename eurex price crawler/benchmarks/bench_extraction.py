@@ -0,0 +1,71 @@
+"""
+Benchmark: per-cell get_visible_data vs single page.evaluate extraction.
+
+Counts Playwright round trips (every page / element handle method call is one
+IPC message to the browser) and wall time per viewport read.
+
+    python benchmarks/bench_extraction.py --iterations 20
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from playwright.sync_api import sync_playwright
+from crawl_metrics import CountingProxy
+from crawl_prices import EUREX_URL, get_visible_data, get_visible_data_fast
+
+
+def run(extractor, page, iterations):
+    counter = Counter()
+    proxy = CountingProxy(page, lambda name: counter.update([name]))
+    timings = []
+    result = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = extractor(proxy)
+        timings.append(time.perf_counter() - start)
+    round_trips = sum(counter.values()) / iterations
+    return result, round_trips, timings, counter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=EUREX_URL)
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.set_default_timeout(10000)
+        page.goto(args.url, wait_until="domcontentloaded")
+        page.evaluate("document.body.style.zoom = '0.5'")
+        try:
+            page.wait_for_selector("#cookiescript_reject", timeout=2000).click()
+        except Exception:
+            pass
+        page.wait_for_selector("table.react-table", timeout=10000)
+
+        results = {}
+        print(f"{'extractor':<12}{'rows':>8}{'round trips':>14}{'ms/viewport':>14}{'min ms':>10}")
+        for name, extractor in [("dom", get_visible_data), ("evaluate", get_visible_data_fast)]:
+            data, round_trips, timings, _ = run(extractor, page, args.iterations)
+            results[name] = data
+            strikes, calls, puts = data
+            print(f"{name:<12}{len(calls) + len(puts):>8}{round_trips:>14.0f}"
+                  f"{1000 * sum(timings) / len(timings):>14.1f}{1000 * min(timings):>10.1f}")
+
+        browser.close()
+
+    if results["dom"] != results["evaluate"]:
+        print("❌ Extractors returned different data")
+        sys.exit(1)
+    print("✅ Both extractors returned identical data")
+
+
+if __name__ == "__main__":
+    main()
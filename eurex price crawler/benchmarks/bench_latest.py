@@ -0,0 +1,152 @@
+"""
+Benchmark: dashboard view latency as the snapshot history grows, for the old
+ROW_NUMBER() latest_options view vs the ingest-maintained options_latest table.
+
+Runs against a local Postgres given by BENCH_DATABASE_URL in a throwaway
+schema "bench_latest". A chain of --chain contracts is written once per
+15-minute snapshot with db_ingest.write_records (which also maintains
+options_latest); after each history size both versions of
+options_with_margins are queried --repeat times and the median is printed.
+
+    BENCH_DATABASE_URL=postgres://localhost/bench python benchmarks/bench_latest.py --snapshots 10 100 1000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import psycopg2
+
+import db_ingest
+from bench_copy import TABLE_SQL
+
+LATEST_TABLE_SQL = """
+CREATE TABLE options_latest (
+    quote_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    crawl_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    expiry_date DATE NOT NULL,
+    monthly_weekly VARCHAR(10),
+    option_type VARCHAR(4) NOT NULL,
+    strike NUMERIC NOT NULL,
+    last_trade NUMERIC,
+    open_price NUMERIC,
+    high_price NUMERIC,
+    low_price NUMERIC,
+    daily_settlement NUMERIC,
+    last_price NUMERIC,
+    bid NUMERIC,
+    ask NUMERIC,
+    open_interest BIGINT,
+    volume BIGINT,
+    PRIMARY KEY (expiry_date, option_type, strike)
+);
+"""
+
+SCHEMA_SQL = """
+CREATE TABLE option_margins (
+    expiry_date DATE NOT NULL,
+    option_type VARCHAR(4) NOT NULL,
+    strike NUMERIC NOT NULL,
+    initial_margin NUMERIC,
+    premium_margin NUMERIC,
+    UNIQUE (expiry_date, option_type, strike)
+);
+
+CREATE VIEW latest_options_window AS
+WITH ranked AS (
+    SELECT *, ROW_NUMBER() OVER (
+        PARTITION BY expiry_date, option_type, strike ORDER BY quote_time DESC
+    ) AS rn
+    FROM options_snapshots
+)
+SELECT quote_time, expiry_date, option_type, strike, bid, ask, last_price FROM ranked WHERE rn = 1;
+
+CREATE VIEW latest_options_table AS
+SELECT quote_time, expiry_date, option_type, strike, bid, ask, last_price FROM options_latest;
+"""
+
+QUERY_SQL = """
+SELECT o.*, m.initial_margin, m.premium_margin
+FROM {view} o
+LEFT JOIN option_margins m
+    ON o.expiry_date = m.expiry_date AND o.option_type = m.option_type AND o.strike = m.strike
+ORDER BY o.expiry_date, o.strike;
+"""
+
+
+def chain_snapshot(quote_time, chain):
+    """One crawl worth of records: chain contracts spread over 20 expiries"""
+    crawl_time = datetime.now(timezone.utc)
+    per_expiry = max(1, chain // 40)
+    records = []
+    for i in range(chain):
+        expiry, rest = divmod(i, per_expiry * 2)
+        strike_idx, side = divmod(rest, 2)
+        expiry_date = date.today() + timedelta(days=7 * (expiry + 1))
+        strike = 15000.0 + 50 * strike_idx
+        price = round(1000.0 / (1 + strike_idx) + quote_time.minute / 100, 2)
+        records.append((quote_time, crawl_time, expiry_date, 'monthly', 'CALL' if side == 0 else 'PUT',
+                        strike, price, price, price + 1, price - 1, price, 100 + strike_idx, strike_idx,
+                        price, price - 0.5, price + 0.5, None))
+    return records
+
+
+def median_query(cur, view, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cur.execute(QUERY_SQL.format(view=view))
+        cur.fetchall()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chain", type=int, default=6000, help="Contracts per snapshot")
+    parser.add_argument("--snapshots", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Only the tables measured here exist in the bench schema
+    db_ingest.OHLC_ROLLUPS = False
+
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        sys.exit("Set BENCH_DATABASE_URL to a local scratch database")
+
+    conn = psycopg2.connect(url)
+    cur = conn.cursor()
+    cur.execute("DROP SCHEMA IF EXISTS bench_latest CASCADE; CREATE SCHEMA bench_latest; "
+                "SET search_path TO bench_latest")
+    cur.execute(TABLE_SQL)
+    cur.execute(LATEST_TABLE_SQL)
+    cur.execute(SCHEMA_SQL)
+    conn.commit()
+
+    start = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(minutes=15 * max(args.snapshots))
+    written = 0
+    print(f"{'history rows':>14}{'ROW_NUMBER view ms':>20}{'options_latest ms':>19}{'speedup':>9}")
+    try:
+        for target in sorted(args.snapshots):
+            while written < target:
+                quote_time = start + timedelta(minutes=15 * written)
+                db_ingest.write_records(cur, chain_snapshot(quote_time, args.chain), delta=False, retention='always')
+                conn.commit()
+                written += 1
+            cur.execute("ANALYZE options_snapshots; ANALYZE options_latest")
+            window_s = median_query(cur, "latest_options_window", args.repeat)
+            table_s = median_query(cur, "latest_options_table", args.repeat)
+            print(f"{target * args.chain:>14}{window_s * 1000:>20.1f}{table_s * 1000:>19.1f}{window_s / table_s:>8.1f}x")
+    finally:
+        cur.execute("DROP SCHEMA IF EXISTS bench_latest CASCADE")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
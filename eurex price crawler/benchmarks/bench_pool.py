@@ -0,0 +1,65 @@
+"""
+Benchmark: one browser per expiry (scrape_options_data) vs a pool of
+long-lived browsers (scrape_options_data_pooled) vs the asyncio crawler
+(crawl_prices_async).
+
+Reports browser launches, page loads, peak RSS of the whole process tree and
+total crawl time. Rows are not written to the database; the asset cache,
+expiry list and expiry costs of the runs go to a temporary directory, so
+the crawler's own state files are left alone.
+
+    python benchmarks/bench_pool.py --pool-sizes 2 4 8 --async-pages 12
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import crawl_prices
+import crawl_prices_async
+import expiry_cache
+from crawl_schedule import SCHEDULER
+from page_profile import PROFILE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[crawl_prices.CRAWL_POOL_SIZE])
+    parser.add_argument("--async-pages", type=int, nargs="*", default=[])
+    parser.add_argument("--skip-threaded", action="store_true", help="skip the one-browser-per-expiry design")
+    args = parser.parse_args()
+
+    # Benchmark the crawl only
+    crawl_prices.STREAM_INGEST = False
+    crawl_prices.save_snapshot_rows = lambda all_data, expiry_date: None
+    crawl_prices_async.save_snapshot_rows = crawl_prices.save_snapshot_rows
+
+    # Keep benchmark timings out of the real cost history and page profile state
+    PROFILE.cache_dir = tempfile.mkdtemp(prefix="bench_pool_assets_")
+    expiry_cache.EXPIRY_CACHE_PATH = os.path.join(PROFILE.cache_dir, "expiry_cache.json")
+    SCHEDULER.path = os.path.join(PROFILE.cache_dir, "expiry_costs.json")
+
+    reports = []
+    if not args.skip_threaded:
+        report = {}
+        crawl_prices.scrape_options_data(report=report)
+        reports.append(report)
+    for pool_size in args.pool_sizes:
+        report = {}
+        crawl_prices.scrape_options_data_pooled(pool_size=pool_size, report=report)
+        reports.append(report)
+    for max_pages in args.async_pages:
+        report = {}
+        crawl_prices_async.scrape_options_data_async(max_pages=max_pages, report=report)
+        reports.append(report)
+
+    print(f"\n{'design':<16}{'expiries':>9}{'rows':>8}{'launches':>10}{'page loads':>12}{'peak RSS MB':>13}{'time s':>9}")
+    for r in reports:
+        print(f"{r['design']:<16}{r['expiries']:>9}{r['rows']:>8}{r['browser_launches']:>10}"
+              f"{r['page_loads']:>12}{r['peak_rss_mb']:>13}{r['elapsed_s']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Micro-benchmark: row-wise prepare_df/build_records (Series.apply + iterrows,
+as they were before vectorization) vs the vectorized versions in db_ingest.
+
+Builds a synthetic 100k-row chain in the crawler's raw text format (German
+numbers, '-' and '' for missing values), runs both pipelines, checks that
+they produce identical records and prints rows/sec.
+
+    python benchmarks/bench_prepare.py --rows 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import pytz
+
+import db_ingest
+from db_ingest import SNAPSHOT_HEADERS, clean_german_number
+
+
+# --- Previous implementation, kept here as the baseline ------------------
+
+def legacy_prepare_df(df):
+    df = df.copy()
+    df['quote_time'] = pd.to_datetime(
+        df['date'].astype(str) + ' ' + df['time'].astype(str),
+        format='%Y-%m-%d %H:%M',
+        errors='coerce'
+    )
+    berlin = pytz.timezone('Europe/Berlin')
+    df['quote_time'] = df['quote_time'].dt.tz_localize(
+        berlin, ambiguous='infer', nonexistent='shift_forward'
+    ).dt.tz_convert('UTC')
+    df['expiry_date'] = pd.to_datetime(df['contract_date'], format='%d.%m.%Y', errors='coerce').dt.date
+    for col in ['strike', 'last_trade', 'open', 'high', 'low', 'daily_settlement', 'last_price', 'bid', 'ask']:
+        if col in df.columns:
+            df[col] = df[col].apply(clean_german_number)
+    for col in ['open_interest', 'volume']:
+        if col in df.columns:
+            df[col] = df[col].apply(clean_german_number)
+            df[col] = df[col].astype('Int64')
+    return df.rename(columns={'open': 'open_price', 'high': 'high_price', 'low': 'low_price'})
+
+
+def legacy_build_records(df):
+    records = []
+    crawl_time = datetime.now(timezone.utc)
+    for _, row in df.iterrows():
+        raw = row.to_dict()
+
+        def safe_value(val):
+            if pd.isna(val):
+                return None
+            return val
+
+        records.append((
+            row['quote_time'].to_pydatetime() if pd.notna(row['quote_time']) else None,
+            crawl_time,
+            row['expiry_date'],
+            safe_value(row.get('monthly_weekly')),
+            safe_value(row.get('option_type')),
+            safe_value(row.get('strike')),
+            safe_value(row.get('last_trade')),
+            safe_value(row.get('open_price')),
+            safe_value(row.get('high_price')),
+            safe_value(row.get('low_price')),
+            safe_value(row.get('daily_settlement')),
+            safe_value(row.get('open_interest')),
+            safe_value(row.get('volume')),
+            safe_value(row.get('last_price')),
+            safe_value(row.get('bid')),
+            safe_value(row.get('ask')),
+            json.dumps({k: None if pd.isna(v) else v for k, v in raw.items()}, default=str)
+        ))
+    return records
+
+
+# --- Synthetic chain -------------------------------------------------------
+
+def german(value):
+    whole, frac = f"{value:,.2f}".split('.')
+    return whole.replace(',', '.') + ',' + frac
+
+
+def synthetic_chain(n, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        expiry = f"{1 + i % 28:02d}.{1 + (i // 28) % 12:02d}.2026"
+        strike = f"{15000 + 50 * (i % 400):,}".replace(',', '.')
+
+        def price():
+            roll = rng.random()
+            if roll < 0.15:
+                return '-'
+            if roll < 0.2:
+                return ''
+            return german(rng.uniform(0.1, 9000))
+
+        def count():
+            return '-' if rng.random() < 0.2 else f"{rng.randint(0, 250000):,}".replace(',', '.')
+
+        rows.append(['2025-11-03', '14:15', expiry, 'monthly' if i % 3 else 'weekly',
+                     'CALL' if i % 2 else 'PUT', strike,
+                     price(), price(), price(), price(), price(), count(), count(), price(), price(), price()])
+    df = pd.DataFrame(rows, columns=SNAPSHOT_HEADERS)
+    return df.replace({np.nan: None})
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    df = synthetic_chain(args.rows)
+
+    legacy_df, legacy_prepare_s = timed(legacy_prepare_df, df)
+    legacy_records, legacy_build_s = timed(legacy_build_records, legacy_df)
+    new_df, new_prepare_s = timed(db_ingest.prepare_df, df)
+    new_records, new_build_s = timed(db_ingest.build_records, new_df, 'always')
+
+    def without_crawl_time(records):
+        return [rec[:1] + rec[2:] for rec in records]
+
+    identical = without_crawl_time(legacy_records) == without_crawl_time(new_records)
+
+    n = args.rows
+    print(f"{'step':<16}{'row-wise s':>12}{'rows/s':>12}{'vectorized s':>14}{'rows/s':>12}{'speedup':>9}")
+    for step, old, new in [("prepare_df", legacy_prepare_s, new_prepare_s),
+                           ("build_records", legacy_build_s, new_build_s),
+                           ("total", legacy_prepare_s + legacy_build_s, new_prepare_s + new_build_s)]:
+        print(f"{step:<16}{old:>12.2f}{n / old:>12.0f}{new:>14.2f}{n / new:>12.0f}{old / new:>8.1f}x")
+
+    if not identical:
+        print("❌ Vectorized records differ from the row-wise records")
+        sys.exit(1)
+    print("✅ Records are identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: raw payload retention settings (RAW_RETENTION) for options_snapshots.
+
+For always / on_error / cold it builds the records of a synthetic chain
+(a fraction of cells made unparseable so on_error has something to keep)
+and reports build time and raw bytes per row. With BENCH_DATABASE_URL set it
+also ingests them with write_records into a throwaway schema "bench_raw" and
+reports ingest time and on-disk bytes per row (options_snapshots plus
+options_snapshots_raw, indexes and TOAST included).
+
+    python benchmarks/bench_raw_retention.py --rows 100000 --failure-rate 0.01
+    BENCH_DATABASE_URL=postgres://localhost/bench python benchmarks/bench_raw_retention.py
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import psycopg2
+
+import db_ingest
+from bench_copy import TABLE_SQL
+from bench_latest import LATEST_TABLE_SQL
+from bench_prepare import synthetic_chain
+
+COLD_TABLE_SQL = """
+CREATE TABLE options_snapshots_raw (
+    quote_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    expiry_date DATE NOT NULL,
+    strike NUMERIC NOT NULL,
+    option_type VARCHAR(4) NOT NULL,
+    raw_gz BYTEA NOT NULL,
+    PRIMARY KEY (quote_time, expiry_date, strike, option_type)
+);
+"""
+
+SIZE_SQL = """
+SELECT pg_total_relation_size('options_snapshots') + pg_total_relation_size('options_snapshots_raw');
+"""
+
+SETTINGS = ("always", "on_error", "cold")
+
+
+def chain_with_failures(n, rate, seed=2):
+    """Synthetic chain with `rate` of the price cells replaced by garbage"""
+    df = synthetic_chain(n)
+    rng = random.Random(seed)
+    for col in ('last_trade', 'bid', 'ask', 'volume'):
+        hits = [i for i in range(n) if rng.random() < rate]
+        df.loc[hits, col] = 'n/a'
+    # Unique strikes so every row is its own snapshot key
+    df['strike'] = [str(10000 + i) for i in range(n)]
+    return df
+
+
+def raw_bytes(records, setting):
+    if setting == 'cold':
+        _, cold = db_ingest.split_cold_raw(records)
+        return sum(len(c[-1].adapted) for c in cold)
+    return sum(len(r[-1].encode('utf-8')) for r in records if r[-1] is not None)
+
+
+def ingest(conn, records, setting):
+    cur = conn.cursor()
+    cur.execute("TRUNCATE options_snapshots, options_snapshots_raw, options_latest")
+    conn.commit()
+    start = time.perf_counter()
+    db_ingest.write_records(cur, records, delta=False, retention=setting)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    cur.execute(SIZE_SQL)
+    size = cur.fetchone()[0]
+    cur.close()
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--failure-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    n = args.rows
+    df = db_ingest.prepare_df(chain_with_failures(n, args.failure_rate))
+    failed = int(df['unparsed'].notna().sum())
+    print(f"{n} rows, {failed} with at least one unparsed field")
+
+    # Only the tables measured here exist in the bench schema
+    db_ingest.OHLC_ROLLUPS = False
+
+    url = os.getenv("BENCH_DATABASE_URL")
+    conn = None
+    if url:
+        conn = psycopg2.connect(url)
+        cur = conn.cursor()
+        cur.execute("DROP SCHEMA IF EXISTS bench_raw CASCADE; CREATE SCHEMA bench_raw; SET search_path TO bench_raw")
+        cur.execute(TABLE_SQL)
+        cur.execute(COLD_TABLE_SQL)
+        cur.execute(LATEST_TABLE_SQL)
+        conn.commit()
+        cur.close()
+
+    header = f"{'setting':<10}{'build s':>9}{'raw B/row':>11}"
+    if conn:
+        header += f"{'ingest s':>10}{'rows/s':>10}{'disk B/row':>12}"
+    print(header)
+    try:
+        for setting in SETTINGS:
+            start = time.perf_counter()
+            records = db_ingest.build_records(df, setting)
+            build_s = time.perf_counter() - start
+            line = f"{setting:<10}{build_s:>9.2f}{raw_bytes(records, setting) / n:>11.1f}"
+            if conn:
+                ingest_s, size = ingest(conn, records, setting)
+                line += f"{ingest_s:>10.2f}{n / ingest_s:>10.0f}{size / n:>12.1f}"
+            print(line)
+    finally:
+        if conn:
+            cur = conn.cursor()
+            cur.execute("DROP SCHEMA IF EXISTS bench_raw CASCADE")
+            conn.commit()
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
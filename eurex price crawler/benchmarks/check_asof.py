@@ -0,0 +1,218 @@
+"""
+Check: options_asof(ts) against the crawls that were written with the delta
+ingest, and options_asof(now()) against latest_options.
+
+Runs against a local Postgres given by BENCH_DATABASE_URL in a throwaway
+schema "check_asof". The snapshot, state, range and crawl tables and the
+options_asof function are taken from dashboard/database-schema.sql. A small
+chain is crawled every 15 minutes through db_ingest (every crawl split over
+two write batches, like the SnapshotWriter does, then sealed):
+
+  crawl 1  all contracts
+  crawl 2  half of the prices change
+  crawl 3  one contract is missing
+  crawl 4  it is back with unchanged values
+  crawl 5  a new strike is listed
+  crawl 6  the second expiry is not crawled
+
+After the last crawl options_asof is evaluated at and between every crawl
+and must return exactly the contracts and values the latest crawl of each
+expiry saw; options_asof(now()) must equal the unexpired rows of
+options_latest.
+
+    BENCH_DATABASE_URL=postgres://localhost/bench python benchmarks/check_asof.py
+
+With --live the second comparison runs read-only against DATABASE_URL (on
+latest_options).
+"""
+import argparse
+import os
+import re
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import psycopg2
+
+import db_ingest
+from bench_copy import TABLE_SQL
+from bench_latest import LATEST_TABLE_SQL
+
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'dashboard', 'database-schema.sql')
+SCHEMA_TABLES = ('options_snapshot_state', 'options_snapshot_ranges', 'options_crawls')
+
+# Rows in one and not the other, compared on the contract and its snapshot.
+# options_asof only returns unexpired contracts, the latest table keeps them all.
+LATEST_DIFF_SQL = """
+SELECT 'options_asof only', expiry_date, option_type, strike, quote_time FROM (
+    SELECT expiry_date, option_type, strike, quote_time FROM options_asof(now())
+    EXCEPT
+    SELECT expiry_date, option_type, strike, quote_time FROM {latest} WHERE expiry_date >= CURRENT_DATE
+) a
+UNION ALL
+SELECT '{latest} only', expiry_date, option_type, strike, quote_time FROM (
+    SELECT expiry_date, option_type, strike, quote_time FROM {latest} WHERE expiry_date >= CURRENT_DATE
+    EXCEPT
+    SELECT expiry_date, option_type, strike, quote_time FROM options_asof(now())
+) b
+ORDER BY 2, 3, 4;
+"""
+
+ASOF_SQL = """
+SELECT expiry_date, option_type, strike, last_trade, open_price, high_price, low_price, daily_settlement,
+       open_interest, volume, last_price, bid, ask
+FROM options_asof(%s)
+"""
+
+
+def schema_statements():
+    """CREATE TABLE statements of SCHEMA_TABLES and the options_asof function from the schema file"""
+    with open(SCHEMA_FILE, encoding='utf-8') as f:
+        schema = f.read()
+    statements = []
+    for table in SCHEMA_TABLES:
+        match = re.search(rf"CREATE TABLE IF NOT EXISTS {table} \(.*?\n\);", schema, re.S)
+        statements.append(match.group(0))
+    match = re.search(r"CREATE OR REPLACE FUNCTION options_asof\(.*?\n\$\$;", schema, re.S)
+    statements.append(match.group(0))
+    return statements
+
+
+def contract_values(quote_time, crawl_time, expiry_date, option_type, strike, price):
+    return (quote_time, crawl_time, expiry_date, 'monthly', option_type, strike,
+            price, price, price + 1, price - 1, price, 100, 10, price, price - 0.5, price + 0.5, None)
+
+
+def crawls(start):
+    """[(quote_time, records)] of the scenario in the module docstring"""
+    expiries = [date.today() + timedelta(days=30), date.today() + timedelta(days=60)]
+    strikes = [15000.0 + 100 * i for i in range(6)]
+    prices = {(e, t, s): round(1000.0 / (1 + i), 2)
+              for e in expiries for t in ('CALL', 'PUT') for i, s in enumerate(strikes)}
+    missing = (expiries[0], 'CALL', strikes[2])
+    result = []
+    for n in range(6):
+        quote_time = start + timedelta(minutes=15 * n)
+        if n == 1:
+            for i, key in enumerate(sorted(prices)):
+                if i % 2:
+                    prices[key] += 1
+        if n == 4:
+            for e in expiries:
+                for t in ('CALL', 'PUT'):
+                    prices[(e, t, 16000.0)] = 50.0
+        crawl_time = datetime.now(timezone.utc)
+        records = [contract_values(quote_time, crawl_time, e, t, s, p) for (e, t, s), p in sorted(prices.items())
+                   if not (n == 2 and (e, t, s) == missing) and not (n == 5 and e == expiries[1])]
+        result.append((quote_time, records))
+    return result
+
+
+def expected_at(ts, history):
+    """{contract: values} the latest crawl of each expiry at or before ts saw"""
+    latest = {}
+    for quote_time, records in history:
+        if quote_time > ts:
+            break
+        for expiry_date in {rec[2] for rec in records}:
+            latest[expiry_date] = [rec for rec in records if rec[2] == expiry_date]
+    return {(rec[2], rec[4], rec[5]): tuple(float(v) for v in rec[db_ingest.VALUE_SLICE])
+            for records in latest.values() for rec in records}
+
+
+def asof(cur, ts):
+    cur.execute(ASOF_SQL, (ts,))
+    return {(e, t, float(s)): tuple(float(v) for v in values) for e, t, s, *values in cur.fetchall()}
+
+
+def latest_diff(cur, latest):
+    cur.execute(LATEST_DIFF_SQL.format(latest=latest))
+    return cur.fetchall()
+
+
+def check_scenario(url):
+    # Only the tables checked here exist in the check schema
+    db_ingest.OHLC_ROLLUPS = False
+    conn = psycopg2.connect(url)
+    cur = conn.cursor()
+    cur.execute("DROP SCHEMA IF EXISTS check_asof CASCADE; CREATE SCHEMA check_asof; "
+                "SET search_path TO check_asof")
+    cur.execute(TABLE_SQL)
+    cur.execute(LATEST_TABLE_SQL)
+    for statement in schema_statements():
+        cur.execute(statement)
+    conn.commit()
+
+    failures = 0
+    start = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(hours=2)
+    history = crawls(start)
+    try:
+        for quote_time, records in history:
+            half = len(records) // 2
+            for batch in (records[:half], records[half:]):
+                db_ingest.write_records(cur, batch, delta=True, retention='always')
+            db_ingest.seal_crawl(cur, db_ingest.crawl_stamps(records))
+            conn.commit()
+
+        for quote_time, _ in history:
+            for ts in (quote_time, quote_time + timedelta(minutes=5)):
+                expected = expected_at(ts, history)
+                actual = asof(cur, ts)
+                if actual != expected:
+                    failures += 1
+                    print(f"❌ options_asof({ts:%H:%M}): missing {sorted(set(expected) - set(actual))}, "
+                          f"extra {sorted(set(actual) - set(expected))}, "
+                          f"wrong values {sorted(k for k in expected if k in actual and actual[k] != expected[k])}")
+                else:
+                    print(f"✅ options_asof({ts:%H:%M}): {len(actual)} contracts")
+
+        diff = latest_diff(cur, 'options_latest')
+        failures += len(diff)
+        for row in diff:
+            print(f"❌ {row}")
+        if not diff:
+            print("✅ options_asof(now()) equals options_latest")
+    finally:
+        cur.execute("DROP SCHEMA IF EXISTS check_asof CASCADE")
+        conn.commit()
+        conn.close()
+    return failures
+
+
+def check_live(url):
+    conn = psycopg2.connect(url)
+    conn.set_session(readonly=True)
+    try:
+        cur = conn.cursor()
+        diff = latest_diff(cur, 'latest_options')
+    finally:
+        conn.close()
+    for row in diff:
+        print(f"❌ {row}")
+    if not diff:
+        print("✅ options_asof(now()) equals latest_options")
+    return len(diff)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="Compare options_asof(now()) and latest_options "
+                                                            "on DATABASE_URL (read-only)")
+    args = parser.parse_args()
+
+    if args.live:
+        url = os.getenv("DATABASE_URL")
+        if not url:
+            sys.exit("Set DATABASE_URL")
+        failures = check_live(url)
+    else:
+        url = os.getenv("BENCH_DATABASE_URL")
+        if not url:
+            sys.exit("Set BENCH_DATABASE_URL to a local scratch database")
+        failures = check_scenario(url)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Check: replay recorded feeds through the network engine's parser, offline.
+
+Every feed_*.json in --dir (default benchmarks/fixture/feed, recorded with
+crawl_prices.py --engine network --record-feed DIR) is parsed like
+scrape_expiry_network does. A recording fails if it yields no rows, if its
+chain records carry fields FEED_FIELDS does not map, or if it has
+expected_rows and the parsed rows differ. The bundled recording was captured
+from benchmarks/fixture_server.py, so it only checks the parser against the
+synthetic feed; it includes a response of another expiry and a refreshed
+record with a German-formatted strike.
+
+    python benchmarks/check_feed.py
+    python benchmarks/check_feed.py --dir feeds/2025-11-21
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawl_feed import load_recorded_feed, parse_feed_payloads, recorded_expiry_dates, unknown_fields
+
+FEED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixture", "feed")
+
+
+def check_recording(record_dir, expiry_date):
+    """List of problems of one recording, empty if it parses cleanly"""
+    recording = load_recorded_feed(record_dir, expiry_date)
+    bodies = [p['body'] for p in recording['payloads']]
+    rows = parse_feed_payloads(bodies, expiry_date, recording['contract_type'], None, None)
+    problems = []
+    if not rows:
+        problems.append("no rows")
+    unknown = unknown_fields(bodies)
+    if unknown:
+        problems.append(f"unmapped fields {unknown}")
+    if 'expected_rows' in recording and [row[2:] for row in rows] != recording['expected_rows']:
+        problems.append("rows differ from expected_rows")
+    print(f"{'❌' if problems else '✅'} {expiry_date}: {len(rows)} rows from {len(bodies)} payloads"
+          + (f" - {'; '.join(problems)}" if problems else ""))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=FEED_DIR, help="Directory of feed_*.json recordings")
+    args = parser.parse_args()
+
+    expiry_dates = recorded_expiry_dates(args.dir)
+    if not expiry_dates:
+        sys.exit(f"No recordings in {args.dir}")
+    failed = [expiry_date for expiry_date in expiry_dates if check_recording(args.dir, expiry_date)]
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
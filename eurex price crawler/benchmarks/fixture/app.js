@@ -0,0 +1,143 @@
+// Replica of the parts of the Eurex DAX options page the crawler relies on:
+// the contract type / date filter buttons, "Show more", the virtualized call
+// and put tables with the strike column between them, the scroll arrows, and
+// the JSON feed the tables are rendered from. Class names match the live site.
+(() => {
+    const VISIBLE_ROWS = window.FIXTURE_CONFIG.visibleRows;
+    const ROW_HEIGHT = 24;
+
+    // Cell order after the leading icon cell, as on the live site
+    const CALL_FIELDS = ['lastTrade', 'open', 'high', 'low', 'dailySettlement',
+                         'openInterest', 'volume', 'lastPrice', 'bid', 'ask'];
+    const PUT_FIELDS = ['bid', 'ask', 'lastPrice', 'volume', 'openInterest',
+                        'dailySettlement', 'open', 'high', 'low', 'lastTrade'];
+    const COUNT_FIELDS = new Set(['openInterest', 'volume']);
+
+    const DATES = '._filter_contract_date_container_1y9l5_7';
+    const SELECTED = '_selected_15sg6_67';
+
+    const state = {expiry: null, chain: [], first: -1, view: null};
+
+    const el = (tag, className, text) => {
+        const node = document.createElement(tag);
+        if (className) node.className = className;
+        if (text !== undefined) node.textContent = text;
+        return node;
+    };
+
+    const format = (value, field) => {
+        if (value === null || value === undefined) return '-';
+        const digits = COUNT_FIELDS.has(field) ? 0 : 2;
+        return value.toLocaleString('de-DE', {minimumFractionDigits: digits, maximumFractionDigits: digits});
+    };
+
+    const buttonDate = (iso) => iso.split('-').reverse().join('.');
+
+    function fillTable(container, sides, fields, first) {
+        const table = container.querySelector('table');
+        table.style.top = (first * ROW_HEIGHT) + 'px';
+        table.tBodies[0].replaceChildren(...sides.map((side) => {
+            const row = el('tr');
+            row.appendChild(el('td', '_icon_cell_1htfc_90', ''));
+            for (const field of fields) {
+                row.appendChild(el('td', null, format(side ? side[field] : null, field)));
+            }
+            return row;
+        }));
+    }
+
+    // Only VISIBLE_ROWS rows exist in the DOM, re-rendered on every scroll
+    function renderWindow(first) {
+        const total = state.chain.length;
+        first = Math.max(0, Math.min(first, total - VISIBLE_ROWS));
+        if (first === state.first) return;
+        state.first = first;
+
+        const rows = state.chain.slice(first, first + VISIBLE_ROWS);
+        const {calls, puts, strikes, up, down} = state.view;
+        fillTable(calls, rows.map((r) => r.call), CALL_FIELDS, first);
+        fillTable(puts, rows.map((r) => r.put), PUT_FIELDS, first);
+        strikes.replaceChildren(...rows.map((r) => el('div', '_stroke_cell_1xods_68', format(r.strike, 'strike'))));
+        up.style.visibility = first > 0 ? 'visible' : 'hidden';
+        down.style.visibility = first + VISIBLE_ROWS < total ? 'visible' : 'hidden';
+    }
+
+    function scrollContainer(side) {
+        const container = el('div', '_scrollable_table_container_1htfc_71');
+        container.dataset.scrollDisabled = side;
+        container.style.height = (Math.min(VISIBLE_ROWS, state.chain.length) * ROW_HEIGHT) + 'px';
+        const spacer = el('div', '_spacer_1htfc_80');
+        spacer.style.height = (state.chain.length * ROW_HEIGHT) + 'px';
+        const table = el('table', 'react-table');
+        table.appendChild(el('tbody'));
+        spacer.appendChild(table);
+        container.appendChild(spacer);
+        return container;
+    }
+
+    function renderChain(root) {
+        const calls = scrollContainer('forward');
+        const puts = scrollContainer('back');
+        const strikes = el('div', '_strike_column_1xods_60');
+        const up = el('div', '_arrow_1htfc_32 _arrow_top_1htfc_35', '▲');
+        const down = el('div', '_arrow_1htfc_32 _arrow_bottom_1htfc_42', '▼');
+        const row = el('div', '_tables_row_1htfc_20');
+        row.append(calls, strikes, puts);
+        root.replaceChildren(up, row, down);
+
+        state.view = {calls, puts, strikes, up, down};
+        state.first = -1;
+
+        // Both tables always show the same strikes
+        const sync = (source, other) => () => {
+            if (other.scrollTop !== source.scrollTop) other.scrollTop = source.scrollTop;
+            renderWindow(Math.floor(source.scrollTop / ROW_HEIGHT));
+        };
+        calls.addEventListener('scroll', sync(calls, puts));
+        puts.addEventListener('scroll', sync(puts, calls));
+        up.addEventListener('click', () => { calls.scrollTop -= ROW_HEIGHT; });
+        down.addEventListener('click', () => { calls.scrollTop += ROW_HEIGHT; });
+        renderWindow(0);
+    }
+
+    async function selectExpiry(button) {
+        for (const other of document.querySelectorAll(DATES + ' button')) {
+            other.classList.remove(SELECTED);
+        }
+        button.classList.add(SELECTED);
+        const expiry = button.dataset.expiry;
+        state.expiry = expiry;
+
+        // No table while loading, so waiting for table.react-table waits for the new chain
+        const root = document.getElementById('chain');
+        root.replaceChildren(el('div', '_loading_1htfc_5', 'Loading...'));
+        const response = await fetch('/api/chain?expiry=' + expiry);
+        const payload = await response.json();
+        if (state.expiry !== expiry) return;  // a later click won
+        state.chain = payload.data;
+        renderChain(root);
+    }
+
+    async function init() {
+        const dates = document.querySelector(DATES);
+        const showMore = document.querySelector('._showMoreLessButton_15sg6_121');
+        showMore.addEventListener('click', () => {
+            const expanded = dates.classList.toggle('_expanded');
+            showMore.textContent = expanded ? 'Show less' : 'Show more';
+        });
+
+        const response = await fetch('/api/expiries');
+        const payload = await response.json();
+        for (const expiry of payload.expiries) {
+            const button = el('button', '_filterButton_15sg6_42' + (expiry.monthly ? ' _monthly_15sg6_63' : ''),
+                              buttonDate(expiry.date));
+            button.dataset.expiry = expiry.date;
+            button.addEventListener('click', () => selectExpiry(button));
+            dates.appendChild(button);
+        }
+        const first = dates.querySelector('button');
+        if (first) await selectExpiry(first);
+    }
+
+    init();
+})();
@@ -0,0 +1,10 @@
+// Stand-in for the third-party cookie banner of the live site
+(() => {
+    const banner = document.createElement('div');
+    banner.id = 'cookiescript_injected';
+    banner.innerHTML = 'Cookies <button id="cookiescript_accept">Accept</button> <button id="cookiescript_reject">Reject</button>';
+    for (const button of banner.querySelectorAll('button')) {
+        button.addEventListener('click', () => banner.remove());
+    }
+    document.body.appendChild(banner);
+})();
@@ -0,0 +1,220 @@
+"""
+Synthetic model of the Eurex DAX options page for offline benchmarks.
+
+Serves benchmarks/fixture/ (page, script, stylesheet, cookie banner) and a
+JSON feed the page renders its tables from, for a synthetic but deterministic
+chain: --expiries weekly Friday expiries (third Fridays flagged monthly) with
+--strikes strikes each around a fixed spot. It reuses the selectors and class
+names crawl_prices.py looks for, so the dom and network engines run against
+it unchanged; --latency-ms delays every feed response. The virtualized
+scrolling and the feed format were made up for the benchmark and have not
+been compared with a capture of the live page, so results say how the
+engines behave on this model, not on eurex.com.
+
+The cookie banner script is served from 127.0.0.1 while the page is opened as
+localhost, so the lean page profile blocks it as a third party like the real
+cookiescript (add 'localhost' to page_profile.FIRST_PARTY_DOMAINS).
+
+    python benchmarks/fixture_server.py --port 8765 --expiries 12 --strikes 120
+    EUREX_URL=http://localhost:8765/ex-de/maerkte/idx/dax/DAX-Optionen-141164 python crawl_prices.py
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixture")
+PAGE_PATH = "/ex-de/maerkte/idx/dax/DAX-Optionen-141164"
+CONTENT_TYPES = {'.html': 'text/html', '.js': 'application/javascript', '.css': 'text/css'}
+
+SPOT = 24000.0
+STRIKE_STEP = 50
+VOLATILITY = 0.18
+
+
+def expiry_dates(count, today=None):
+    """(date, monthly) for the next count Fridays, monthly = third Friday of the month"""
+    today = today or date.today()
+    friday = today + timedelta(days=(4 - today.weekday()) % 7 or 7)
+    expiries = []
+    for i in range(count):
+        expiry = friday + timedelta(weeks=i)
+        expiries.append((expiry, 15 <= expiry.day <= 21))
+    return expiries
+
+
+def _quote(price, seed):
+    price = max(round(price, 1), 0.1)
+    spread = max(round(price * 0.01, 1), 0.1)
+    traded = seed % 5 != 0  # every fifth contract has no trade today
+    return {
+        'lastTrade': price if traded else None,
+        'open': round(price * 1.02, 1) if traded else None,
+        'high': round(price * 1.05, 1) if traded else None,
+        'low': round(price * 0.97, 1) if traded else None,
+        'dailySettlement': price,
+        'openInterest': 100 + (seed * 37) % 5000,
+        'volume': (seed * 13) % 400 if traded else None,
+        'lastPrice': price if traded else None,
+        'bid': round(price - spread, 1) if price > spread else None,
+        'ask': round(price + spread, 1),
+    }
+
+
+def option_chain(expiry, strikes, today=None):
+    """Feed records (one per strike with nested call/put) for one expiry"""
+    today = today or date.today()
+    years = max((expiry - today).days, 1) / 365
+    width = SPOT * VOLATILITY * math.sqrt(years)
+    records = []
+    for i in range(strikes):
+        strike = SPOT + STRIKE_STEP * (i - strikes // 2)
+        time_value = 0.4 * width * math.exp(-((strike - SPOT) / width) ** 2 / 2)
+        records.append({
+            'strike': strike,
+            'contractDate': expiry.isoformat(),
+            'call': _quote(max(SPOT - strike, 0) + time_value, i),
+            'put': _quote(max(strike - SPOT, 0) + time_value, i + 1),
+        })
+    return records
+
+
+class FixtureServer:
+    """
+    with FixtureServer(expiries=12, strikes=120) as server:
+        crawl_prices.EUREX_URL = server.url
+    """
+
+    def __init__(self, expiries=12, strikes=120, visible_rows=20, latency_ms=0, port=0):
+        self.expiries = expiry_dates(expiries)
+        self.strikes = strikes
+        self.visible_rows = visible_rows
+        self.latency = latency_ms / 1000
+        self.port = port
+        self.requests = 0
+        self._chains = {expiry.isoformat(): json.dumps({'data': option_chain(expiry, strikes)}).encode()
+                        for expiry, _ in self.expiries}
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://localhost:{self.port}{PAGE_PATH}"
+
+    def expected_keys(self):
+        """(contract_date, option_type, strike) of every row a complete crawl returns"""
+        keys = set()
+        for expiry, _ in self.expiries:
+            for i in range(self.strikes):
+                strike = str(int(SPOT + STRIKE_STEP * (i - self.strikes // 2)))
+                keys.add((expiry.strftime('%d.%m.%Y'), 'CALL', strike))
+                keys.add((expiry.strftime('%d.%m.%Y'), 'PUT', strike))
+        return keys
+
+    def start(self):
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                fixture.requests += 1
+                fixture.handle(self)
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- routes -----------------------------------------------------------
+
+    def _static(self, name):
+        path = os.path.join(FIXTURE_DIR, os.path.basename(name))
+        with open(path, 'rb') as f:
+            body = f.read()
+        if name == 'index.html':
+            body = (body.decode('utf-8')
+                    .replace('{{visible_rows}}', str(self.visible_rows))
+                    .replace('{{banner_origin}}', f"http://127.0.0.1:{self.port}")
+                    .encode('utf-8'))
+        return CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream'), body
+
+    def handle(self, request):
+        parsed = urlparse(request.path)
+        try:
+            if parsed.path in ('/', PAGE_PATH):
+                content_type, body = self._static('index.html')
+            elif parsed.path.startswith('/static/'):
+                content_type, body = self._static(parsed.path[len('/static/'):])
+            elif parsed.path == '/api/expiries':
+                time.sleep(self.latency)
+                content_type = 'application/json'
+                body = json.dumps({'expiries': [{'date': d.isoformat(), 'monthly': m}
+                                                for d, m in self.expiries]}).encode()
+            elif parsed.path == '/api/chain':
+                time.sleep(self.latency)
+                expiry = parse_qs(parsed.query).get('expiry', [''])[0]
+                content_type, body = 'application/json', self._chains[expiry]
+            else:
+                raise KeyError(parsed.path)
+        except (KeyError, OSError):
+            request.send_error(404)
+            return
+
+        # ETags let the lean profile revalidate its cached script and stylesheet
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if request.headers.get('if-none-match') == etag:
+            request.send_response(304)
+            request.send_header('ETag', etag)
+            request.end_headers()
+            return
+        request.send_response(200)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        request.send_header('ETag', etag)
+        request.send_header('Cache-Control', 'no-cache')
+        request.end_headers()
+        request.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--expiries", type=int, default=12)
+    parser.add_argument("--strikes", type=int, default=120, help="Strikes per expiry")
+    parser.add_argument("--visible-rows", type=int, default=20, help="Rows the tables render at once")
+    parser.add_argument("--latency-ms", type=int, default=0, help="Delay of every feed response")
+    args = parser.parse_args()
+
+    server = FixtureServer(args.expiries, args.strikes, args.visible_rows, args.latency_ms, args.port).start()
+    print(f"Serving {args.expiries} expiries x {args.strikes} strikes at {server.url} (Ctrl+C stops)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
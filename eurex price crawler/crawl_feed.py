@@ -0,0 +1,132 @@
+# crawl_feed.py
+"""
+Parsing and recording of the options table's data feed (the network engine
+of crawl_prices.py), importable without a browser.
+
+The parser expects JSON fetched per expiry: a list of per-strike records
+with the contract date and nested 'call' / 'put' quote objects. That shape
+and the names in FEED_FIELDS are the ones of the synthetic feed served by
+benchmarks/fixture_server.py; the bundled recording in
+benchmarks/fixture/feed/ was captured from that server, not from eurex.com.
+Nothing here has been checked against the live feed, so the network engine
+is experimental until a --record-feed capture of the live page is checked in
+and passes benchmarks/check_feed.py (which replays recordings offline and
+reports fields the parser does not know).
+"""
+import json
+import os
+from datetime import datetime
+
+from db_ingest import clean_german_number
+
+FEED_FIELDS = {
+    'strike': 'strike',
+    'contract_date': 'contractDate',
+    'last_trade': 'lastTrade',
+    'open': 'open',
+    'high': 'high',
+    'low': 'low',
+    'daily_settlement': 'dailySettlement',
+    'open_interest': 'openInterest',
+    'volume': 'volume',
+    'last_price': 'lastPrice',
+    'bid': 'bid',
+    'ask': 'ask',
+}
+PRICE_FIELDS = ['last_trade', 'open', 'high', 'low', 'daily_settlement',
+                'open_interest', 'volume', 'last_price', 'bid', 'ask']
+SIDES = (('call', 'CALL'), ('put', 'PUT'))
+
+
+def normalize_expiry(value):
+    """Feed dates (2025-11-21, 20251121, 21.11.2025) -> 21.11.2025 as shown on the buttons"""
+    if value is None:
+        return None
+    text = str(value)[:10]
+    for fmt in ('%Y-%m-%d', '%Y%m%d', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(text, fmt).strftime('%d.%m.%Y')
+        except ValueError:
+            continue
+    return None
+
+
+def iter_feed_records(payload):
+    """Yield every dict in the payload that looks like a per-strike chain record"""
+    if isinstance(payload, dict):
+        if FEED_FIELDS['strike'] in payload:
+            yield payload
+        else:
+            for value in payload.values():
+                yield from iter_feed_records(value)
+    elif isinstance(payload, list):
+        for item in payload:
+            yield from iter_feed_records(item)
+
+
+def parse_feed_payloads(payloads, expiry_date, contract_type, scrape_date, scrape_time):
+    """
+    Build SNAPSHOT_HEADERS rows for one expiry from captured feed payloads.
+
+    Records of other expiries are skipped. Strikes may come as numbers or
+    in German format (24.000,00). Later payloads overwrite earlier ones, so
+    a refreshed response wins.
+    """
+    chain = {}
+    for payload in payloads:
+        for record in iter_feed_records(payload):
+            record_expiry = normalize_expiry(record.get(FEED_FIELDS['contract_date']))
+            if record_expiry and record_expiry != expiry_date:
+                continue
+            strike = clean_german_number(record.get(FEED_FIELDS['strike']))
+            if strike is None:
+                continue
+            for key, option_type in SIDES:
+                side = record.get(key)
+                if isinstance(side, dict):
+                    chain[(strike, option_type)] = [side.get(FEED_FIELDS[field]) for field in PRICE_FIELDS]
+
+    rows = []
+    for (strike, option_type), values in sorted(chain.items()):
+        strike_text = str(int(strike)) if strike.is_integer() else str(strike)
+        rows.append([scrape_date, scrape_time, expiry_date, contract_type, option_type, strike_text] + values)
+    return rows
+
+
+def unknown_fields(payloads):
+    """Keys of the chain records (and their call/put objects) that FEED_FIELDS does not map"""
+    known = set(FEED_FIELDS.values()) | {key for key, _ in SIDES}
+    unknown = set()
+    for payload in payloads:
+        for record in iter_feed_records(payload):
+            unknown.update(key for key in record if key not in known)
+            for key, _ in SIDES:
+                if isinstance(record.get(key), dict):
+                    unknown.update(f"{key}.{field}" for field in record[key] if field not in known)
+    return sorted(unknown)
+
+
+def _feed_path(record_dir, expiry_date):
+    return os.path.join(record_dir, f"feed_{expiry_date.replace('.', '')}.json")
+
+
+def record_feed(payloads, record_dir, expiry_date, contract_type):
+    os.makedirs(record_dir, exist_ok=True)
+    path = _feed_path(record_dir, expiry_date)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'expiry_date': expiry_date, 'contract_type': contract_type, 'payloads': payloads}, f)
+    return path
+
+
+def load_recorded_feed(record_dir, expiry_date):
+    with open(_feed_path(record_dir, expiry_date), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def recorded_expiry_dates(record_dir):
+    """Expiry dates available in a recording directory, in chronological order"""
+    dates = []
+    for name in os.listdir(record_dir):
+        if name.startswith('feed_') and name.endswith('.json'):
+            dates.append(datetime.strptime(name[5:13], '%d%m%Y'))
+    return [d.strftime('%d.%m.%Y') for d in sorted(dates)]
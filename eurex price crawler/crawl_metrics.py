@@ -0,0 +1,255 @@
+# crawl_metrics.py
+"""
+Per-expiry phase timings and Playwright call counts for the crawler.
+
+Every scrape runs inside METRICS.expiry(expiry_date); within it
+  - `with METRICS.phase('goto'):` adds the wall time of the block to that
+    phase of the current expiry
+  - pages returned by METRICS.instrument(page) count every Page /
+    ElementHandle method call (query_selector*, inner_text, click,
+    is_visible, evaluate, ...), each one is a round trip to the browser
+Work outside an expiry (browser launch and page load, the streaming
+writer's flushes, ...) goes to its own scope, '(run)' by default. An expiry's
+scope starts when its date button is selected, in every executor, and its
+wall time is always recorded (seconds_in) as the expiry's cost for
+crawl_schedule, even with CRAWL_METRICS=0.
+
+The current expiry lives in a ContextVar, so threads and asyncio tasks each
+see their own. crawl_report() prints summary_table() and writes one JSON line
+per scope plus a run line to CRAWL_METRICS_DIR/crawl_<timestamp>.jsonl.
+
+Overhead is a perf_counter() pair and a lock per phase and a counter bump per
+Playwright call (microseconds against milliseconds for the IPC itself), so it
+stays on by default; CRAWL_METRICS=0 turns it off.
+"""
+import contextvars
+import inspect
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+CRAWL_METRICS = os.getenv("CRAWL_METRICS", "1") == "1"
+CRAWL_METRICS_DIR = os.getenv("CRAWL_METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics"))
+
+RUN_SCOPE = '(run)'
+
+# Column order of the summary table, phases that never ran are left out
+PHASES = ('launch', 'goto', 'cookie', 'table_wait', 'show_more', 'select', 'scroll_top', 'contract_info',
+          'harvest', 'scroll', 'extract', 'process', 'emit', 'prepare', 'archive', 'db_write', 'close')
+CALLS = ('query_selector', 'query_selector_all', 'inner_text', 'click', 'is_visible', 'evaluate')
+
+_scope = contextvars.ContextVar('crawl_scope', default=RUN_SCOPE)
+
+
+class CountingProxy:
+    """
+    Wraps a Page/ElementHandle and reports every method call made through it
+    to on_call(name). Element handles it returns are wrapped as well; works
+    for both the sync and the async Playwright API.
+    """
+
+    def __init__(self, target, on_call):
+        self._target = target
+        self._on_call = on_call
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            self._on_call(name)
+            result = attr(*args, **kwargs)
+            if inspect.isawaitable(result):
+                return _wrap_awaitable(result, self._on_call)
+            return _wrap(result, self._on_call)
+        return wrapper
+
+
+def _wrap(result, on_call):
+    if isinstance(result, list):
+        return [_wrap(item, on_call) for item in result]
+    if hasattr(result, 'inner_text'):  # ElementHandle
+        return CountingProxy(result, on_call)
+    return result
+
+
+async def _wrap_awaitable(awaitable, on_call):
+    return _wrap(await awaitable, on_call)
+
+
+class CrawlMetrics:
+    def __init__(self, enabled=CRAWL_METRICS, report_dir=CRAWL_METRICS_DIR):
+        self.enabled = enabled
+        self.report_dir = report_dir
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.phases = defaultdict(Counter)   # scope -> phase -> seconds
+            self.calls = defaultdict(Counter)    # scope -> method -> calls
+            self.rows = Counter()                # scope -> rows scraped
+            self.cycles = Counter()              # scope -> harvest scroll/extract cycles
+            self.seconds = Counter()             # scope -> wall seconds inside expiry()
+            self.order = []                      # scopes in the order they started
+
+    def _touch(self, scope):
+        if scope not in self.phases:
+            self.order.append(scope)
+            self.phases[scope] = Counter()
+
+    # --- recording --------------------------------------------------------
+
+    @contextmanager
+    def expiry(self, expiry_date):
+        """Attribute everything inside the block to expiry_date"""
+        token = _scope.set(expiry_date)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+            with self._lock:
+                self.seconds[expiry_date] += time.perf_counter() - start
+
+    def seconds_in(self, expiry_date):
+        """Wall seconds spent inside expiry(expiry_date) so far"""
+        with self._lock:
+            return self.seconds[expiry_date]
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        scope = _scope.get()
+        with self._lock:
+            self._touch(scope)
+            self.phases[scope][name] += seconds
+
+    def count_call(self, name):
+        scope = _scope.get()
+        with self._lock:
+            self._touch(scope)
+            self.calls[scope][name] += 1
+
+    def add_rows(self, rows):
+        scope = _scope.get()
+        with self._lock:
+            self._touch(scope)
+            self.rows[scope] += rows
+
+    def add_cycles(self, cycles):
+        scope = _scope.get()
+        with self._lock:
+            self._touch(scope)
+            self.cycles[scope] += cycles
+
+    def instrument(self, page):
+        """Page whose Playwright calls are counted per expiry (page itself when disabled)"""
+        if not self.enabled:
+            return page
+        return CountingProxy(page, self.count_call)
+
+    # --- reporting --------------------------------------------------------
+
+    def scopes(self):
+        """One dict per scope (expiry, '(run)', ...) in the order they started"""
+        with self._lock:
+            records = []
+            for scope in self.order:
+                phases = {k: round(v, 3) for k, v in self.phases[scope].items()}
+                calls = dict(self.calls[scope])
+                records.append({
+                    'scope': scope,
+                    'rows': self.rows[scope],
+                    'cycles': self.cycles[scope],
+                    'wall_s': round(self.seconds[scope], 3),
+                    'phases_s': phases,
+                    'phase_total_s': round(sum(phases.values()), 3),
+                    'calls': calls,
+                    'calls_total': sum(calls.values()),
+                })
+            return records
+
+    def summary(self):
+        """Phase seconds and call counts summed over all scopes"""
+        phases, calls = Counter(), Counter()
+        cycles = 0
+        for record in self.scopes():
+            phases.update(record['phases_s'])
+            calls.update(record['calls'])
+            cycles += record['cycles']
+        return {
+            'cycles': cycles,
+            'phases_s': {k: round(v, 2) for k, v in phases.items()},
+            'calls': dict(calls),
+            'calls_total': sum(calls.values()),
+        }
+
+    def summary_table(self):
+        """Human readable table: seconds per phase and calls per method, one line per scope"""
+        records = self.scopes()
+        if not records:
+            return "(no crawl metrics recorded)"
+        used = {name for r in records for name in r['phases_s']}
+        phases = [p for p in PHASES if p in used] + sorted(used - set(PHASES))
+        width = max(12, max(len(r['scope']) for r in records) + 2)
+
+        header = f"{'scope':<{width}}{'rows':>7}" + "".join(f"{p[:10]:>11}" for p in phases) + f"{'total s':>10}"
+        header += "".join(f"{c.replace('query_selector', 'qs')[:10]:>11}" for c in CALLS) + f"{'calls':>8}"
+        lines = [header, "-" * len(header)]
+        totals = {'rows': 0, 'phases': Counter(), 'calls': Counter()}
+        for r in records:
+            line = f"{r['scope']:<{width}}{r['rows']:>7}"
+            line += "".join(f"{r['phases_s'].get(p, 0):>11.2f}" for p in phases)
+            line += f"{r['phase_total_s']:>10.2f}"
+            line += "".join(f"{r['calls'].get(c, 0):>11}" for c in CALLS) + f"{r['calls_total']:>8}"
+            lines.append(line)
+            totals['rows'] += r['rows']
+            totals['phases'].update(r['phases_s'])
+            totals['calls'].update(r['calls'])
+
+        line = f"{'total':<{width}}{totals['rows']:>7}"
+        line += "".join(f"{totals['phases'][p]:>11.2f}" for p in phases)
+        line += f"{sum(totals['phases'].values()):>10.2f}"
+        line += "".join(f"{totals['calls'][c]:>11}" for c in CALLS) + f"{sum(totals['calls'].values()):>8}"
+        lines += ["-" * len(header), line]
+        return "\n".join(lines)
+
+    def write_report(self, run, path=None):
+        """
+        Write the run report as JSON lines: first {'type': 'run', **run},
+        then one {'type': 'scope', ...} line per expiry / scope.
+        Returns the path, None when disabled or the file could not be written.
+        """
+        if not self.enabled:
+            return None
+        if path is None:
+            path = os.path.join(self.report_dir, f"crawl_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(dict({'type': 'run'}, **run), default=str) + "\n")
+                for record in self.scopes():
+                    f.write(json.dumps(dict({'type': 'scope'}, **record)) + "\n")
+        except OSError as e:
+            print(f"⚠️ Could not write crawl metrics to {path}: {e}")
+            return None
+        return path
+
+
+# Shared by every scrape of the process
+METRICS = CrawlMetrics()
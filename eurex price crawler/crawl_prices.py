@@ -4,23 +4,30 @@ from datetime import datetime
 import pandas as pd
 import os
 import sys
-from db_ingest import upsert_snapshots
+from db_ingest import upsert_snapshots, SnapshotWriter, SNAPSHOT_HEADERS
+from page_profile import PROFILE
+from db_pool import POOL
+from crawl_metrics import METRICS
+from crawl_schedule import SCHEDULER
+from expiry_cache import EXPIRY_CACHE, ExpiryCheck, load_expiries, save_expiries
+from crawl_feed import load_recorded_feed, parse_feed_payloads, record_feed, recorded_expiry_dates, unknown_fields
 from dotenv import load_dotenv
 import pytz
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
+import json
+import argparse
+import queue
+import threading
 
-def get_contract_info_old(page): # Returns "monthly" also for contract_date - not working!
-    # Find the selected date button (not the Monthly/Weekly selector)
-    selected_date_btn = page.query_selector("div._filter_contract_date_container_1y9l5_7 button._filterButton_15sg6_42._selected_15sg6_67")
-    if not selected_date_btn:
-        return None, None
-    
-    contract_date = selected_date_btn.inner_text()  # This will get "19.09.2025" etc.
-    contract_type = 'monthly' if '_monthly_15sg6_63' in selected_date_btn.get_attribute('class') else 'weekly'
-    return contract_date, contract_type
+# EUREX_URL can point the crawler at the local replica in benchmarks/fixture_server.py
+EUREX_URL = os.getenv("EUREX_URL", "https://www.eurex.com/ex-de/maerkte/idx/dax/DAX-Optionen-141164")
 
 def get_contract_info(page):
+    with METRICS.phase('contract_info'):
+        return _contract_info(page)
+
+def _contract_info(page):
     # Get all selected buttons - there will always be 2: Monthly/Weekly toggle + date
     selected_buttons = page.query_selector_all("button._filterButton_15sg6_42._selected_15sg6_67")
     
@@ -35,6 +42,10 @@ def get_contract_info(page):
     return contract_date, contract_type
 
 def fast_click_down(page, num_clicks):
+    with METRICS.phase('scroll'):
+        return _click_down(page, num_clicks)
+
+def _click_down(page, num_clicks):
     arrow = page.query_selector("._arrow_bottom_1htfc_42")
     if not arrow or not arrow.is_visible():
         return False
@@ -46,111 +57,267 @@ def fast_click_down(page, num_clicks):
     # Remove sleep entirely - let the page handle its own timing
     return True
 
-def scroll_to_top_with_wheel(page):
+def _wheel_to_top(page):
     """Scroll back to top using mouse wheel"""
     container = page.query_selector("div._scrollable_table_container_1htfc_71[data-scroll-disabled='forward']")
     if container:
         container.hover()
-        for _ in range(50):  # Repeat 10 times
+        for _ in range(50):
             page.mouse.wheel(0, -500000)
             time.sleep(0.1)  # Wait between scrolls
-        # # Scroll up a large amount to ensure we're at top
-        # page.mouse.wheel(0, -5000000)
-        # time.sleep(0.1)
-
-# def scroll_to_top(page):
-#     """Scroll both tables back to the top using JavaScript"""
-#     page.evaluate("""
-#         // Scroll both scrollable containers to top
-#         const containers = document.querySelectorAll('._scrollable_table_container_1htfc_71');
-#         containers.forEach(container => {
-#             container.scrollTop = 0;
-#         });
-#     """)
-#     time.sleep(0.1)  # Brief pause for UI to update
-
-def scroll_up(page, num_clicks):
-    """Scroll up by clicking the up arrow num_clicks times"""
-    up_arrow = page.query_selector("._arrow_top_1htfc_35")
-    if not up_arrow:
-        return
+
+# Resets every table container and waits until the first rows are rendered
+# and the up arrow is gone, true if the table is back at the top
+SCROLL_TOP_JS = """async (timeoutMs) => {
+    const containers = document.querySelectorAll('div._scrollable_table_container_1htfc_71');
+    containers.forEach(container => { container.scrollTop = 0; });
+    const atTop = () => {
+        const arrow = document.querySelector('._arrow_top_1htfc_35');
+        return document.querySelector('div._scrollable_table_container_1htfc_71 tbody tr') !== null
+            && [...containers].every(container => container.scrollTop === 0)
+            && (!arrow || getComputedStyle(arrow).visibility === 'hidden' || arrow.offsetParent === null);
+    };
+    const start = performance.now();
+    while (!atTop()) {
+        if (performance.now() - start > timeoutMs) return false;
+        await new Promise(resolve => requestAnimationFrame(resolve));
+    }
+    return true;
+}"""
+
+def scroll_to_top(page, timeout_ms=2000):
+    """Scroll both tables back to the top with one evaluate, the wheel only if that did not reach it"""
+    with METRICS.phase('scroll_top'):
+        if not page.evaluate(SCROLL_TOP_JS, timeout_ms):
+            _wheel_to_top(page)
+
+
+# Counters for the crawl report (see crawl_report)
+_stats_lock = threading.Lock()
+CRAWL_STATS = {'browser_launches': 0, 'page_loads': 0}
+
+def _count(key):
+    with _stats_lock:
+        CRAWL_STATS[key] += 1
+
+def reset_crawl_stats():
+    with _stats_lock:
+        for key in CRAWL_STATS:
+            CRAWL_STATS[key] = 0
+    PROFILE.reset_stats()
+    POOL.reset_stats()
+    METRICS.reset()
+    SCHEDULER.reset()
+
+class PeakRssSampler:
+    """
+    Samples the resident memory of this process plus all its descendants
+    (the Playwright driver and Chromium processes) from /proc in a background
+    thread and keeps the peak. Reports 0 where /proc is not available.
+    """
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @staticmethod
+    def _tree_rss_bytes():
+        children = {}
+        rss = {}
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                with open(f'/proc/{entry}/statm') as f:
+                    rss[int(entry)] = int(f.read().split()[1]) * page_size
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+
+        total = 0
+        stack = [os.getpid()]
+        while stack:
+            pid = stack.pop()
+            total += rss.get(pid, 0)
+            stack.extend(children.get(pid, []))
+        return total
+
+    def _run(self):
+        if not os.path.isdir('/proc'):
+            return
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._tree_rss_bytes())
+            self._stop.wait(self.interval)
+
+def crawl_report(design, total_rows, elapsed, sampler, expiries):
+    report = {
+        'design': design,
+        'expiries': expiries,
+        'rows': total_rows,
+        'browser_launches': CRAWL_STATS['browser_launches'],
+        'page_loads': CRAWL_STATS['page_loads'],
+        'peak_rss_mb': round(sampler.peak_bytes / 1024 / 1024, 1),
+        'elapsed_s': round(elapsed, 1),
+    }
+    print(f"📊 {design}: {report['browser_launches']} browser launches, {report['page_loads']} page loads, "
+          f"peak RSS {report['peak_rss_mb']} MB, {report['elapsed_s']}s")
+    profile = PROFILE.summary()
+    report.update(profile)
+    print(f"📊 page profile {profile['profile']}: {profile['requests_blocked']} requests blocked "
+          f"({profile['mb_blocked']} MB, {profile['requests_blocked_unsized']} of unknown size), "
+          f"{profile['cache_hits'] + profile['cache_revalidated']} assets from cache ({profile['mb_from_cache']} MB), "
+          f"{profile['hosts']} hosts, time to table median {profile.get('time_to_table_median_s', '-')}s")
+    PROFILE.save_observed()
+    pool = POOL.summary()
+    report['db_pool'] = pool
+    print(f"📊 db pool: {pool['connections_opened']} connections for {pool['checkouts']} checkouts, "
+          f"peak {pool['max_in_use']}/{pool['pool_max']} in use, waited {pool['wait_s']}s")
+    if METRICS.enabled:
+        report['metrics'] = METRICS.summary()
+        print(METRICS.summary_table())
+        path = METRICS.write_report(report)
+        if path:
+            print(f"📊 crawl metrics written to {path}")
+    schedule = SCHEDULER.summary()
+    report['schedule'] = schedule
+    if schedule['expiries_timed']:
+        print(f"📊 schedule {schedule['schedule']}: predicted makespan "
+              f"{schedule.get('predicted_makespan_s', '-')}s vs {report['elapsed_s']}s crawl, "
+              f"mean prediction error {schedule.get('mean_abs_error_s', '-')}s")
+        print(SCHEDULER.prediction_table())
+        SCHEDULER.save()
+    return report
+
+def launch_browser(p):
+    _count('browser_launches')
+    with METRICS.phase('launch'):
+        return p.chromium.launch(headless=True, args=['--disable-blink-features=AutomationControlled'])
+
+def new_page(browser):
+    """New page with the shared page profile (request blocking + asset cache), instrumented for METRICS"""
+    with METRICS.phase('launch'):
+        page = METRICS.instrument(browser.new_page())
+    page.set_default_timeout(10000)
+    PROFILE.apply(page)
+    return page
+
+def open_eurex_page(page, show_more=False):
+    """goto + zoom + cookie banner + wait for the options table"""
+    _count('page_loads')
+    start = time.time()
+    with METRICS.phase('goto'):
+        page.goto(EUREX_URL, wait_until="domcontentloaded")
+        page.evaluate("document.body.style.zoom = '0.5'")
     
-    for _ in range(num_clicks):
-        if not up_arrow.is_visible():
-            break
-        up_arrow.click()
-    time.sleep(0.1)  # Brief pause after scrolling back
-
-
-def scroll_to_top_old(page):
-    """Scroll both tables back to the top"""
-    # Click the up arrow multiple times to go back to top
-    up_arrow = page.query_selector("._arrow_top_1htfc_35")
-#    _arrow_1htfc_32 _arrow_top_1htfc_35
-    if up_arrow and up_arrow.is_visible():
-        # Click many times to ensure we're at the top
-        for _ in range(300):  # Generous number to reach top
-            if not up_arrow.is_visible():
-                break
-            up_arrow.click()
-            time.sleep(0.01)  # Small delay
+    # Dismiss cookie banner (the lean profile never loads it)
+    if not PROFILE.enabled:
+        with METRICS.phase('cookie'):
+            try:
+                cookie_reject = page.wait_for_selector("#cookiescript_reject", timeout=2000)
+                if cookie_reject:
+                    cookie_reject.click()
+            except:
+                pass
+    
+    with METRICS.phase('table_wait'):
+        page.wait_for_selector("table.react-table", timeout=10000)
+    PROFILE.record_time_to_table(time.time() - start)
+
+    if show_more:
+        with METRICS.phase('show_more'):
+            try:
+                show_more_btn = page.query_selector("button._showMoreLessButton_15sg6_121")
+                if show_more_btn and "Show more" in show_more_btn.inner_text():
+                    show_more_btn.click()
+                    time.sleep(0.3)
+            except:
+                pass
 
+def select_expiry(page, expiry_date):
+    """Click the date button of expiry_date, returns False if there is none"""
+    with METRICS.phase('select'):
+        return _select_expiry(page, expiry_date)
 
-def scrape_single_expiry(expiry_date, scrape_date, scrape_time):
-    """Scrape one expiry date in its own browser"""
+def _select_expiry(page, expiry_date):
+    date_buttons = page.query_selector_all("div._filter_contract_date_container_1y9l5_7 button._filterButton_15sg6_42")
+    for button in date_buttons:
+        if button.inner_text() == expiry_date:
+            button.click()
+            page.wait_for_selector("table.react-table", timeout=10000)
+            time.sleep(0.2)
+            return True
+    return False
+
+
+def scrape_single_expiry(expiry_date, scrape_date, scrape_time, writer=None, check=None):
+    """
+    Scrape one expiry date in its own browser, streaming rows to writer if given.
+
+    check: ExpiryCheck of a warm-started run (see open_checked_page)
+    """
     print(f"Starting scrape for {expiry_date}...")
     
+    # Launch and page load count for the run, like a pool worker's; the expiry starts at select_expiry
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True, args=['--disable-blink-features=AutomationControlled'])
-        page = browser.new_page()
-        page.set_default_timeout(10000)
-        
-        page.goto("https://www.eurex.com/ex-de/maerkte/idx/dax/DAX-Optionen-141164", wait_until="domcontentloaded")
-        page.evaluate("document.body.style.zoom = '0.5'")
-        
-        # Dismiss cookie banner
-        try:
-            cookie_reject = page.wait_for_selector("#cookiescript_reject", timeout=2000)
-            if cookie_reject:
-                cookie_reject.click()
-        except:
-            pass
-        
-        page.wait_for_selector("table.react-table", timeout=10000)
-        
-        # Click the button for this specific expiry date
-        date_buttons = page.query_selector_all("div._filter_contract_date_container_1y9l5_7 button._filterButton_15sg6_42")
-        for button in date_buttons:
-            if button.inner_text() == expiry_date:
-                button.click()
-                page.wait_for_selector("table.react-table", timeout=10000)
-                time.sleep(0.2)
-                break
+        browser = launch_browser(p)
+        page = new_page(browser)
         
-        # Scrape this expiry date
-        all_data = []
-        seen_strikes = set()
-        scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time)
+        open_checked_page(page, check)
         
-        browser.close()
+        with METRICS.expiry(expiry_date):
+            # Click the button for this specific expiry date, expiries that rolled off have none
+            if not select_expiry(page, expiry_date):
+                print(f"❌ No date button for {expiry_date}, skipped")
+                all_data = None
+            else:
+                # Scrape this expiry date
+                all_data = []
+                seen_strikes = set()
+                scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time,
+                                     on_batch=writer.put if writer else None)
+                print(f"Finished scraping {expiry_date}: {len(all_data)} rows")
+                METRICS.add_rows(len(all_data))
         
-        print(f"Finished scraping {expiry_date}: {len(all_data)} rows")
+        with METRICS.phase('close'):
+            browser.close()
+    if all_data is None:
+        return 0
         
-        # Write to database immediately
-        if all_data:
-            headers = ['date', 'time', 'contract_date', 'monthly_weekly', 'option_type', 'strike', 
-                      'last_trade', 'open', 'high', 'low', 'daily_settlement', 
-                      'open_interest', 'volume', 'last_price', 'bid', 'ask']
-            df = pd.DataFrame(all_data, columns=headers)
-            df = df.replace({np.nan: None})
-            
-            try:
-                upsert_snapshots(df)
-                print(f"✅ Saved {expiry_date} to database")
-            except Exception as e:
-                print(f"❌ Error saving {expiry_date} to database: {e}")
+    # Write to database immediately
+    if writer is None:
+        save_snapshot_rows(all_data, expiry_date)
+
+    return len(all_data)
 
-        return len(all_data)
+
+# Parallel crawls stream rows to one SnapshotWriter while scraping;
+# STREAM_INGEST=0 writes each expiry with upsert_snapshots after scraping it
+STREAM_INGEST = os.getenv("STREAM_INGEST", "1") == "1"
+
+def save_snapshot_rows(all_data, expiry_date):
+    """Write the scraped rows of one expiry to the database"""
+    if not all_data:
+        return
+    df = pd.DataFrame(all_data, columns=SNAPSHOT_HEADERS)
+    df = df.replace({np.nan: None})
+
+    try:
+        upsert_snapshots(df)
+        print(f"✅ Saved {expiry_date} to database")
+    except Exception as e:
+        print(f"❌ Error saving {expiry_date} to database: {e}")
 
 
 def get_visible_data(page):
@@ -160,8 +327,7 @@ def get_visible_data(page):
     for cell in strike_cells:
         strike = cell.inner_text()
         if strike:
-            # German format: remove thousand separator (.) and replace decimal comma with dot
-            #strike = strike.replace('.', '').replace(',', '.')
+            # German format: remove thousand separator (.) and the decimals
             strike = strike.replace('.', '').split(',')[0]
             strikes.append(strike)
 
@@ -171,22 +337,10 @@ def get_visible_data(page):
         cells = row.query_selector_all("td")
 
         if cells and len(cells) >= 11:
-#        if cells and len(cells) > 0:
-            #row_data = [cell.inner_text() for cell in cells]
             row_data = [cells[i].inner_text() for i in range(1, 11)]
             if any(row_data):
                 calls.append(row_data)
     
-    # puts = []
-    # put_rows = page.query_selector_all("div._scrollable_table_container_1htfc_71[data-scroll-disabled='back'] tbody tr")
-    # for row in put_rows:
-    #     cells = row.query_selector_all("td")
-    #     if cells and len(cells) > 0:
-    #         row_data = [cell.inner_text() for cell in cells]
-    #         if any(row_data):
-    #             # REVERSE the order for puts since columns are backwards
-    #             puts.append(row_data[::-1])
-
     puts = []
     put_rows = page.query_selector_all("div._scrollable_table_container_1htfc_71[data-scroll-disabled='back'] tbody tr")
     for row in put_rows:
@@ -212,6 +366,61 @@ def get_visible_data(page):
     
     return strikes, calls, puts
 
+# Single round trip version of get_visible_data: the whole viewport is read
+# inside the page and returned as plain arrays in the same shape as the
+# per-cell implementation (strikes, calls, reordered puts).
+READ_VIEWPORT_JS = """
+const readViewport = () => {
+    const text = (el) => (el ? el.innerText : '');
+    const strikes = [];
+    for (const cell of document.querySelectorAll('._stroke_cell_1xods_68')) {
+        const strike = cell.innerText;
+        if (strike) {
+            strikes.push(strike.split('.').join('').split(',')[0]);
+        }
+    }
+
+    const readRows = (selector, order) => {
+        const rows = [];
+        for (const row of document.querySelectorAll(selector)) {
+            const cells = row.querySelectorAll('td');
+            if (cells.length < 11) continue;
+            const values = order.map((i) => text(cells[i]));
+            if (values.some((v) => v)) rows.push(values);
+        }
+        return rows;
+    };
+
+    const calls = readRows(
+        "div._scrollable_table_container_1htfc_71[data-scroll-disabled='forward'] tbody tr",
+        [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    );
+    // PUTS: 1=Bid, 2=Ask, 3=LastPrice, 4=Volume, 5=OI, 6=DailySettlement, 7=Open, 8=High, 9=Low, 10=LastTrade
+    const puts = readRows(
+        "div._scrollable_table_container_1htfc_71[data-scroll-disabled='back'] tbody tr",
+        [10, 7, 8, 9, 6, 5, 4, 3, 1, 2]
+    );
+    return {strikes, calls, puts};
+};
+"""
+
+VISIBLE_DATA_JS = "() => {" + READ_VIEWPORT_JS + "return readViewport(); }"
+
+def get_visible_data_fast(page):
+    """Same result as get_visible_data, but in one page.evaluate call"""
+    result = page.evaluate(VISIBLE_DATA_JS)
+    return result['strikes'], result['calls'], result['puts']
+
+# "evaluate" (default) reads the viewport in one round trip, "dom" uses the
+# original per-cell inner_text() extraction
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "evaluate")
+
+def read_visible_data(page):
+    with METRICS.phase('extract'):
+        if EXTRACTION_MODE == "dom":
+            return get_visible_data(page)
+        return get_visible_data_fast(page)
+
 def process_rows(strikes, calls, puts, all_data, seen_strikes, scrape_date, scrape_time, contract_date, contract_type):
     #print(f"Processing {len(strikes)} strikes, {len(calls)} calls, {len(puts)} puts")
     for i, strike in enumerate(strikes):
@@ -227,7 +436,152 @@ def process_rows(strikes, calls, puts, all_data, seen_strikes, scrape_date, scra
                 row_data = puts[i]
                 all_data.append([scrape_date, scrape_time, contract_date, contract_type, 'PUT', strike] + row_data)
 
-def scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time):
+# One harvest cycle: scroll the table by (visible rows - 1) row heights with
+# the given method (scrollTop of both containers, a wheel event or in-page
+# arrow clicks), wait for the table to re-render (up to settleMs if the rows
+# did not change after two frames) and return only the rows whose strike has
+# not been harvested yet, plus the viewport's strike keys for end detection.
+# Which method to use is decided across cycles by HarvestScroll.
+HARVEST_STEP_JS = """
+async ({seen, scroll, method, settleMs}) => {
+""" + READ_VIEWPORT_JS + """
+    const nextFrame = () => new Promise((r) => requestAnimationFrame(() => requestAnimationFrame(r)));
+    const containers = document.querySelectorAll('div._scrollable_table_container_1htfc_71');
+    const firstRow = document.querySelector('div._scrollable_table_container_1htfc_71 tbody tr');
+    const rowHeight = firstRow ? firstRow.getBoundingClientRect().height : 0;
+    const container = containers[0];
+    const visibleRows = rowHeight && container ? Math.floor(container.clientHeight / rowHeight) : 0;
+    const stepRows = Math.max(1, visibleRows - 1);
+
+    let view = readViewport();
+    const before = view.strikes.join('|');
+    if (scroll && containers.length) {
+        const methods = {
+            scrollTop: () => containers.forEach((c) => { c.scrollTop += stepRows * rowHeight; }),
+            wheel: () => containers[0].dispatchEvent(new WheelEvent('wheel',
+                {deltaY: stepRows * rowHeight, bubbles: true, cancelable: true})),
+            arrow: () => {
+                const arrow = document.querySelector('._arrow_bottom_1htfc_42');
+                for (let i = 0; arrow && i < stepRows; i++) arrow.click();
+            },
+        };
+        methods[method]();
+        await nextFrame();
+        view = readViewport();
+        for (let waited = 0; view.strikes.join('|') === before && waited < settleMs; waited += 50) {
+            await new Promise((r) => setTimeout(r, 50));
+            view = readViewport();
+        }
+    }
+
+    const known = new Set(seen);
+    const fresh = {strikes: [], calls: [], puts: []};
+    view.strikes.forEach((strike, i) => {
+        if (known.has(strike)) return;
+        fresh.strikes.push(strike);
+        fresh.calls.push(i < view.calls.length ? view.calls[i] : null);
+        fresh.puts.push(i < view.puts.length ? view.puts[i] : null);
+    });
+    return {...fresh, keys: view.strikes.join('|'), stepRows};
+}
+"""
+
+HARVEST_METHODS = ('scrollTop', 'wheel', 'arrow')
+HARVEST_MAX_MISSES = int(os.getenv("HARVEST_MAX_MISSES", "3"))
+HARVEST_SETTLE_MS = int(os.getenv("HARVEST_SETTLE_MS", "150"))
+
+class HarvestScroll:
+    """
+    Scroll method and end detection of one expiry's harvest. A scroll cycle
+    that leaves the viewport's rows unchanged is a miss; HARVEST_MAX_MISSES
+    misses in a row end the table. A method that has not moved the table yet
+    is replaced by the next one of HARVEST_METHODS after two misses in a row,
+    one method per cycle, so two methods never both move the table.
+    """
+
+    def __init__(self):
+        self.index = 0
+        self.confirmed = False
+        self.misses = 0
+
+    @property
+    def method(self):
+        return HARVEST_METHODS[self.index]
+
+    def step_args(self, seen, scroll):
+        return {'seen': seen, 'scroll': scroll, 'method': self.method, 'settleMs': HARVEST_SETTLE_MS}
+
+    def update(self, moved):
+        """Record the outcome of a scroll cycle, returns False at the end of the table"""
+        if moved:
+            self.confirmed = True
+            self.misses = 0
+            return True
+        self.misses += 1
+        if not self.confirmed and self.misses >= 2 and self.index + 1 < len(HARVEST_METHODS):
+            self.index += 1
+            self.misses = 0
+            return True
+        return self.misses < HARVEST_MAX_MISSES
+
+# "harvest" (default) scrolls the containers directly with harvest_contract_date,
+# "arrows" keeps the original arrow-click loop in scrape_contract_date
+SCROLL_MODE = os.getenv("SCROLL_MODE", "harvest")
+
+def process_harvested(result, all_data, seen_strikes, scrape_date, scrape_time, contract_date, contract_type):
+    """process_rows for the aligned (strike, call or None, put or None) arrays of HARVEST_STEP_JS"""
+    for strike, call, put in zip(result['strikes'], result['calls'], result['puts']):
+        strike_key = f"{strike}-{contract_date}"
+        if strike_key in seen_strikes:
+            continue
+        seen_strikes.add(strike_key)
+        if call is not None:
+            all_data.append([scrape_date, scrape_time, contract_date, contract_type, 'CALL', strike] + call)
+        if put is not None:
+            all_data.append([scrape_date, scrape_time, contract_date, contract_type, 'PUT', strike] + put)
+
+def harvest_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time, max_cycles=500, on_batch=None):
+    """
+    Harvest the whole chain of the selected expiry with HARVEST_STEP_JS, one
+    page.evaluate per scroll step. Stops once the viewport's row keys stayed
+    the same for HARVEST_MAX_MISSES scrolls in a row (see HarvestScroll).
+    Returns the number of scroll/extract cycles.
+
+    on_batch: called with the rows added by each cycle (see SnapshotWriter)
+    """
+    contract_date, contract_type = get_contract_info(page)
+    if not contract_date:
+        print("Warning: Could not detect contract date!")
+        return 0
+
+    harvested = set()
+    previous_keys = None
+    scroll = HarvestScroll()
+    cycles = 0
+    emitted = len(all_data)
+    while cycles < max_cycles:
+        with METRICS.phase('harvest'):
+            result = page.evaluate(HARVEST_STEP_JS, scroll.step_args(list(harvested), cycles > 0))
+        cycles += 1
+        with METRICS.phase('process'):
+            process_harvested(result, all_data, seen_strikes, scrape_date, scrape_time, contract_date, contract_type)
+        harvested.update(result['strikes'])
+        if on_batch and len(all_data) > emitted:
+            with METRICS.phase('emit'):
+                on_batch(all_data[emitted:])
+            emitted = len(all_data)
+        if cycles > 1 and not scroll.update(result['keys'] != previous_keys):
+            break
+        previous_keys = result['keys']
+    METRICS.add_cycles(cycles)
+    return cycles
+
+def scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time, on_batch=None):
+    if SCROLL_MODE == "harvest":
+        return harvest_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time, on_batch=on_batch)
+
+    emitted = len(all_data)
+
     contract_date, contract_type = get_contract_info(page)
     if not contract_date:
         print("Warning: Could not detect contract date!")
@@ -236,7 +590,7 @@ def scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time)
     total_clicks = 0  # Track total down clicks
 
     # Get initial data
-    initial_strikes, initial_calls, initial_puts = get_visible_data(page)
+    initial_strikes, initial_calls, initial_puts = read_visible_data(page)
     if initial_strikes and (initial_calls or initial_puts):
         process_rows(initial_strikes, initial_calls, initial_puts, all_data, seen_strikes, 
                     scrape_date, scrape_time, contract_date, contract_type)
@@ -254,14 +608,14 @@ def scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time)
             total_clicks += scroll_size
         else:
             # Arrow disappeared - get final data before stopping
-            strikes, calls, puts = get_visible_data(page)
+            strikes, calls, puts = read_visible_data(page)
             if strikes and (calls or puts):
                 process_rows(strikes, calls, puts, all_data, seen_strikes, 
                            scrape_date, scrape_time, contract_date, contract_type)
             consecutive_failures += 1
             continue
             
-        strikes, calls, puts = get_visible_data(page)
+        strikes, calls, puts = read_visible_data(page)
         if strikes and (calls or puts):
             process_rows(strikes, calls, puts, all_data, seen_strikes, 
                        scrape_date, scrape_time, contract_date, contract_type)
@@ -269,123 +623,392 @@ def scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time)
         else:
             consecutive_failures += 1
         
+    if on_batch and len(all_data) > emitted:
+        with METRICS.phase('emit'):
+            on_batch(all_data[emitted:])
     
-    return total_clicks  # Return number of clicks to reverse
-
-        # if not fast_click_down(page, scroll_size):
-        #     strikes, calls, puts = get_visible_data(page)
-        #     if strikes and (calls or puts):
-        #         process_rows(strikes, calls, puts, all_data, seen_strikes, 
-        #                    scrape_date, scrape_time, contract_date, contract_type)
-        #     consecutive_failures += 1
-        #     continue
-            
-        # strikes, calls, puts = get_visible_data(page)
-        # if strikes and (calls or puts):
-        #     process_rows(strikes, calls, puts, all_data, seen_strikes, 
-        #                scrape_date, scrape_time, contract_date, contract_type)
-        #     consecutive_failures = 0  # Reset on success
-        # else:
-        #     consecutive_failures += 1
+    return total_clicks
+
+
+def discover_expiry_buttons():
+    """Load the page once and read all expiry buttons"""
+    with METRICS.expiry('(discover)'), sync_playwright() as p:
+        browser = launch_browser(p)
+        page = new_page(browser)
+        open_eurex_page(page, show_more=True)
+        buttons = read_expiry_buttons(page)
+        with METRICS.phase('close'):
+            browser.close()
+    return buttons
+
+
+def discover_expiry_dates():
+    """Load the page once and read all expiry dates from the date buttons (refreshes the expiry cache)"""
+    buttons = discover_expiry_buttons()
+    save_expiries(EUREX_URL, buttons)
+    return [b['date'] for b in buttons]
+
+
+# All date buttons with their monthly flag in one round trip, without the Monthly/Weekly toggles
+EXPIRY_BUTTONS_JS = """
+() => Array.from(document.querySelectorAll('div._filter_contract_date_container_1y9l5_7 button._filterButton_15sg6_42'))
+    .map((b) => ({date: b.innerText, monthly: b.className.includes('_monthly_15sg6_63')}))
+    .filter((b) => b.date && b.date !== 'Monthly' && b.date !== 'Weekly')
+"""
+
+def read_expiry_buttons(page):
+    """[{'date': '21.11.2025', 'monthly': True}, ...] of the loaded page"""
+    return page.evaluate(EXPIRY_BUTTONS_JS)
 
 
-def scrape_options_data():
+def start_expiry_dates():
+    """
+    Expiry dates a crawl starts with, plus the ExpiryCheck that corrects them:
+    the cached list of the previous run if there is one (see expiry_cache),
+    otherwise the dates read by a discovery browser and no check.
+    """
+    cached = load_expiries(EUREX_URL) if EXPIRY_CACHE else None
+    if not cached:
+        return discover_expiry_dates(), None
+    print(f"Starting from {len(cached)} cached expiry dates, the first page checks them")
+    return [b['date'] for b in cached], ExpiryCheck(EUREX_URL, cached)
+
+
+def open_checked_page(page, check, show_more=False):
+    """
+    open_eurex_page; the first page of a warm-started run also reads the date
+    buttons and reports them to check. Returns True for that page.
+    """
+    if check is None or not check.claim():
+        open_eurex_page(page, show_more)
+        return False
+    try:
+        open_eurex_page(page, show_more=True)
+        check.report(read_expiry_buttons(page))
+    finally:
+        check.finish()
+    return True
+
+
+def added_expiry_dates(check):
+    """
+    Expiry dates missing from the cached list: waits for the page that checks
+    them, or runs the discovery browser if no page could.
+    """
+    if check is None:
+        return []
+    if check.wait():
+        return check.added
+    return discover_missing_expiries(check)
+
+
+def discover_missing_expiries(check):
+    print("⚠️ Cached expiry dates were not checked by a worker page, running discovery")
+    return check.report(discover_expiry_buttons())
+
+
+def scrape_options_data(engine='dom', record_dir=None, replay_dir=None, report=None):
+    """
+    Scrape all expiry dates in parallel, one browser per expiry.
+
+    engine: 'dom' reads the rendered table, 'network' parses the table's data
+    feed (see scrape_expiry_network). record_dir / replay_dir only apply to
+    the network engine. If report is a dict it is filled with crawl_report().
+    """
+    reset_crawl_stats()
+    sampler = PeakRssSampler().start()
     start_time = time.time()
     berlin_tz = pytz.timezone('Europe/Berlin')
     now = datetime.now(berlin_tz)
     scrape_date = now.strftime('%Y-%m-%d')
     scrape_time = now.strftime('%H:%M')
     
-    print(f"Starting parallel scrape at {scrape_time} on {scrape_date}...")
+    print(f"Starting parallel scrape ({engine}) at {scrape_time} on {scrape_date}...")
     
-    # First, get list of all expiry dates
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.goto("https://www.eurex.com/ex-de/maerkte/idx/dax/DAX-Optionen-141164", wait_until="domcontentloaded")
-        page.evaluate("document.body.style.zoom = '0.5'")
-        
-        try:
-            cookie_reject = page.wait_for_selector("#cookiescript_reject", timeout=2000)
-            if cookie_reject:
-                cookie_reject.click()
-        except:
-            pass
-        
-        page.wait_for_selector("table.react-table", timeout=10000)
-        
-        # Click "Show more" button
-        try:
-            show_more = page.query_selector("button._showMoreLessButton_15sg6_121")
-            if show_more and "Show more" in show_more.inner_text():
-                show_more.click()
-                time.sleep(0.3)
-        except:
-            pass
-        
-        # Get all expiry dates
-        date_buttons = page.query_selector_all("div._filter_contract_date_container_1y9l5_7 button._filterButton_15sg6_42")
-        expiry_dates = []
-        print("Found date buttons: ")
-        for button in date_buttons:
-            # Skip Monthly/Weekly toggle buttons
-            text = button.inner_text()
-            if text and text not in ['Monthly', 'Weekly']:
-                expiry_dates.append(text)
-
-        browser.close()
+    # First, get list of all expiry dates (cached from the previous run if possible)
+    if replay_dir:
+        expiry_dates, check = recorded_expiry_dates(replay_dir), None
+    else:
+        expiry_dates, check = start_expiry_dates()
     
     print(f"Found {len(expiry_dates)} expiry dates: {expiry_dates}")
     
-    # Scrape all expiry dates in parallel (limit to 3 at a time to not overwhelm)
-    #all_data = []
+    writer = SnapshotWriter().start() if STREAM_INGEST else None
+    if engine == 'network':
+        def scrape_expiry(date):
+            return scrape_single_expiry_network(date, scrape_date, scrape_time, record_dir=record_dir,
+                                                replay_dir=replay_dir, writer=writer, check=check)
+    else:
+        def scrape_expiry(date):
+            return scrape_single_expiry(date, scrape_date, scrape_time, writer=writer, check=check)
+
+    def scrape(date):
+        rows = scrape_expiry(date)
+        if not replay_dir:
+            # Same measure in every executor: the expiry's METRICS scope
+            SCHEDULER.record(date, rows, METRICS.seconds_in(date))
+        return rows
+
+    # Scrape all expiry dates in parallel, longest expected first (see crawl_schedule)
     total_rows = 0
-    with ThreadPoolExecutor(max_workers=12) as executor:
-        futures = {executor.submit(scrape_single_expiry, date, scrape_date, scrape_time): date 
+    max_workers = 12
+    expiry_dates = SCHEDULER.order(expiry_dates, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(scrape, date): date 
                    for date in expiry_dates}  # [:5] would limit to first 5 for testing
+        # Expiries the first page found on top of the cached ones
+        for date in added_expiry_dates(check):
+            futures[executor.submit(scrape, date)] = date
         
         for future in as_completed(futures):
             expiry_date = futures[future]
             try:
-                # data = future.result()
-                # all_data.extend(data)
                 row_count = future.result()
                 total_rows += row_count
             except Exception as e:
                 print(f"❌ Error scraping {expiry_date}: {e}")
-    
-    # # Create DataFrame and save
-    # headers = ['date', 'time', 'contract_date', 'monthly_weekly', 'option_type', 'strike', 
-    #           'last_trade', 'open', 'high', 'low', 'daily_settlement', 
-    #           'open_interest', 'volume', 'last_price', 'bid', 'ask']
-    
-    # df = pd.DataFrame(all_data, columns=headers)
-    # df = df.replace({np.nan: None})
-    
-    # # Save to database
-    # upsert_snapshots(df)
-    
-    # Save to files
-    # ... your existing file saving code ...
-            
-    #folder_path = "daxtest/prices/output"
-    # Ensure output directory exists
-    #os.makedirs(folder_path, exist_ok=True)
-    #filename_base = f"Eurex_prices_{scrape_date.replace('-', '')}_{scrape_time.replace(':', '')}"
-    #df.to_excel(f"{folder_path}/{filename_base}.xlsx", index=False)
-
+    if writer:
+        writer.close()
     
     end_time = time.time()
     elapsed = end_time - start_time
+    sampler.stop()
 
     print(f"\n✅ Total: {total_rows} rows in {int(elapsed//60)}m {int(elapsed%60)}s")
+    expiries = len(check.live) if check is not None and check.live is not None else len(expiry_dates)
+    result = crawl_report(f"threaded/{engine}", total_rows, elapsed, sampler, expiries)
+    if report is not None:
+        report.update(result)
     
     return total_rows
-    # print(f"✅ Scraped {len(all_data)} total rows in {int(elapsed//60)}m {int(elapsed%60)}s")
-    
-    # return all_data, df
 
 
+CRAWL_POOL_SIZE = int(os.getenv("CRAWL_POOL_SIZE", "4"))
+
+def pool_worker(worker_id, expiry_queue, scrape_date, scrape_time, writer=None, check=None):
+    """
+    One long-lived browser with one loaded page. Takes expiries from the
+    queue and switches between them by clicking the date buttons, like
+    scrape_options_data_single does, instead of loading the page again.
+    The worker whose page checks the cached expiries queues the added ones.
+    """
+    total_rows = 0
+    # Launch, reloads and scroll resets count for the worker, select_expiry and the scrape for the expiry
+    with METRICS.expiry(f'(worker {worker_id})'), sync_playwright() as p:
+        browser = launch_browser(p)
+        page = new_page(browser)
+        if open_checked_page(page, check, show_more=True):
+            for expiry_date in check.added:
+                expiry_queue.put(expiry_date)
+        scrolled = False
+
+        while True:
+            try:
+                expiry_date = expiry_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                if scrolled:
+                    scroll_to_top(page)
+                with METRICS.expiry(expiry_date):
+                    selected = select_expiry(page, expiry_date)
+                if not selected:
+                    # Buttons can get lost after a failed click, reload once
+                    open_eurex_page(page, show_more=True)
+                    scrolled = False
+                    with METRICS.expiry(expiry_date):
+                        selected = select_expiry(page, expiry_date)
+                    if not selected:
+                        print(f"❌ [worker {worker_id}] No date button for {expiry_date}")
+                        continue
+
+                with METRICS.expiry(expiry_date):
+                    all_data = []
+                    seen_strikes = set()
+                    scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time,
+                                         on_batch=writer.put if writer else None)
+                    scrolled = True
+                    print(f"[worker {worker_id}] Finished scraping {expiry_date}: {len(all_data)} rows")
+                    METRICS.add_rows(len(all_data))
+                SCHEDULER.record(expiry_date, len(all_data), METRICS.seconds_in(expiry_date))
+
+                if writer is None:
+                    save_snapshot_rows(all_data, expiry_date)
+                total_rows += len(all_data)
+            except Exception as e:
+                print(f"❌ [worker {worker_id}] Error scraping {expiry_date}: {e}")
+                # Start the next expiry from a freshly loaded page
+                try:
+                    open_eurex_page(page, show_more=True)
+                    scrolled = False
+                except Exception as reload_error:
+                    print(f"❌ [worker {worker_id}] Reload failed, stopping worker: {reload_error}")
+                    break
+
+        with METRICS.phase('close'):
+            browser.close()
+    return total_rows
+
+
+def scrape_options_data_pooled(pool_size=CRAWL_POOL_SIZE, report=None):
+    """
+    Scrape all expiry dates with a fixed pool of browsers (see pool_worker)
+    instead of one browser per expiry.
+    """
+    reset_crawl_stats()
+    sampler = PeakRssSampler().start()
+    start_time = time.time()
+    now = datetime.now(pytz.timezone('Europe/Berlin'))
+    scrape_date = now.strftime('%Y-%m-%d')
+    scrape_time = now.strftime('%H:%M')
+
+    print(f"Starting pooled scrape ({pool_size} browsers) at {scrape_time} on {scrape_date}...")
+
+    expiry_dates, check = start_expiry_dates()
+    print(f"Found {len(expiry_dates)} expiry dates: {expiry_dates}")
+
+    total_rows = 0
+    workers = max(1, min(pool_size, len(expiry_dates)))
+    expiry_queue = queue.Queue()
+    for expiry_date in SCHEDULER.order(expiry_dates, workers):
+        expiry_queue.put(expiry_date)
+
+    writer = SnapshotWriter().start() if STREAM_INGEST else None
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(pool_worker, i, expiry_queue, scrape_date, scrape_time, writer, check)
+                   for i in range(workers)]
+        if check is not None and not check.wait():
+            for expiry_date in discover_missing_expiries(check):
+                expiry_queue.put(expiry_date)
+        for future in as_completed(futures):
+            try:
+                total_rows += future.result()
+            except Exception as e:
+                print(f"❌ Pool worker failed: {e}")
+    # Discovery can queue expiries after every worker found the queue empty and exited
+    if not expiry_queue.empty():
+        print(f"Scraping {expiry_queue.qsize()} expiries queued after the workers finished...")
+        try:
+            total_rows += pool_worker(workers, expiry_queue, scrape_date, scrape_time, writer)
+        except Exception as e:
+            print(f"❌ Pool worker failed: {e}")
+    if writer:
+        writer.close()
+
+    elapsed = time.time() - start_time
+    sampler.stop()
+
+    print(f"\n✅ Total: {total_rows} rows in {int(elapsed//60)}m {int(elapsed%60)}s")
+    expiries = len(check.live) if check is not None and check.live is not None else len(expiry_dates)
+    result = crawl_report(f"pool/{workers}", total_rows, elapsed, sampler, expiries)
+    if report is not None:
+        report.update(result)
+
+    return total_rows
+
+
+# --- Network capture engine (experimental) -------------------------------
+# The options table is rendered from JSON fetched by the page. Instead of
+# scrolling the rendered table we listen to those responses and rebuild the
+# chain from the payload (parsing and recordings in crawl_feed.py). The feed
+# format is only known from the benchmark replica, so the engine is not used
+# in CI until a recording of the live page passes benchmarks/check_feed.py.
+
+def _is_feed_response(response):
+    if response.request.resource_type not in ('xhr', 'fetch'):
+        return False
+    return 'json' in (response.headers.get('content-type') or '')
+
+
+def attach_feed_listener(page, payloads):
+    """Collect every JSON xhr/fetch response body of the page into payloads"""
+    def on_response(response):
+        if not _is_feed_response(response):
+            return
+        try:
+            payloads.append({'url': response.url, 'body': response.json()})
+        except Exception:
+            pass
+    page.on("response", on_response)
+
+
+def scrape_expiry_network(expiry_date, scrape_date, scrape_time, contract_type='monthly',
+                          record_dir=None, replay_dir=None, check=None):
+    """
+    Scrape one expiry from the table's data feed instead of the rendered cells.
+
+    replay_dir: parse a feed recorded earlier with record_dir, without a browser
+    """
+    if replay_dir:
+        recording = load_recorded_feed(replay_dir, expiry_date)
+        return parse_feed_payloads([p['body'] for p in recording['payloads']], expiry_date,
+                                   recording['contract_type'], scrape_date, scrape_time)
+
+    payloads = []
+    with sync_playwright() as p:
+        browser = launch_browser(p)
+        page = new_page(browser)
+        attach_feed_listener(page, payloads)
+        open_checked_page(page, check)
+
+        contract_date, contract_type = get_contract_info(page)
+        if contract_date != expiry_date:
+            date_buttons = page.query_selector_all("div._filter_contract_date_container_1y9l5_7 button._filterButton_15sg6_42")
+            with METRICS.phase('select'):
+                for button in date_buttons:
+                    if button.inner_text() == expiry_date:
+                        contract_type = 'monthly' if '_monthly_15sg6_63' in button.get_attribute('class') else 'weekly'
+                        # Drop the feed of the expiry the page opened with
+                        payloads.clear()
+                        button.click()
+                        break
+                else:
+                    print(f"❌ No date button for {expiry_date}, skipped")
+                    browser.close()
+                    return []
+
+        # Wait until the feed for this expiry has arrived
+        rows = []
+        deadline = time.time() + 10
+        with METRICS.phase('harvest'):
+            while time.time() < deadline:
+                rows = parse_feed_payloads([p['body'] for p in payloads], expiry_date, contract_type,
+                                           scrape_date, scrape_time)
+                if rows:
+                    break
+                page.wait_for_timeout(200)
+        if not rows:
+            bodies = [p['body'] for p in payloads]
+            if bodies:
+                print(f"❌ {expiry_date}: {len(bodies)} feed responses but no rows parsed, "
+                      f"fields FEED_FIELDS does not map: {unknown_fields(bodies)}")
+            else:
+                print(f"❌ {expiry_date}: no feed response captured within 10s")
+
+        with METRICS.phase('close'):
+            browser.close()
+
+    if record_dir:
+        record_feed(payloads, record_dir, expiry_date, contract_type)
+    return rows
+
+
+def scrape_single_expiry_network(expiry_date, scrape_date, scrape_time, record_dir=None, replay_dir=None,
+                                 writer=None, check=None):
+    print(f"Starting network scrape for {expiry_date}...")
+    with METRICS.expiry(expiry_date):
+        all_data = scrape_expiry_network(expiry_date, scrape_date, scrape_time,
+                                         record_dir=record_dir, replay_dir=replay_dir, check=check)
+        print(f"Finished scraping {expiry_date}: {len(all_data)} rows")
+        METRICS.add_rows(len(all_data))
+        if writer:
+            with METRICS.phase('emit'):
+                writer.put(all_data)
+        else:
+            save_snapshot_rows(all_data, expiry_date)
+    return len(all_data)
+
 
 def scrape_options_data_single():
     
@@ -409,11 +1032,12 @@ def scrape_options_data_single():
             ]
         )
         page = browser.new_page()
+        PROFILE.apply(page)
         # Set faster timeouts
         page.set_default_timeout(10000)  # 10 seconds default
         
         # Navigate faster with reduced timeout
-        page.goto("https://www.eurex.com/ex-de/maerkte/idx/dax/DAX-Optionen-141164", wait_until="domcontentloaded")
+        page.goto(EUREX_URL, wait_until="domcontentloaded")
         page.evaluate("document.body.style.zoom = '0.5'")
         
         # Handle cookie banner with shorter timeout
@@ -443,7 +1067,7 @@ def scrape_options_data_single():
             except Exception as e:
                 print("❌ Page is not loading, retrying page load...")
                 # Reload the whole page and try again, from goto
-                page.goto("https://www.eurex.com/ex-de/maerkte/idx/dax/DAX-Optionen-141164", wait_until="domcontentloaded")
+                page.goto(EUREX_URL, wait_until="domcontentloaded")
                 page.evaluate("document.body.style.zoom = '0.5'")
 
 
@@ -479,16 +1103,7 @@ def scrape_options_data_single():
         
         # First scrape the initially selected date
         seen_strikes = set()
-        #scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time)
-        #scroll_to_top(page)
-
-        #clicks_down = scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time)
-        #scroll_up(page, clicks_down)  # Scroll back up exact amount
-
         scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time)
-        #scroll_to_top(page)
-
-
 
         # Then iterate through other date buttons (limited to first 2 for testing)
         buttons_processed = 0
@@ -509,14 +1124,12 @@ def scrape_options_data_single():
 
             seen_strikes = set()
             scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time)
-            scroll_to_top_with_wheel(page)  # Reset to top after each expiry date
-            #scroll_up(page, clicks_down)
+            scroll_to_top(page)  # Reset to top after each expiry date
             buttons_processed += 1
         
         browser.close()
         
         headers = ['date', 'time', 'contract_date', 'monthly_weekly', 'option_type', 'strike', 
-                  #'contract_type', 'last_trade', 'open', 'high', 'low', 'daily_settlement',
                   'last_trade', 'open', 'high', 'low', 'daily_settlement', 
                   'open_interest', 'volume', 'last_price', 'bid', 'ask']
         
@@ -529,9 +1142,6 @@ def scrape_options_data_single():
         # DATABASE CONNECTION
         upsert_snapshots(df)
 
-
-        ############
-        
         output_txt = ['\t'.join(headers)]
         for row in all_data:
             output_txt.append('\t'.join(str(x) for x in row))
@@ -560,8 +1170,29 @@ def scrape_options_data_single():
 
 if __name__ == "__main__":
     
+    parser = argparse.ArgumentParser(description="Scrape Eurex DAX option prices")
+    parser.add_argument("--engine", choices=["dom", "network"], default="dom",
+                        help="dom: scroll the rendered table, network (experimental, not in CI): "
+                             "parse the table's data feed")
+    parser.add_argument("--record-feed", metavar="DIR", help="network engine: save captured feed responses to DIR")
+    parser.add_argument("--replay-feed", metavar="DIR", help="network engine: parse responses recorded in DIR (offline)")
+    parser.add_argument("--executor", choices=["threaded", "pool", "async"], default=os.getenv("CRAWL_EXECUTOR", "threaded"),
+                        help="threaded: one browser per expiry, pool: CRAWL_POOL_SIZE long-lived browsers, "
+                             "async: one event loop with CRAWL_ASYNC_PAGES concurrent pages (dom engine)")
+    parser.add_argument("--pool-size", type=int, default=CRAWL_POOL_SIZE)
+    parser.add_argument("--async-pages", type=int, default=int(os.getenv("CRAWL_ASYNC_PAGES", "12")))
+    args = parser.parse_args()
+    if args.engine == "network" and os.getenv("CI") and not args.replay_feed:
+        parser.error("--engine network is experimental and not used in CI until a recording of the "
+                     "live feed passes benchmarks/check_feed.py")
+
     load_dotenv()
     print("Starting scraping...")
-    rows = scrape_options_data()
-    print(f"Total rows scraped: {rows}")
-#    data, df = scrape_options_data()
\ No newline at end of file
+    if args.executor == "pool":
+        rows = scrape_options_data_pooled(pool_size=args.pool_size)
+    elif args.executor == "async":
+        from crawl_prices_async import scrape_options_data_async
+        rows = scrape_options_data_async(max_pages=args.async_pages)
+    else:
+        rows = scrape_options_data(engine=args.engine, record_dir=args.record_feed, replay_dir=args.replay_feed)
+    print(f"Total rows scraped: {rows}")
\ No newline at end of file
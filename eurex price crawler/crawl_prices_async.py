@@ -0,0 +1,334 @@
+# crawl_prices_async.py
+"""
+asyncio version of the parallel crawl in crawl_prices.py.
+
+Same flow as scrape_options_data / scrape_single_expiry / scrape_contract_date,
+but on async_playwright: a single event loop drives one browser with up to
+CRAWL_ASYNC_PAGES concurrent pages (one context per expiry) instead of one
+thread and one Chromium per expiry. The rows produced are the same as the
+threaded path since row building is shared (process_rows, VISIBLE_DATA_JS).
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+
+import pytz
+from playwright.async_api import async_playwright
+
+import crawl_prices
+from db_ingest import SnapshotWriter
+from page_profile import PROFILE
+from crawl_metrics import METRICS
+from crawl_schedule import SCHEDULER
+from expiry_cache import ExpiryCheck, load_expiries, save_expiries
+from crawl_prices import (EXPIRY_BUTTONS_JS, HARVEST_STEP_JS, SCROLL_MODE, VISIBLE_DATA_JS, HarvestScroll,
+                          PeakRssSampler, crawl_report, process_harvested, process_rows, reset_crawl_stats,
+                          save_snapshot_rows)
+
+CRAWL_ASYNC_PAGES = int(os.getenv("CRAWL_ASYNC_PAGES", "12"))
+
+DATE_BUTTONS = "div._filter_contract_date_container_1y9l5_7 button._filterButton_15sg6_42"
+
+
+async def get_contract_info(page):
+    with METRICS.phase('contract_info'):
+        selected_buttons = await page.query_selector_all("button._filterButton_15sg6_42._selected_15sg6_67")
+        if len(selected_buttons) < 2:
+            return None, None
+
+        # Second button is always the date button
+        date_btn = selected_buttons[1]
+        contract_date = await date_btn.inner_text()
+        contract_type = 'monthly' if '_monthly_15sg6_63' in await date_btn.get_attribute('class') else 'weekly'
+    return contract_date, contract_type
+
+
+async def fast_click_down(page, num_clicks):
+    with METRICS.phase('scroll'):
+        arrow = await page.query_selector("._arrow_bottom_1htfc_42")
+        if not arrow or not await arrow.is_visible():
+            return False
+
+        for _ in range(num_clicks):
+            if not await arrow.is_visible():
+                return False
+            await arrow.click()
+    return True
+
+
+async def get_visible_data(page):
+    with METRICS.phase('extract'):
+        result = await page.evaluate(VISIBLE_DATA_JS)
+    return result['strikes'], result['calls'], result['puts']
+
+
+async def harvest_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time, max_cycles=500,
+                                on_batch=None):
+    contract_date, contract_type = await get_contract_info(page)
+    if not contract_date:
+        print("Warning: Could not detect contract date!")
+        return 0
+
+    harvested = set()
+    previous_keys = None
+    scroll = HarvestScroll()
+    cycles = 0
+    emitted = len(all_data)
+    while cycles < max_cycles:
+        with METRICS.phase('harvest'):
+            result = await page.evaluate(HARVEST_STEP_JS, scroll.step_args(list(harvested), cycles > 0))
+        cycles += 1
+        with METRICS.phase('process'):
+            process_harvested(result, all_data, seen_strikes, scrape_date, scrape_time, contract_date, contract_type)
+        harvested.update(result['strikes'])
+        if on_batch and len(all_data) > emitted:
+            # SnapshotWriter.put blocks under backpressure, keep it off the loop
+            with METRICS.phase('emit'):
+                await asyncio.to_thread(on_batch, all_data[emitted:])
+            emitted = len(all_data)
+        if cycles > 1 and not scroll.update(result['keys'] != previous_keys):
+            break
+        previous_keys = result['keys']
+    METRICS.add_cycles(cycles)
+    return cycles
+
+
+async def scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time, on_batch=None):
+    if SCROLL_MODE == "harvest":
+        return await harvest_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time,
+                                           on_batch=on_batch)
+
+    emitted = len(all_data)
+
+    contract_date, contract_type = await get_contract_info(page)
+    if not contract_date:
+        print("Warning: Could not detect contract date!")
+        return 0
+
+    total_clicks = 0
+
+    initial_strikes, initial_calls, initial_puts = await get_visible_data(page)
+    if initial_strikes and (initial_calls or initial_puts):
+        process_rows(initial_strikes, initial_calls, initial_puts, all_data, seen_strikes,
+                     scrape_date, scrape_time, contract_date, contract_type)
+
+    consecutive_failures = 0
+    max_failures = 3
+
+    while consecutive_failures < max_failures:
+        scroll_size = min(len(initial_strikes), 15)
+        clicked = await fast_click_down(page, scroll_size)
+        if clicked:
+            total_clicks += scroll_size
+        else:
+            # Arrow disappeared - get final data before stopping
+            strikes, calls, puts = await get_visible_data(page)
+            if strikes and (calls or puts):
+                process_rows(strikes, calls, puts, all_data, seen_strikes,
+                             scrape_date, scrape_time, contract_date, contract_type)
+            consecutive_failures += 1
+            continue
+
+        strikes, calls, puts = await get_visible_data(page)
+        if strikes and (calls or puts):
+            process_rows(strikes, calls, puts, all_data, seen_strikes,
+                         scrape_date, scrape_time, contract_date, contract_type)
+            consecutive_failures = 0
+        else:
+            consecutive_failures += 1
+
+    if on_batch and len(all_data) > emitted:
+        with METRICS.phase('emit'):
+            await asyncio.to_thread(on_batch, all_data[emitted:])
+    return total_clicks
+
+
+async def open_eurex_page(page, show_more=False):
+    crawl_prices._count('page_loads')
+    start = time.time()
+    with METRICS.phase('goto'):
+        await page.goto(crawl_prices.EUREX_URL, wait_until="domcontentloaded")
+        await page.evaluate("document.body.style.zoom = '0.5'")
+
+    # The lean profile never loads the cookie banner
+    if not PROFILE.enabled:
+        with METRICS.phase('cookie'):
+            try:
+                cookie_reject = await page.wait_for_selector("#cookiescript_reject", timeout=2000)
+                if cookie_reject:
+                    await cookie_reject.click()
+            except Exception:
+                pass
+
+    with METRICS.phase('table_wait'):
+        await page.wait_for_selector("table.react-table", timeout=10000)
+    PROFILE.record_time_to_table(time.time() - start)
+
+    if show_more:
+        with METRICS.phase('show_more'):
+            try:
+                show_more_btn = await page.query_selector("button._showMoreLessButton_15sg6_121")
+                if show_more_btn and "Show more" in await show_more_btn.inner_text():
+                    await show_more_btn.click()
+                    await asyncio.sleep(0.3)
+            except Exception:
+                pass
+
+
+async def select_expiry(page, expiry_date):
+    with METRICS.phase('select'):
+        for button in await page.query_selector_all(DATE_BUTTONS):
+            if await button.inner_text() == expiry_date:
+                await button.click()
+                await page.wait_for_selector("table.react-table", timeout=10000)
+                await asyncio.sleep(0.2)
+                return True
+    return False
+
+
+async def new_context(browser):
+    """Context with the shared page profile (request blocking + asset cache)"""
+    context = await browser.new_context()
+    await PROFILE.apply_async(context)
+    return context
+
+
+async def discover_expiry_buttons(browser):
+    with METRICS.expiry('(discover)'):
+        return await _discover_expiry_buttons(browser)
+
+
+async def _discover_expiry_buttons(browser):
+    with METRICS.phase('launch'):
+        context = await new_context(browser)
+        page = METRICS.instrument(await context.new_page())
+    await open_eurex_page(page, show_more=True)
+    buttons = await page.evaluate(EXPIRY_BUTTONS_JS)
+    await context.close()
+    return buttons
+
+
+async def open_checked_page(page, check):
+    """crawl_prices.open_checked_page for async pages"""
+    if check is None or not check.claim():
+        await open_eurex_page(page)
+        return False
+    try:
+        await open_eurex_page(page, show_more=True)
+        check.report(await page.evaluate(EXPIRY_BUTTONS_JS))
+    finally:
+        check.finish()
+    return True
+
+
+async def scrape_single_expiry(browser, semaphore, expiry_date, scrape_date, scrape_time, writer=None, check=None):
+    """Scrape one expiry in its own context; semaphore bounds the open pages"""
+    async with semaphore:
+        print(f"Starting scrape for {expiry_date}...")
+        # Context and page load count for the run, like in the other executors
+        with METRICS.phase('launch'):
+            context = await new_context(browser)
+        try:
+            with METRICS.phase('launch'):
+                page = METRICS.instrument(await context.new_page())
+                page.set_default_timeout(10000)
+            await open_checked_page(page, check)
+            # Each gather() task runs in its own contextvars context, so the scope stays with this expiry
+            with METRICS.expiry(expiry_date):
+                # Expiries that rolled off since the cached list have no button
+                if not await select_expiry(page, expiry_date):
+                    print(f"❌ No date button for {expiry_date}, skipped")
+                    return 0
+
+                all_data = []
+                seen_strikes = set()
+                await scrape_contract_date(page, all_data, seen_strikes, scrape_date, scrape_time,
+                                           on_batch=writer.put if writer else None)
+                print(f"Finished scraping {expiry_date}: {len(all_data)} rows")
+                METRICS.add_rows(len(all_data))
+        finally:
+            with METRICS.phase('close'):
+                await context.close()
+
+    SCHEDULER.record(expiry_date, len(all_data), METRICS.seconds_in(expiry_date))
+    if writer is None:
+        # psycopg2 is blocking, keep it off the event loop
+        await asyncio.to_thread(save_snapshot_rows, all_data, expiry_date)
+    return len(all_data)
+
+
+async def _scrape_options_data(max_pages, scrape_date, scrape_time):
+    async with async_playwright() as p:
+        crawl_prices._count('browser_launches')
+        with METRICS.phase('launch'):
+            browser = await p.chromium.launch(headless=True, args=['--disable-blink-features=AutomationControlled'])
+
+        # Cached expiries of the previous run, checked by the first page (see expiry_cache)
+        url = crawl_prices.EUREX_URL
+        cached = load_expiries(url) if crawl_prices.EXPIRY_CACHE else None
+        if cached:
+            check = ExpiryCheck(url, cached)
+            expiry_dates = [b['date'] for b in cached]
+        else:
+            check = None
+            buttons = await discover_expiry_buttons(browser)
+            save_expiries(url, buttons)
+            expiry_dates = [b['date'] for b in buttons]
+        print(f"Found {len(expiry_dates)} expiry dates: {expiry_dates}")
+
+        semaphore = asyncio.Semaphore(max_pages)
+        writer = SnapshotWriter().start() if crawl_prices.STREAM_INGEST else None
+
+        def start(date):
+            return asyncio.create_task(
+                scrape_single_expiry(browser, semaphore, date, scrape_date, scrape_time, writer, check))
+
+        # Longest expected first, the semaphore lets tasks in in creation order
+        expiry_dates = SCHEDULER.order(expiry_dates, max_pages)
+        tasks = [start(date) for date in expiry_dates]
+        if check is not None:
+            if await asyncio.to_thread(check.wait):
+                added = check.added
+            else:
+                print("⚠️ Cached expiry dates were not checked by a worker page, running discovery")
+                added = check.report(await discover_expiry_buttons(browser))
+            expiry_dates = expiry_dates + added
+            tasks += [start(date) for date in added]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        await browser.close()
+        if writer:
+            await asyncio.to_thread(writer.close)
+
+    total_rows = 0
+    for expiry_date, result in zip(expiry_dates, results):
+        if isinstance(result, Exception):
+            print(f"❌ Error scraping {expiry_date}: {result}")
+        else:
+            total_rows += result
+    if check is not None and check.live is not None:
+        return total_rows, len(check.live)
+    return total_rows, len(expiry_dates)
+
+
+def scrape_options_data_async(max_pages=CRAWL_ASYNC_PAGES, report=None):
+    """Entry point with the same signature style as scrape_options_data"""
+    reset_crawl_stats()
+    sampler = PeakRssSampler().start()
+    start_time = time.time()
+    now = datetime.now(pytz.timezone('Europe/Berlin'))
+    scrape_date = now.strftime('%Y-%m-%d')
+    scrape_time = now.strftime('%H:%M')
+
+    print(f"Starting async scrape ({max_pages} pages) at {scrape_time} on {scrape_date}...")
+    total_rows, expiries = asyncio.run(_scrape_options_data(max_pages, scrape_date, scrape_time))
+
+    elapsed = time.time() - start_time
+    sampler.stop()
+
+    print(f"\n✅ Total: {total_rows} rows in {int(elapsed//60)}m {int(elapsed%60)}s")
+    result = crawl_report(f"async/{max_pages}", total_rows, elapsed, sampler, expiries)
+    if report is not None:
+        report.update(result)
+
+    return total_rows
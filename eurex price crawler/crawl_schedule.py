@@ -0,0 +1,179 @@
+# crawl_schedule.py
+"""
+Cost-aware ordering of the expiries of a crawl.
+
+Every run records rows and wall time per expiry (its METRICS.expiry scope,
+from selecting the date to the end of the scrape in every executor, so
+browser launch and page load are left out); EXPIRY_COSTS_PATH keeps an
+exponentially weighted average of both per expiry date. The next run
+dispatches the expiries longest-first (LPT): long-dated monthlies with many
+strikes start in the first wave instead of setting the crawl's tail.
+An expiry without history is predicted as rows x seconds per row: the rows
+of its neighbouring known expiries (the nearest earlier and later one,
+averaged) times the seconds per row of all known expiries. With no history
+at all the page order is kept.
+
+At the end of a run the predicted and actual durations are logged, with the
+LPT makespan predicted for the number of workers.
+
+CRAWL_SCHEDULE=page keeps the page order (costs are still recorded).
+"""
+import heapq
+import json
+import os
+import statistics
+import threading
+from datetime import datetime
+
+import pytz
+
+CRAWL_SCHEDULE = os.getenv("CRAWL_SCHEDULE", "longest_first")
+EXPIRY_COSTS_PATH = os.getenv("EXPIRY_COSTS_PATH",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), ".expiry_costs.json"))
+EXPIRY_COSTS_ALPHA = float(os.getenv("EXPIRY_COSTS_ALPHA", "0.5"))  # weight of the latest run
+
+BERLIN = pytz.timezone('Europe/Berlin')
+
+
+def lpt_makespan(durations, workers):
+    """Makespan of running durations in the given order on workers, each job on the first free worker"""
+    loads = [0.0] * max(1, workers)
+    for duration in durations:
+        heapq.heapreplace(loads, loads[0] + duration)
+    return max(loads)
+
+
+class ExpiryScheduler:
+    def __init__(self, mode=CRAWL_SCHEDULE, path=None, alpha=EXPIRY_COSTS_ALPHA):
+        self.mode = mode
+        self.path = path
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.predicted = {}   # expiry_date -> predicted seconds of this run
+            self.actual = {}      # expiry_date -> (rows, seconds) of this run
+            self.workers = 1
+
+    # --- history ----------------------------------------------------------
+
+    def load(self):
+        """{expiry_date: {'rows': .., 'seconds': .., 'runs': ..}}, empty without a history file"""
+        try:
+            with open(self.path or EXPIRY_COSTS_PATH, encoding='utf-8') as f:
+                costs = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return costs if isinstance(costs, dict) else {}
+
+    def save(self):
+        """Fold this run's durations into the history, past expiries are dropped"""
+        with self._lock:
+            actual = dict(self.actual)
+        if not actual:
+            return
+        path = self.path or EXPIRY_COSTS_PATH
+        costs = self.load()
+        for expiry_date, (rows, seconds) in actual.items():
+            known = costs.get(expiry_date)
+            if known:
+                rows = self.alpha * rows + (1 - self.alpha) * known['rows']
+                seconds = self.alpha * seconds + (1 - self.alpha) * known['seconds']
+            costs[expiry_date] = {'rows': round(rows, 1), 'seconds': round(seconds, 2),
+                                  'runs': (known or {}).get('runs', 0) + 1}
+
+        today = datetime.now(BERLIN).date()
+        costs = {d: c for d, c in costs.items() if _expiry_day(d) is None or _expiry_day(d) >= today}
+        try:
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(costs, f, indent=1, sort_keys=True)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            print(f"⚠️ Could not write expiry costs {path}: {e}")
+
+    # --- scheduling -------------------------------------------------------
+
+    def order(self, expiry_dates, workers):
+        """expiry_dates in dispatch order for a crawl with `workers` parallel scrapers"""
+        costs = self.load()
+        predicted = {d: predict_seconds(d, costs) for d in expiry_dates}
+
+        ordered = list(expiry_dates)
+        if self.mode == "longest_first" and any(p is not None for p in predicted.values()):
+            # sorted() is stable, ties keep the page order
+            ordered = sorted(ordered, key=lambda d: -predicted[d])
+        with self._lock:
+            # Insertion order = dispatch order, for the predicted makespan
+            self.predicted = {d: predicted[d] for d in ordered if predicted[d] is not None}
+            self.workers = workers
+        return ordered
+
+    def record(self, expiry_date, rows, seconds):
+        """Actual rows and wall time of one scraped expiry (skipped expiries are not recorded)"""
+        if not rows:
+            return
+        with self._lock:
+            self.actual[expiry_date] = (rows, seconds)
+
+    # --- reporting --------------------------------------------------------
+
+    def summary(self):
+        with self._lock:
+            predicted, actual, workers = dict(self.predicted), dict(self.actual), self.workers
+        both = [d for d in actual if d in predicted]
+        summary = {'schedule': self.mode, 'expiries_timed': len(actual), 'expiries_predicted': len(both)}
+        if both:
+            summary['mean_abs_error_s'] = round(
+                statistics.mean(abs(predicted[d] - actual[d][1]) for d in both), 1)
+        if predicted:
+            summary['predicted_makespan_s'] = round(lpt_makespan(predicted.values(), workers), 1)
+        if actual:
+            summary['actual_work_s'] = round(sum(s for _, s in actual.values()), 1)
+        return summary
+
+    def prediction_table(self):
+        """Predicted vs actual seconds per expiry, longest actual first"""
+        with self._lock:
+            predicted, actual = dict(self.predicted), dict(self.actual)
+        lines = [f"{'expiry':<12}{'rows':>7}{'predicted s':>13}{'actual s':>10}{'error s':>9}"]
+        for expiry_date, (rows, seconds) in sorted(actual.items(), key=lambda item: -item[1][1]):
+            guess = predicted.get(expiry_date)
+            error = f"{seconds - guess:>+9.1f}" if guess is not None else f"{'-':>9}"
+            guess = f"{guess:>13.1f}" if guess is not None else f"{'-':>13}"
+            lines.append(f"{expiry_date:<12}{rows:>7}{guess}{seconds:>10.1f}{error}")
+        return "\n".join(lines)
+
+
+def neighbour_rows(expiry_date, costs):
+    """Mean rows of the nearest earlier and later expiry with history, None if there is none"""
+    day = _expiry_day(expiry_date)
+    known = sorted((_expiry_day(d), c['rows']) for d, c in costs.items() if _expiry_day(d) is not None)
+    if day is None or not known:
+        return None
+    earlier = [rows for d, rows in known if d < day][-1:]
+    later = [rows for d, rows in known if d > day][:1]
+    return statistics.mean(earlier + later)
+
+
+def predict_seconds(expiry_date, costs):
+    """Seconds of the expiry's history, else its neighbours' rows x seconds per row, None without history"""
+    if expiry_date in costs:
+        return costs[expiry_date]['seconds']
+    rows = neighbour_rows(expiry_date, costs)
+    total_rows = sum(c['rows'] for c in costs.values())
+    if rows is None or not total_rows:
+        return None
+    return rows * sum(c['seconds'] for c in costs.values()) / total_rows
+
+
+def _expiry_day(text):
+    try:
+        return datetime.strptime(text, '%d.%m.%Y').date()
+    except ValueError:
+        return None
+
+
+# Shared by the crawl entry points of the process
+SCHEDULER = ExpiryScheduler()
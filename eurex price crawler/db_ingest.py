@@ -1,15 +1,23 @@
 # db_ingest.py
-import os, json
+import os, io, csv, json, hashlib, queue, threading, time, zlib
+import numpy as np
 import pandas as pd
 import pytz
 from datetime import datetime, timezone
 import psycopg2
 from psycopg2.extras import execute_values
 from dotenv import load_dotenv
+from db_pool import POOL
+from crawl_metrics import METRICS
+from parquet_archive import archive_prepared
+from rollups import refresh_for_crawl
 
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+# Column layout of a scraped row, as produced by crawl_prices
+SNAPSHOT_HEADERS = ['date', 'time', 'contract_date', 'monthly_weekly', 'option_type', 'strike',
+                    'last_trade', 'open', 'high', 'low', 'daily_settlement',
+                    'open_interest', 'volume', 'last_price', 'bid', 'ask']
 
 def clean_german_number(value):
     """Convert German number format to float: 8.977,00 -> 8977.00"""
@@ -24,6 +32,46 @@ def clean_german_number(value):
     except:
         return None
 
+def clean_german_series(series):
+    """
+    clean_german_number for a whole column at once: strings are parsed with
+    the .str accessor and pd.to_numeric, values that are already numbers are
+    kept, everything unparsable becomes NaN.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    try:
+        text = series.str.replace('.', '', regex=False)
+    except AttributeError:  # no strings in the column at all
+        return pd.to_numeric(series, errors='coerce').astype(float)
+    is_text = text.notna()
+    text = text.str.replace(',', '.', regex=False).str.strip()
+    # '-' and '' are the usual placeholders; a plain float cast is much faster
+    # than to_numeric, which is only needed if something else is unparsable
+    text = text.where(~text.isin(['-', '']))
+    try:
+        parsed = text.astype(float)
+    except (ValueError, TypeError):
+        parsed = pd.to_numeric(text, errors='coerce').astype(float)
+    if not (series.notna() & ~is_text).any():
+        return parsed
+    numeric = pd.to_numeric(series.where(~is_text), errors='coerce').astype(float)
+    return parsed.where(is_text, numeric)
+
+def _parse_failures(original, cleaned):
+    """Original text where a value was given but did not parse, NaN elsewhere"""
+    given = original.notna() & ~original.isin(['-', ''])
+    return original.where(given & cleaned.isna())
+
+def _unparsed_column(index, failed):
+    values = [None] * len(index)
+    if failed:
+        failed = pd.DataFrame(failed, index=index)
+        for pos in np.flatnonzero(failed.notna().any(axis=1).to_numpy()):
+            row = failed.iloc[pos]
+            values[pos] = {col: str(v) for col, v in row.items() if pd.notna(v)}
+    return pd.Series(values, index=index, dtype=object)
+
 def prepare_df(df):
     df = df.copy()
     
@@ -53,16 +101,23 @@ def prepare_df(df):
     numeric_cols = ['strike', 'last_trade', 'open', 'high', 'low', 
                     'daily_settlement', 'last_price', 'bid', 'ask']
     
+    failed = {}
     for col in numeric_cols:
         if col in df.columns:
-            df[col] = df[col].apply(clean_german_number)
+            original = df[col]
+            df[col] = clean_german_series(original)
+            failed[col] = _parse_failures(original, df[col])
     
     # Clean integer columns
     int_cols = ['open_interest', 'volume']
     for col in int_cols:
         if col in df.columns:
-            df[col] = df[col].apply(clean_german_number)
-            df[col] = df[col].astype('Int64')  # Nullable integer
+            original = df[col]
+            df[col] = clean_german_series(original).astype('Int64')  # Nullable integer
+            failed[col] = _parse_failures(original, df[col])
+
+    # Original text of every field that could not be parsed, None for clean rows
+    df['unparsed'] = _unparsed_column(df.index, failed)
     
     # Rename to match database columns
     df = df.rename(columns={
@@ -73,53 +128,57 @@ def prepare_df(df):
     
     return df
 
-def upsert_snapshots(df):
-    df = prepare_df(df)
-    
-    records = []
-    crawl_time = datetime.now(timezone.utc)
-    
-    for _, row in df.iterrows():
-        raw = row.to_dict()
-
-        # Helper function to convert pandas NA to None
-        def safe_value(val):
-            if pd.isna(val):
-                return None
-            return val
-        
-        
-        rec = (
-            row['quote_time'].to_pydatetime() if pd.notna(row['quote_time']) else None,
-            crawl_time,
-            row['expiry_date'],
-            safe_value(row.get('monthly_weekly')),
-            safe_value(row.get('option_type')),
-            safe_value(row.get('strike')),
-            safe_value(row.get('last_trade')),
-            safe_value(row.get('open_price')),
-            safe_value(row.get('high_price')),
-            safe_value(row.get('low_price')),
-            safe_value(row.get('daily_settlement')),
-            safe_value(row.get('open_interest')),
-            safe_value(row.get('volume')),
-            safe_value(row.get('last_price')),
-            safe_value(row.get('bid')),
-            safe_value(row.get('ask')),
-            json.dumps({k: None if pd.isna(v) else v for k, v in raw.items()}, default=str)
-        )
-        records.append(rec)
+# Record layout after quote_time, crawl_time, expiry_date (see SNAPSHOT_COLUMNS)
+RECORD_VALUE_COLUMNS = ['monthly_weekly', 'option_type', 'strike', 'last_trade', 'open_price',
+                        'high_price', 'low_price', 'daily_settlement', 'open_interest', 'volume',
+                        'last_price', 'bid', 'ask']
 
-    if not records:
-        print("No records to insert.")
-        return
+def _python_values(series):
+    """Column -> list of Python objects with every NA as None"""
+    return series.astype(object).where(series.notna(), None).tolist()
 
-    insert_sql = """
-    INSERT INTO options_snapshots
-    (quote_time, crawl_time, expiry_date, monthly_weekly, option_type, strike,
+# What happens to the raw JSON copy of each row:
+#   always   - stored in options_snapshots.raw (previous behaviour)
+#   on_error - stored only for rows where some field failed to parse
+#   cold     - zlib-compressed into options_snapshots_raw, raw column left NULL
+RAW_RETENTION = os.getenv("RAW_RETENTION", "always")
+
+def build_records(df, retention=None, crawl_time=None):
+    """Prepared DataFrame -> options_snapshots tuples (column order of INSERT_SQL)"""
+    retention = retention or RAW_RETENTION
+    crawl_time = crawl_time or datetime.now(timezone.utc)
+    n = len(df)
+
+    # Convert each column once and zip the columns into rows
+    columns = {col: _python_values(df[col]) for col in df.columns if col != 'unparsed'}
+    missing = [None] * n
+    unparsed = df['unparsed'].tolist() if 'unparsed' in df.columns else missing
+
+    quote_times = [t.to_pydatetime() if t is not None else None for t in columns['quote_time']]
+    expiry_dates = df['expiry_date'].tolist()
+    values = [columns.get(col, missing) for col in RECORD_VALUE_COLUMNS]
+
+    names = list(columns)
+    raws = []
+    for row, failed in zip(zip(*columns.values()), unparsed):
+        if retention == 'on_error' and failed is None:
+            raws.append(None)
+            continue
+        raw = dict(zip(names, row))
+        if failed is not None:
+            raw['unparsed'] = failed
+        raws.append(json.dumps(raw, default=str))
+
+    return [
+        (quote_time, crawl_time, expiry_date) + row + (raw,)
+        for quote_time, expiry_date, row, raw in zip(quote_times, expiry_dates, zip(*values), raws)
+    ]
+
+SNAPSHOT_COLUMNS = """quote_time, crawl_time, expiry_date, monthly_weekly, option_type, strike,
      last_trade, open_price, high_price, low_price, daily_settlement, open_interest, volume, 
-     last_price, bid, ask, raw)
-    VALUES %s
+     last_price, bid, ask, raw"""
+
+UPSERT_CLAUSE = """
     ON CONFLICT (quote_time, expiry_date, strike, option_type) 
     DO UPDATE SET
       last_trade = EXCLUDED.last_trade,
@@ -135,19 +194,548 @@ def upsert_snapshots(df):
       raw = EXCLUDED.raw,
       crawl_time = EXCLUDED.crawl_time;
     """
-    
-    print(f"Connecting to database...")
-    conn = psycopg2.connect(DATABASE_URL)
-    cur = conn.cursor()
-    
+
+INSERT_SQL = f"""
+    INSERT INTO options_snapshots
+    ({SNAPSHOT_COLUMNS})
+    VALUES %s
+    {UPSERT_CLAUSE}"""
+
+# --- COPY bulk load ------------------------------------------------------
+# INGEST_METHOD=copy (default) streams the records as CSV with COPY FROM STDIN
+# into a session-local staging table and merges them into options_snapshots
+# with one INSERT ... SELECT ... ON CONFLICT, same upsert semantics as
+# INSERT_SQL. If the COPY path fails the batch is retried with
+# execute_values (INGEST_METHOD=values always uses it).
+INGEST_METHOD = os.getenv("INGEST_METHOD", "copy")
+
+STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS options_snapshots_staging
+    (LIKE options_snapshots INCLUDING DEFAULTS)
+    ON COMMIT DELETE ROWS;
+    """
+
+MERGE_SQL = f"""
+    INSERT INTO options_snapshots
+    ({SNAPSHOT_COLUMNS})
+    SELECT {SNAPSHOT_COLUMNS}
+    FROM options_snapshots_staging
+    {UPSERT_CLAUSE}"""
+
+def copy_records(cur, records):
+    """COPY records into the staging table and merge them, returns rows merged"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for rec in records:
+        writer.writerow(rec)
+    buffer.seek(0)
+
+    cur.execute(STAGING_SQL)
+    cur.execute("TRUNCATE options_snapshots_staging")
+    cur.copy_expert(
+        f"COPY options_snapshots_staging ({SNAPSHOT_COLUMNS}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+    cur.execute(MERGE_SQL)
+    return len(records)
+
+def blank_to_null(records):
+    """
+    Records with every '' replaced by None. COPY in CSV format reads an
+    unquoted empty field as NULL, execute_values would store ''; both
+    methods (and options_latest) store NULL this way.
+    """
+    return [tuple(None if v == '' else v for v in rec) if '' in rec else rec for rec in records]
+
+def insert_records(cur, records, method=None):
+    """Upsert records into options_snapshots with COPY or execute_values"""
+    method = method or INGEST_METHOD
+    records = blank_to_null(records)
+    if method == "copy":
+        cur.execute("SAVEPOINT copy_load")
+        try:
+            copy_records(cur, records)
+            cur.execute("RELEASE SAVEPOINT copy_load")
+            return
+        except Exception as e:
+            cur.execute("ROLLBACK TO SAVEPOINT copy_load")
+            print(f"⚠️ COPY load failed, falling back to INSERT ... VALUES: {e}")
+    execute_values(cur, INSERT_SQL, records, page_size=1000)
+
+# --- Delta ingest --------------------------------------------------------
+# With delta=True only contracts whose quote values changed since the last
+# written snapshot are inserted. options_snapshot_state keeps one row per
+# contract with a hash of the last written values (value_hash, quote_time)
+# and the last crawl that saw the contract at all (last_seen).
+# options_snapshot_ranges keeps the same last_seen per written snapshot, so
+# every snapshot is valid from its quote_time until the last crawl that saw
+# it unchanged. options_crawls records the completed crawls of each expiry
+# (seal_crawl). The price at any time T is the latest snapshot with
+# quote_time <= T, unless a completed crawl of its expiry after the end of
+# that range and at or before T no longer saw the contract (see options_asof
+# in database-schema.sql). A contract that comes back after a crawl missed
+# it gets a new snapshot, even with unchanged values.
+DELTA_INGEST = os.getenv("DELTA_INGEST", "0") == "1"
+
+# Index range of the quote values (last_trade .. ask) in a record
+VALUE_SLICE = slice(6, 16)
+
+def value_hash(rec):
+    values = [None if v is None else float(v) for v in rec[VALUE_SLICE]]
+    return hashlib.md5(json.dumps(values).encode('utf-8')).hexdigest()
+
+def contract_key(expiry_date, option_type, strike):
+    return (expiry_date, option_type, float(strike))
+
+def filter_changed(cur, records):
+    """
+    Drop records whose values match the last written snapshot of their
+    contract and that were seen by the last completed crawl of their
+    expiry. Returns (changed records, state rows for every record).
+    """
+    expiries = sorted({rec[2] for rec in records if rec[2] is not None})
+    cur.execute(
+        "SELECT expiry_date, option_type, strike, value_hash, quote_time, last_seen "
+        "FROM options_snapshot_state WHERE expiry_date = ANY(%s)",
+        (expiries,)
+    )
+    last = {contract_key(e, t, s): (h, q, seen) for e, t, s, h, q, seen in cur.fetchall()}
+    cur.execute(
+        "SELECT expiry_date, max(quote_time) FROM options_crawls WHERE expiry_date = ANY(%s) "
+        "GROUP BY expiry_date",
+        (expiries,)
+    )
+    last_crawl = dict(cur.fetchall())
+
+    changed = []
+    state = []
+    for rec in records:
+        h = value_hash(rec)
+        if rec[2] is None or rec[4] is None or rec[5] is None:
+            changed.append(rec)  # let the insert report the bad row as before
+            continue
+        prev_hash, prev_quote_time, prev_seen = last.get(contract_key(rec[2], rec[4], rec[5]), (None,) * 3)
+        crawl = last_crawl.get(rec[2])
+        # Missed by a completed crawl since: the old snapshot's range ends there
+        missed = prev_seen is not None and crawl is not None and prev_seen < crawl < rec[0]
+        is_changed = prev_hash != h or missed
+        if is_changed:
+            changed.append(rec)
+        # (expiry_date, option_type, strike, value_hash, quote_time, last_seen, changed)
+        state.append((rec[2], rec[4], rec[5], h, rec[0] if is_changed else prev_quote_time, rec[0], is_changed))
+    return changed, state
+
+STATE_SQL = """
+INSERT INTO options_snapshot_state
+(expiry_date, option_type, strike, value_hash, quote_time, last_seen)
+VALUES %s
+ON CONFLICT (expiry_date, option_type, strike)
+DO UPDATE SET
+  value_hash = EXCLUDED.value_hash,
+  quote_time = EXCLUDED.quote_time,
+  last_seen = GREATEST(options_snapshot_state.last_seen, EXCLUDED.last_seen);
+"""
+
+SEEN_SQL = """
+UPDATE options_snapshot_state AS s
+SET last_seen = GREATEST(s.last_seen, v.last_seen)
+FROM (VALUES %s) AS v (expiry_date, option_type, strike, last_seen)
+WHERE s.expiry_date = v.expiry_date AND s.option_type = v.option_type AND s.strike = v.strike;
+"""
+
+RANGE_SQL = """
+INSERT INTO options_snapshot_ranges
+(expiry_date, option_type, strike, quote_time, last_seen)
+VALUES %s
+ON CONFLICT (expiry_date, option_type, strike, quote_time)
+DO UPDATE SET last_seen = GREATEST(options_snapshot_ranges.last_seen, EXCLUDED.last_seen);
+"""
+
+def write_state(cur, state):
+    # One row per contract, ON CONFLICT cannot touch the same row twice
+    state = list({(row[0], row[1], row[2]): row for row in state}.values())
+    written = [row[:6] for row in state if row[6]]
+    unchanged = [(row[0], row[1], row[2], row[5]) for row in state if not row[6]]
+    if written:
+        execute_values(cur, STATE_SQL, written, page_size=1000)
+    if unchanged:
+        execute_values(cur, SEEN_SQL, unchanged, page_size=1000,
+                       template="(%s::date, %s::varchar, %s::numeric, %s::timestamptz)")
+    # Extends the range of the snapshot each contract is currently on
+    ranges = [row[:3] + row[4:6] for row in state if row[4] is not None]
+    if ranges:
+        execute_values(cur, RANGE_SQL, ranges, page_size=1000)
+
+def crawl_stamps(records):
+    """{expiry_date: earliest quote_time} of the records, the stamp seal_crawl records"""
+    stamps = {}
+    for rec in records:
+        if rec[0] is None or rec[2] is None:
+            continue
+        if rec[2] not in stamps or rec[0] < stamps[rec[2]]:
+            stamps[rec[2]] = rec[0]
+    return stamps
+
+CRAWL_SQL = """
+INSERT INTO options_crawls (expiry_date, quote_time)
+VALUES %s
+ON CONFLICT DO NOTHING;
+"""
+
+# Contracts the sealed crawl no longer saw leave the dashboard, like in options_asof
+UNSEEN_LATEST_SQL = """
+DELETE FROM options_latest AS l
+USING options_snapshot_state AS s, (VALUES %s) AS c (expiry_date, quote_time)
+WHERE s.expiry_date = c.expiry_date AND s.last_seen < c.quote_time
+  AND l.expiry_date = s.expiry_date AND l.option_type = s.option_type AND l.strike = s.strike;
+"""
+
+def seal_crawl(cur, stamps):
+    """
+    Record a completed delta crawl of the expiries in stamps ({expiry_date:
+    earliest quote_time written for it}). Only sealed crawls end the range
+    of contracts they did not see, so a crawl still being written (or one
+    that lost rows) never hides contracts from options_asof.
+    """
+    if not stamps:
+        return
+    rows = sorted(stamps.items())
+    execute_values(cur, CRAWL_SQL, rows)
+    execute_values(cur, UNSEEN_LATEST_SQL, rows, template="(%s::date, %s::timestamptz)")
+
+def refresh_rollups(cur, stamps):
+    """Recompute the bars of a crawl's hours and expiries once all its rows are written"""
+    if OHLC_ROLLUPS:
+        refresh_for_crawl(cur, stamps)
+
+COLD_RAW_SQL = """
+    INSERT INTO options_snapshots_raw (quote_time, expiry_date, strike, option_type, raw_gz)
+    VALUES %s
+    ON CONFLICT (quote_time, expiry_date, strike, option_type)
+    DO UPDATE SET raw_gz = EXCLUDED.raw_gz;
+    """
+
+def split_cold_raw(records):
+    """Move the raw JSON of each record into compressed options_snapshots_raw rows"""
+    cold = []
+    hot = []
+    for rec in records:
+        if rec[-1] is not None:
+            cold.append((rec[0], rec[2], rec[5], rec[4],
+                         psycopg2.Binary(zlib.compress(rec[-1].encode('utf-8')))))
+        hot.append(rec[:-1] + (None,))
+    return hot, cold
+
+# --- Latest state ---------------------------------------------------------
+# options_latest keeps one row per contract with its newest written snapshot,
+# upserted in the same transaction as the snapshots. latest_options (and so
+# options_with_margins) read it instead of ranking the whole history.
+LATEST_COLUMNS = """quote_time, crawl_time, expiry_date, monthly_weekly, option_type, strike,
+     last_trade, open_price, high_price, low_price, daily_settlement, open_interest, volume,
+     last_price, bid, ask"""
+
+LATEST_SQL = f"""
+    INSERT INTO options_latest
+    ({LATEST_COLUMNS})
+    VALUES %s
+    ON CONFLICT (expiry_date, option_type, strike)
+    DO UPDATE SET
+      quote_time = EXCLUDED.quote_time,
+      crawl_time = EXCLUDED.crawl_time,
+      monthly_weekly = EXCLUDED.monthly_weekly,
+      last_trade = EXCLUDED.last_trade,
+      open_price = EXCLUDED.open_price,
+      high_price = EXCLUDED.high_price,
+      low_price = EXCLUDED.low_price,
+      daily_settlement = EXCLUDED.daily_settlement,
+      open_interest = EXCLUDED.open_interest,
+      volume = EXCLUDED.volume,
+      last_price = EXCLUDED.last_price,
+      bid = EXCLUDED.bid,
+      ask = EXCLUDED.ask
+    WHERE options_latest.quote_time <= EXCLUDED.quote_time;
+    """
+
+def write_latest(cur, records):
+    """Upsert the newest record of each contract into options_latest"""
+    newest = {}
+    for rec in records:
+        if rec[0] is None or rec[2] is None or rec[4] is None or rec[5] is None:
+            continue
+        key = contract_key(rec[2], rec[4], rec[5])
+        if key not in newest or newest[key][0] <= rec[0]:
+            newest[key] = rec
+    if newest:
+        execute_values(cur, LATEST_SQL, [rec[:-1] for rec in newest.values()], page_size=1000)
+
+# Hourly/daily bars (rollups.py) are recomputed once per crawl by finish_crawl
+OHLC_ROLLUPS = os.getenv("OHLC_ROLLUPS", "1") == "1"
+
+def write_records(cur, records, delta, retention=None):
+    """Insert records on cur (no commit), returns the number of rows written"""
+    retention = retention or RAW_RETENTION
+    records = blank_to_null(records)
+    if delta:
+        observed = len(records)
+        records, state = filter_changed(cur, records)
+        print(f"Delta ingest: {len(records)} of {observed} contracts changed")
+    cold = []
+    if retention == 'cold':
+        records, cold = split_cold_raw(records)
+    if records:
+        insert_records(cur, records)
+        write_latest(cur, records)
+    if cold:
+        execute_values(cur, COLD_RAW_SQL, cold, page_size=1000)
+    if delta:
+        write_state(cur, state)
+    return len(records)
+
+# Every prepared batch is also appended to the local Parquet archive
+# (parquet_archive.py), before and independent of the database write, with
+# the crawl_time its database rows get.
+PARQUET_ARCHIVE = os.getenv("PARQUET_ARCHIVE", "1") == "1"
+
+def archive_snapshots(df, crawl_time):
+    if not PARQUET_ARCHIVE:
+        return
     try:
-        execute_values(cur, insert_sql, records, page_size=1000)
-        conn.commit()
-        print(f"✅ Successfully inserted/updated {len(records)} rows")
+        archive_prepared(df, crawl_time=crawl_time)
     except Exception as e:
-        conn.rollback()
-        print(f"❌ Database error: {e}")
-        raise
-    finally:
-        cur.close()
-        conn.close()
\ No newline at end of file
+        print(f"⚠️ Parquet archive write failed: {e}")
+
+def upsert_snapshots(df, delta=None):
+    """
+    Upsert a scraped DataFrame into options_snapshots.
+
+    delta: only write contracts whose values changed since their last
+    written snapshot (defaults to DELTA_INGEST).
+    """
+    if delta is None:
+        delta = DELTA_INGEST
+
+    crawl_time = datetime.now(timezone.utc)
+    with METRICS.phase('prepare'):
+        df = prepare_df(df)
+    with METRICS.phase('archive'):
+        archive_snapshots(df, crawl_time)
+    with METRICS.phase('prepare'):
+        records = build_records(df, crawl_time=crawl_time)
+
+    if not records:
+        print("No records to insert.")
+        return
+    
+    with POOL.connection() as conn, METRICS.phase('db_write'):
+        cur = conn.cursor()
+        try:
+            written = write_records(cur, records, delta)
+            stamps = crawl_stamps(records)
+            if delta:
+                seal_crawl(cur, stamps)
+            refresh_rollups(cur, stamps)
+            conn.commit()
+            print(f"✅ Successfully inserted/updated {written} rows")
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Database error: {e}")
+            raise
+        finally:
+            cur.close()
+
+
+# --- Streaming writer ----------------------------------------------------
+# Scrapers push row batches (SNAPSHOT_HEADERS lists) as they read them; one
+# writer thread normalizes and flushes them over a single connection once
+# WRITER_BATCH_ROWS rows are pending or WRITER_FLUSH_SECONDS have passed.
+# The queue is bounded, so put() blocks the scrapers while the database is
+# behind instead of piling rows up in memory.
+WRITER_QUEUE_SIZE = int(os.getenv("WRITER_QUEUE_SIZE", "64"))        # batches
+WRITER_BATCH_ROWS = int(os.getenv("WRITER_BATCH_ROWS", "2000"))
+WRITER_FLUSH_SECONDS = float(os.getenv("WRITER_FLUSH_SECONDS", "5"))
+
+_STOP = object()
+
+class SnapshotWriter:
+    def __init__(self, queue_size=WRITER_QUEUE_SIZE, batch_rows=WRITER_BATCH_ROWS,
+                 flush_seconds=WRITER_FLUSH_SECONDS, delta=None):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.delta = DELTA_INGEST if delta is None else delta
+        self.stats = {'rows_received': 0, 'rows_written': 0, 'flushes': 0, 'failed_flushes': 0,
+                      'rows_dropped': 0, 'blocked_s': 0.0, 'max_queue': 0, 'db_s': 0.0}
+        self._stats_lock = threading.Lock()
+        self._stamps = {}  # expiry_date -> earliest quote_time written, sealed by close()
+        self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def put(self, rows):
+        """Queue a batch of rows, blocks while the queue is full"""
+        if not rows:
+            return
+        start = time.time()
+        self.queue.put(list(rows))
+        with self._stats_lock:
+            self.stats['rows_received'] += len(rows)
+            self.stats['blocked_s'] += time.time() - start
+            self.stats['max_queue'] = max(self.stats['max_queue'], self.queue.qsize())
+
+    def close(self):
+        """Flush everything still queued and stop the writer thread"""
+        self.queue.put(_STOP)
+        self._thread.join()
+        print(f"✅ Writer: {self.stats['rows_written']} rows in {self.stats['flushes']} flushes "
+              f"({self.stats['failed_flushes']} failed), DB {self.stats['db_s']:.1f}s, "
+              f"scrapers blocked {self.stats['blocked_s']:.1f}s")
+        return self.stats
+
+    def _drain(self):
+        # Keep consuming so scrapers never block on a dead writer
+        while True:
+            batch = self.queue.get()
+            if batch is _STOP:
+                return
+            self.stats['rows_dropped'] += len(batch)
+
+    def _run(self):
+        try:
+            conn = POOL.getconn()
+        except Exception as e:
+            print(f"❌ Writer could not connect to the database, rows are dropped: {e}")
+            self._drain()
+            return
+        pending = []
+        last_flush = time.time()
+        try:
+            while True:
+                timeout = max(0.0, self.flush_seconds - (time.time() - last_flush))
+                try:
+                    batch = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    batch = None
+
+                if batch is _STOP:
+                    break
+                if batch:
+                    pending.extend(batch)
+                if pending and (len(pending) >= self.batch_rows
+                                or time.time() - last_flush >= self.flush_seconds):
+                    conn = self._flush(conn, pending)
+                    pending = []
+                    last_flush = time.time()
+                    if conn is None:
+                        # No connection to be had: keep the scrapers and close() from blocking
+                        self._drain()
+                        return
+                elif not pending:
+                    last_flush = time.time()
+
+            if pending:
+                conn = self._flush(conn, pending)
+            if conn is not None:
+                self._seal(conn)
+                self._refresh_rollups(conn)
+        finally:
+            if conn is not None:
+                POOL.putconn(conn)
+
+    def _reconnect(self, conn):
+        # A dropped connection is swapped for a fresh one from the pool
+        if not conn.closed:
+            return conn
+        POOL.putconn(conn, close=True)
+        return POOL.getconn()
+
+    def _flush(self, conn, rows):
+        """
+        Write one batch. A failure anywhere (parsing, archive, database) only
+        costs this batch; returns the connection to go on with, None once
+        the database cannot be reached any more.
+        """
+        start = time.time()
+        try:
+            conn = self._reconnect(conn)
+        except Exception as e:
+            self.stats['failed_flushes'] += 1
+            self.stats['rows_dropped'] += len(rows)
+            print(f"❌ Writer lost the database connection, rows are dropped: {e}")
+            return None
+        try:
+            # Batches mix expiries, the writer's phases get a scope of their own
+            with METRICS.expiry('(writer)'):
+                self._write_batch(conn, rows)
+        except Exception as e:
+            self.stats['failed_flushes'] += 1
+            self.stats['rows_dropped'] += len(rows)
+            print(f"❌ Writer flush of {len(rows)} rows failed: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass  # a dropped connection is replaced on the next flush
+        finally:
+            self.stats['db_s'] += time.time() - start
+        return conn
+
+    def _seal(self, conn):
+        # A crawl that lost rows is not sealed: it would end the ranges of the lost contracts
+        if not self.delta or not self._stamps or self.stats['rows_dropped']:
+            return
+        try:
+            cur = conn.cursor()
+            try:
+                seal_crawl(cur, self._stamps)
+                conn.commit()
+            finally:
+                cur.close()
+        except Exception as e:
+            print(f"⚠️ Could not record the completed crawl: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+
+    def _refresh_rollups(self, conn):
+        # Once per crawl after the last flush, in its own transaction
+        if not OHLC_ROLLUPS or not self._stamps:
+            return
+        try:
+            cur = conn.cursor()
+            try:
+                with METRICS.expiry('(writer)'), METRICS.phase('rollups'):
+                    refresh_rollups(cur, self._stamps)
+                conn.commit()
+            finally:
+                cur.close()
+        except Exception as e:
+            print(f"⚠️ Could not refresh the OHLC bars (backfill with rollups.py): {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+
+    def _write_batch(self, conn, rows):
+        with METRICS.phase('prepare'):
+            df = pd.DataFrame(rows, columns=SNAPSHOT_HEADERS)
+            df = df.replace({np.nan: None})
+            df = prepare_df(df)
+        crawl_time = datetime.now(timezone.utc)
+        with METRICS.phase('archive'):
+            archive_snapshots(df, crawl_time)
+        with METRICS.phase('prepare'):
+            records = build_records(df, crawl_time=crawl_time)
+        cur = conn.cursor()
+        try:
+            with METRICS.phase('db_write'):
+                written = write_records(cur, records, self.delta)
+                conn.commit()
+        finally:
+            cur.close()
+        self.stats['rows_written'] += written
+        self.stats['flushes'] += 1
+        for expiry_date, quote_time in crawl_stamps(records).items():
+            if expiry_date not in self._stamps or quote_time < self._stamps[expiry_date]:
+                self._stamps[expiry_date] = quote_time
@@ -0,0 +1,202 @@
+# db_pool.py
+"""
+Shared Postgres connection pool for the crawler, the margin job and the lock
+runner.
+
+One bounded psycopg2 ThreadedConnectionPool per process instead of a fresh
+psycopg2.connect (TLS handshake + auth against Supabase) on every write:
+  - getconn() blocks while DB_POOL_MAX connections are checked out, rather
+    than raising PoolError like ThreadedConnectionPool does
+  - connections idle longer than DB_HEALTH_CHECK_IDLE seconds get a
+    SELECT 1 before they are handed out; broken ones are discarded
+  - every connection runs with statement_timeout = DB_STATEMENT_TIMEOUT_MS;
+    migrations and backfills lift it per transaction (without_statement_timeout)
+  - usage counters (checkouts, wait time, peak in use, ...) for the reports
+
+The pool is created lazily on the first checkout, importing this module never
+connects.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "8"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "120000"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+DB_HEALTH_CHECK_IDLE = float(os.getenv("DB_HEALTH_CHECK_IDLE", "30"))  # seconds
+
+
+class DatabasePool:
+    def __init__(self, dsn=None, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX,
+                 statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS, connect_timeout=DB_CONNECT_TIMEOUT,
+                 health_check_idle=DB_HEALTH_CHECK_IDLE):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.statement_timeout_ms = statement_timeout_ms
+        self.connect_timeout = connect_timeout
+        self.health_check_idle = health_check_idle
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}   # id(conn) -> time it was returned
+        self._known = set()    # id(conn) of every connection handed out so far
+        self.reset_stats()
+
+    # --- stats ------------------------------------------------------------
+
+    def reset_stats(self):
+        with self._lock:
+            in_use = getattr(self, 'stats', {}).get('in_use', 0)
+            self.stats = {
+                'checkouts': 0,
+                'connections_opened': 0,
+                'connections_discarded': 0,
+                'health_checks': 0,
+                'health_check_failures': 0,
+                'wait_s': 0.0,
+                'in_use': in_use,
+                'max_in_use': in_use,
+            }
+
+    def _add(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def summary(self):
+        with self._lock:
+            summary = dict(self.stats)
+        summary['pool_max'] = self.maxconn
+        summary['wait_s'] = round(summary['wait_s'], 2)
+        return summary
+
+    # --- checkout / return ------------------------------------------------
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                dsn = self.dsn or DATABASE_URL
+                if not dsn:
+                    raise RuntimeError("DATABASE_URL env var not set")
+                self._pool = pg_pool.ThreadedConnectionPool(
+                    self.minconn, self.maxconn, dsn,
+                    connect_timeout=self.connect_timeout,
+                    options=f"-c statement_timeout={self.statement_timeout_ms}",
+                )
+            return self._pool
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        idle = time.time() - self._last_used.get(id(conn), time.time())
+        if idle < self.health_check_idle:
+            return True
+        self._add('health_checks')
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            self._add('health_check_failures')
+            return False
+
+    def getconn(self):
+        """Check out a healthy connection, blocks while the pool is exhausted"""
+        start = time.time()
+        self._slots.acquire()
+        try:
+            pool = self._get_pool()
+            while True:
+                conn = pool.getconn()
+                if id(conn) not in self._known:
+                    self._known.add(id(conn))
+                    self._add('connections_opened')
+                    break
+                if self._healthy(conn):
+                    break
+                self._discard(pool, conn)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.stats['checkouts'] += 1
+            self.stats['wait_s'] += time.time() - start
+            self.stats['in_use'] += 1
+            self.stats['max_in_use'] = max(self.stats['max_in_use'], self.stats['in_use'])
+        return conn
+
+    def _discard(self, pool, conn):
+        self._known.discard(id(conn))
+        self._last_used.pop(id(conn), None)
+        self._add('connections_discarded')
+        pool.putconn(conn, close=True)
+
+    def putconn(self, conn, close=False):
+        """Return a connection; close=True (or a broken connection) drops it"""
+        pool = self._pool
+        try:
+            if not close and not conn.closed and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                # Never hand out a connection with an open transaction
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+            if close or conn.closed:
+                self._discard(pool, conn)
+            else:
+                self._last_used[id(conn)] = time.time()
+                pool.putconn(conn)
+        finally:
+            self._add('in_use', -1)
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        with POOL.connection() as conn: ...
+
+        Rolls back on an exception; connection-level errors drop the
+        connection instead of returning it to the pool.
+        """
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def closeall(self):
+        with self._lock:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.closeall()
+            self._pool = None
+            self._known.clear()
+            self._last_used.clear()
+
+
+# Shared by everything that talks to DATABASE_URL in this process
+POOL = DatabasePool()
+
+
+def without_statement_timeout(cur):
+    """
+    Lift DB_STATEMENT_TIMEOUT_MS for the rest of cur's transaction, for the
+    long statements of migrations and backfills. SET LOCAL ends with the
+    transaction, so call it again after every commit; the connection goes
+    back to the pool with the usual timeout.
+    """
+    cur.execute("SET LOCAL statement_timeout = 0")
@@ -0,0 +1,113 @@
+# expiry_cache.py
+"""
+Warm start for expiry discovery.
+
+The expiry buttons read from the page (date + monthly flag) are stored after
+every run in EXPIRY_CACHE_PATH. The next run starts scraping the cached
+expiries right away instead of first loading the page in a discovery browser.
+The first worker page reads the date buttons itself and ExpiryCheck corrects
+the run: expiries that were added get scraped as well, expiries that rolled
+off have no button any more and their workers skip them. The checked list is
+written back for the next run.
+
+Expiries before today are dropped when loading; a cache older than
+EXPIRY_CACHE_MAX_AGE hours or written for another page URL is ignored.
+EXPIRY_CACHE=0 always runs the discovery browser.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+import pytz
+
+EXPIRY_CACHE = os.getenv("EXPIRY_CACHE", "1") == "1"
+EXPIRY_CACHE_PATH = os.getenv("EXPIRY_CACHE_PATH",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), ".expiry_cache.json"))
+EXPIRY_CACHE_MAX_AGE = float(os.getenv("EXPIRY_CACHE_MAX_AGE", "72"))  # hours
+EXPIRY_CHECK_TIMEOUT = float(os.getenv("EXPIRY_CHECK_TIMEOUT", "60"))  # seconds to wait for the first page
+
+BERLIN = pytz.timezone('Europe/Berlin')
+
+
+def _expiry_day(text):
+    return datetime.strptime(text, '%d.%m.%Y').date()
+
+
+def load_expiries(url, path=None):
+    """Cached expiry buttons [{'date': '21.11.2025', 'monthly': True}, ...], None without a usable cache"""
+    path = path or EXPIRY_CACHE_PATH
+    try:
+        with open(path, encoding='utf-8') as f:
+            cache = json.load(f)
+        saved_at = datetime.fromisoformat(cache['saved_at'])
+        buttons = cache['expiries']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    now = datetime.now(BERLIN)
+    if cache.get('url') != url or (now - saved_at).total_seconds() > EXPIRY_CACHE_MAX_AGE * 3600:
+        return None
+    try:
+        buttons = [b for b in buttons if _expiry_day(b['date']) >= now.date()]
+    except (ValueError, KeyError, TypeError):
+        return None
+    return buttons or None
+
+
+def save_expiries(url, buttons, path=None):
+    path = path or EXPIRY_CACHE_PATH
+    cache = {'url': url, 'saved_at': datetime.now(BERLIN).isoformat(), 'expiries': buttons}
+    try:
+        # Write to a temp file and rename so a crashed run never leaves half a cache
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=1)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"⚠️ Could not write expiry cache {path}: {e}")
+
+
+class ExpiryCheck:
+    """
+    Compares the cached expiries of a warm-started run with the date buttons
+    of the first page a worker loads. Exactly one worker gets claim() == True;
+    it calls report() with the buttons it read and finish() in any case.
+    """
+
+    def __init__(self, url, cached):
+        self.url = url
+        self.cached = [b['date'] for b in cached]
+        self.live = None
+        self.added = []
+        self.removed = []
+        self._lock = threading.Lock()
+        self._claimed = False
+        self._done = threading.Event()
+
+    def claim(self):
+        with self._lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+    def report(self, buttons):
+        """Record the live expiry buttons, returns the dates missing from the cache"""
+        with self._lock:
+            if self.live is not None:
+                return []
+            self.live = [b['date'] for b in buttons]
+            self.added = [d for d in self.live if d not in self.cached]
+            self.removed = [d for d in self.cached if d not in self.live]
+        if self.added or self.removed:
+            print(f"📅 Expiry check: added {self.added or '-'}, rolled off {self.removed or '-'}")
+        save_expiries(self.url, buttons)
+        return self.added
+
+    def finish(self):
+        self._done.set()
+
+    def wait(self, timeout=EXPIRY_CHECK_TIMEOUT):
+        """True once a worker page checked the cache"""
+        self._done.wait(timeout)
+        return self.live is not None
@@ -0,0 +1,326 @@
+# manage_partitions.py
+"""
+Partition maintenance for options_snapshots (range partitioned by quote_time).
+
+Every run is idempotent:
+  - creates the partitions for the current period and PARTITION_AHEAD periods
+    ahead (rows that already landed in options_snapshots_default for such a
+    period are moved into the new partition)
+  - with --retention-days (or PARTITION_RETENTION_DAYS), detaches partitions
+    whose whole range is older than the window; --drop drops them afterwards
+    and --archive-dir writes each one to <dir>/<partition>.csv.gz first
+
+--migrate converts an existing unpartitioned options_snapshots in place:
+the dependent views/functions are recreated from their live definitions,
+RLS and the realtime publication are restored and all rows are copied into
+the new partitions (one transaction, the old table is dropped at the end).
+
+    python manage_partitions.py                                 # create ahead
+    python manage_partitions.py --retention-days 365 --archive-dir archive --drop
+    python manage_partitions.py --migrate --granularity monthly
+"""
+import argparse
+import gzip
+import os
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+
+from psycopg2 import sql
+
+from db_pool import DATABASE_URL, POOL, without_statement_timeout
+
+PARENT = "options_snapshots"
+DEFAULT_PARTITION = "options_snapshots_default"
+PARTITION_GRANULARITY = os.getenv("PARTITION_GRANULARITY", "monthly")    # monthly | weekly
+PARTITION_AHEAD = int(os.getenv("PARTITION_AHEAD", "3"))                 # periods created in advance
+PARTITION_RETENTION_DAYS = int(os.getenv("PARTITION_RETENTION_DAYS", "0"))  # 0 keeps everything
+
+PARTITIONS_SQL = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    WHERE p.relname = %s AND p.relnamespace = 'public'::regnamespace
+    ORDER BY c.relname;
+    """
+
+BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+# --- Periods ---------------------------------------------------------------
+
+def period_start(day, granularity):
+    if granularity == "weekly":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+def next_period(start, granularity):
+    if granularity == "weekly":
+        return start + timedelta(days=7)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def partition_name(start, granularity):
+    if granularity == "weekly":
+        year, week, _ = start.isocalendar()
+        return f"{PARENT}_p{year}w{week:02d}"
+    return f"{PARENT}_p{start:%Y_%m}"
+
+def periods(first_day, last_day, granularity):
+    """(name, start, end) for every period touching [first_day, last_day]"""
+    start = period_start(first_day, granularity)
+    while start <= last_day:
+        end = next_period(start, granularity)
+        yield partition_name(start, granularity), start, end
+        start = end
+
+
+# --- Catalog ---------------------------------------------------------------
+
+def existing_partitions(cur):
+    """{name: (start, end)} of the range partitions, DEFAULT left out"""
+    cur.execute(PARTITIONS_SQL, (PARENT,))
+    partitions = {}
+    for name, bound in cur.fetchall():
+        match = BOUND_RE.search(bound or "")
+        if match:
+            partitions[name] = tuple(datetime.fromisoformat(b) for b in match.groups())
+    return partitions
+
+def is_partitioned(cur):
+    cur.execute("SELECT relkind FROM pg_class WHERE relname = %s AND relnamespace = 'public'::regnamespace",
+                (PARENT,))
+    row = cur.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+# --- Create ----------------------------------------------------------------
+
+def utc(day):
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+def create_partition(cur, name, start, end):
+    """
+    Create and attach one partition. Rows that already sit in the default
+    partition for this range are moved over first, otherwise ATTACH fails.
+    """
+    ident = sql.Identifier(name)
+    cur.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(ident, sql.Identifier(PARENT)))
+    cur.execute(sql.SQL("""
+        WITH moved AS (
+            DELETE FROM {default} WHERE quote_time >= %s AND quote_time < %s RETURNING *
+        )
+        INSERT INTO {part} SELECT * FROM moved
+        """).format(default=sql.Identifier(DEFAULT_PARTITION), part=ident), (utc(start), utc(end)))
+    moved = cur.rowcount
+    cur.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)")
+                .format(sql.Identifier(PARENT), ident), (utc(start), utc(end)))
+    # Partitions are reachable through the API on their own, only the parent has a read policy
+    cur.execute(sql.SQL("ALTER TABLE {} ENABLE ROW LEVEL SECURITY").format(ident))
+    return moved
+
+def create_ahead(cur, granularity, ahead, today=None):
+    today = today or datetime.now(timezone.utc).date()
+    last_day = today
+    for _ in range(ahead):
+        last_day = next_period(period_start(last_day, granularity), granularity)
+    existing = existing_partitions(cur)
+    taken = list(existing.values())
+    created = []
+    for name, start, end in periods(today, last_day, granularity):
+        # Skip periods already covered, also by partitions of another granularity
+        if name in existing or any(lo < utc(end) and utc(start) < hi for lo, hi in taken):
+            continue
+        moved = create_partition(cur, name, start, end)
+        created.append(name)
+        print(f"  created {name} [{start} .. {end})" + (f", moved {moved} rows from default" if moved else ""))
+    return created
+
+
+# --- Retention -------------------------------------------------------------
+
+def archive_partition(cur, name, archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+        cur.copy_expert(sql.SQL("COPY (SELECT * FROM {} ORDER BY quote_time) TO STDOUT WITH CSV HEADER")
+                        .format(sql.Identifier(name)).as_string(cur), f)
+    return path
+
+def expire_partitions(cur, retention_days, archive_dir=None, drop=False, now=None):
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=retention_days)
+    expired = []
+    for name, (start, end) in sorted(existing_partitions(cur).items(), key=lambda item: item[1]):
+        if end > cutoff:
+            continue
+        if archive_dir:
+            print(f"  archived {name} -> {archive_partition(cur, name, archive_dir)}")
+        cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}")
+                    .format(sql.Identifier(PARENT), sql.Identifier(name)))
+        if drop:
+            cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+        print(f"  {'dropped' if drop else 'detached'} {name} [{start:%Y-%m-%d} .. {end:%Y-%m-%d})")
+        expired.append(name)
+    return expired
+
+
+# --- One-off migration -----------------------------------------------------
+
+# Views that read options_snapshots, directly or through another view,
+# in the order they have to be recreated
+DEPENDENT_VIEWS_SQL = """
+    WITH RECURSIVE deps(oid, depth) AS (
+        SELECT DISTINCT r.ev_class, 1
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid AND d.classid = 'pg_rewrite'::regclass
+        WHERE d.refobjid = %s::regclass AND r.ev_class <> %s::regclass
+        UNION
+        SELECT r.ev_class, deps.depth + 1
+        FROM deps
+        JOIN pg_depend d ON d.refobjid = deps.oid
+        JOIN pg_rewrite r ON r.oid = d.objid AND d.classid = 'pg_rewrite'::regclass
+        WHERE r.ev_class <> deps.oid
+    )
+    SELECT c.relname, pg_get_viewdef(c.oid), max(depth)
+    FROM deps JOIN pg_class c ON c.oid = deps.oid
+    GROUP BY c.oid, c.relname
+    ORDER BY max(depth);
+    """
+
+# Functions returning the table's row type (options_asof)
+DEPENDENT_FUNCTIONS_SQL = """
+    SELECT p.oid::regprocedure::text, pg_get_functiondef(p.oid)
+    FROM pg_proc p
+    WHERE p.prorettype = (SELECT reltype FROM pg_class WHERE oid = %s::regclass);
+    """
+
+POLICIES_SQL = """
+    SELECT policyname, cmd, qual FROM pg_policies
+    WHERE schemaname = 'public' AND tablename = %s;
+    """
+
+PUBLICATIONS_SQL = """
+    SELECT pubname FROM pg_publication_tables WHERE schemaname = 'public' AND tablename = %s;
+    """
+
+INDEXES_SQL = """
+    SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass;
+    """
+
+PARTITIONED_INDEXES = [
+    "CREATE INDEX idx_snapshots_contract ON options_snapshots (expiry_date, option_type, strike, quote_time DESC)",
+    "CREATE INDEX idx_snapshots_quote_time ON options_snapshots (quote_time DESC)",
+]
+
+def migrate(cur, granularity, ahead, keep_legacy=False):
+    legacy = f"{PARENT}_unpartitioned"
+    cur.execute("SELECT min(quote_time), max(quote_time), count(*) FROM options_snapshots")
+    first, last, total = cur.fetchone()
+    print(f"Migrating {total} rows ({first} .. {last}) to {granularity} partitions")
+
+    cur.execute(DEPENDENT_VIEWS_SQL, (PARENT, PARENT))
+    views = cur.fetchall()
+    cur.execute(DEPENDENT_FUNCTIONS_SQL, (PARENT,))
+    functions = cur.fetchall()
+    cur.execute(POLICIES_SQL, (PARENT,))
+    policies = cur.fetchall()
+    cur.execute(PUBLICATIONS_SQL, (PARENT,))
+    publications = [row[0] for row in cur.fetchall()]
+
+    for name, _, _ in reversed(views):
+        cur.execute(sql.SQL("DROP VIEW {}").format(sql.Identifier(name)))
+    for signature, _ in functions:
+        cur.execute(f"DROP FUNCTION {signature}")
+    for pubname in publications:
+        cur.execute(sql.SQL("ALTER PUBLICATION {} DROP TABLE {}")
+                    .format(sql.Identifier(pubname), sql.Identifier(PARENT)))
+
+    # Free the table, constraint and index names for the partitioned table
+    cur.execute(INDEXES_SQL, (PARENT,))
+    for (index,) in cur.fetchall():
+        cur.execute(sql.SQL("ALTER INDEX {} RENAME TO {}")
+                    .format(sql.Identifier(index), sql.Identifier(f"{index}_unpartitioned")))
+    cur.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(PARENT), sql.Identifier(legacy)))
+
+    cur.execute(sql.SQL("""
+        CREATE TABLE {parent} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY RANGE (quote_time)
+        """).format(parent=sql.Identifier(PARENT), legacy=sql.Identifier(legacy)))
+    cur.execute("ALTER TABLE options_snapshots ADD PRIMARY KEY (quote_time, expiry_date, strike, option_type)")
+    for statement in PARTITIONED_INDEXES:
+        cur.execute(statement)
+    cur.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT")
+                .format(sql.Identifier(DEFAULT_PARTITION), sql.Identifier(PARENT)))
+    cur.execute(sql.SQL("ALTER TABLE {} ENABLE ROW LEVEL SECURITY").format(sql.Identifier(DEFAULT_PARTITION)))
+
+    today = datetime.now(timezone.utc).date()
+    first_day = first.astimezone(timezone.utc).date() if first else today
+    for name, start, end in periods(first_day, today, granularity):
+        create_partition(cur, name, start, end)
+    create_ahead(cur, granularity, ahead, today)
+
+    cur.execute(sql.SQL("INSERT INTO {} SELECT * FROM {}").format(sql.Identifier(PARENT), sql.Identifier(legacy)))
+    print(f"  copied {cur.rowcount} rows")
+
+    cur.execute("ALTER TABLE options_snapshots ENABLE ROW LEVEL SECURITY")
+    for policyname, cmd, qual in policies:
+        cur.execute(sql.SQL("CREATE POLICY {} ON {} FOR {} USING ({})").format(
+            sql.Identifier(policyname), sql.Identifier(PARENT), sql.SQL(cmd), sql.SQL(qual or "true")))
+    for signature, definition in functions:
+        cur.execute(definition)
+    for name, definition, _ in views:
+        cur.execute(sql.SQL("CREATE VIEW {} AS ").format(sql.Identifier(name)).as_string(cur) + definition)
+    for pubname in publications:
+        # Changes on the partitions are published as changes on options_snapshots
+        cur.execute(sql.SQL("ALTER PUBLICATION {} ADD TABLE {}")
+                    .format(sql.Identifier(pubname), sql.Identifier(PARENT)))
+        cur.execute(sql.SQL("ALTER PUBLICATION {} SET (publish_via_partition_root = true)")
+                    .format(sql.Identifier(pubname)))
+
+    if not keep_legacy:
+        cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(legacy)))
+    print(f"  recreated {len(views)} views, {len(functions)} functions, {len(policies)} policies")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--granularity", choices=["monthly", "weekly"], default=PARTITION_GRANULARITY)
+    parser.add_argument("--ahead", type=int, default=PARTITION_AHEAD, help="Periods to create in advance")
+    parser.add_argument("--retention-days", type=int, default=PARTITION_RETENTION_DAYS,
+                        help="Detach partitions entirely older than this (0 = keep all)")
+    parser.add_argument("--drop", action="store_true", help="Drop expired partitions instead of only detaching")
+    parser.add_argument("--archive-dir", help="Write expired partitions to <dir>/<name>.csv.gz first")
+    parser.add_argument("--migrate", action="store_true", help="Convert an unpartitioned options_snapshots")
+    parser.add_argument("--keep-legacy", action="store_true", help="Keep the old table after --migrate")
+    args = parser.parse_args()
+
+    if not DATABASE_URL:
+        sys.exit("❌ DATABASE_URL env var not set")
+
+    with POOL.connection() as conn:
+        cur = conn.cursor()
+        # LOCAL: the pooled connection goes back with the server's time zone
+        cur.execute("SET LOCAL TIME ZONE 'UTC'")
+        # Copying the legacy table or archiving a partition runs far beyond the pool's timeout
+        without_statement_timeout(cur)
+        try:
+            if not is_partitioned(cur):
+                if not args.migrate:
+                    sys.exit("❌ options_snapshots is not partitioned yet, run with --migrate first")
+                migrate(cur, args.granularity, args.ahead, args.keep_legacy)
+            else:
+                create_ahead(cur, args.granularity, args.ahead)
+            if args.retention_days:
+                expire_partitions(cur, args.retention_days, args.archive_dir, args.drop)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    print("✅ Partitions up to date")
+
+
+if __name__ == "__main__":
+    main()
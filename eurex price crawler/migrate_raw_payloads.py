@@ -0,0 +1,117 @@
+# migrate_raw_payloads.py
+"""
+One-off migration: move the raw JSON already stored in options_snapshots.raw
+into the compressed cold table options_snapshots_raw and NULL the column.
+
+Runs in batches (one commit per batch) so it can be stopped and restarted;
+rows that were already moved have raw = NULL and are not picked up again.
+Run it once after switching the crawler to RAW_RETENTION=cold, then
+VACUUM FULL options_snapshots (or let autovacuum reclaim space over time).
+
+    python migrate_raw_payloads.py --dry-run
+    python migrate_raw_payloads.py --batch-size 5000
+"""
+import argparse
+import os
+import sys
+import time
+import zlib
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from db_ingest import COLD_RAW_SQL
+from db_pool import DATABASE_URL, POOL, without_statement_timeout
+
+PENDING_SQL = """
+    SELECT count(*), coalesce(sum(pg_column_size(raw)), 0)
+    FROM options_snapshots WHERE raw IS NOT NULL;
+    """
+
+BATCH_SQL = """
+    SELECT quote_time, expiry_date, strike, option_type, raw::text
+    FROM options_snapshots
+    WHERE raw IS NOT NULL
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED;
+    """
+
+CLEAR_SQL = """
+    UPDATE options_snapshots o SET raw = NULL
+    FROM (VALUES %s) AS m (quote_time, expiry_date, strike, option_type)
+    WHERE o.quote_time = m.quote_time
+      AND o.expiry_date = m.expiry_date
+      AND o.strike = m.strike
+      AND o.option_type = m.option_type;
+    """
+
+
+def migrate_batch(cur, batch_size):
+    """Move one batch, returns (rows moved, raw bytes in, compressed bytes out)"""
+    # Finding the next batch scans past every row already moved
+    without_statement_timeout(cur)
+    cur.execute(BATCH_SQL, (batch_size,))
+    rows = cur.fetchall()
+    if not rows:
+        return 0, 0, 0
+
+    cold = []
+    raw_bytes = gz_bytes = 0
+    for quote_time, expiry_date, strike, option_type, raw in rows:
+        data = raw.encode('utf-8')
+        gz = zlib.compress(data)
+        raw_bytes += len(data)
+        gz_bytes += len(gz)
+        cold.append((quote_time, expiry_date, strike, option_type, psycopg2.Binary(gz)))
+
+    execute_values(cur, COLD_RAW_SQL, cold, page_size=1000)
+    execute_values(cur, CLEAR_SQL, [row[:4] for row in rows],
+                   template="(%s::timestamptz, %s::date, %s::numeric, %s::varchar)", page_size=1000)
+    return len(rows), raw_bytes, gz_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true", help="Only report how much raw data would move")
+    args = parser.parse_args()
+
+    if not DATABASE_URL:
+        sys.exit("❌ DATABASE_URL env var not set")
+
+    conn = POOL.getconn()
+    cur = conn.cursor()
+    without_statement_timeout(cur)
+    cur.execute(PENDING_SQL)
+    pending, pending_bytes = cur.fetchone()
+    conn.commit()
+    print(f"{pending} snapshots with raw payloads ({pending_bytes / 1024 / 1024:.1f} MB in options_snapshots)")
+    if args.dry_run or not pending:
+        POOL.putconn(conn)
+        return
+
+    moved = raw_total = gz_total = 0
+    start = time.time()
+    try:
+        while True:
+            n, raw_bytes, gz_bytes = migrate_batch(cur, args.batch_size)
+            if not n:
+                break
+            conn.commit()
+            moved += n
+            raw_total += raw_bytes
+            gz_total += gz_bytes
+            print(f"  moved {moved}/{pending} ({time.time() - start:.0f}s)")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        POOL.putconn(conn)
+
+    ratio = gz_total / raw_total if raw_total else 0
+    print(f"✅ Moved {moved} raw payloads, {raw_total / 1024 / 1024:.1f} MB -> "
+          f"{gz_total / 1024 / 1024:.1f} MB compressed ({ratio:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+# page_profile.py
+"""
+Lean page profile for the Eurex crawler.
+
+Every page the crawler opens routes its requests through one shared
+PageProfile:
+  - images, fonts, media and beacons are aborted
+  - scripts and stylesheets not served by an allowed host (FIRST_PARTY_DOMAINS
+    plus PAGE_PROFILE_ALLOW_HOSTS: trackers, the cookiescript banner, ...) are
+    aborted; the first abort of each host in a run is logged, so a lean page
+    that lost a bundle the table needs shows up in the crawl log
+  - first-party JS/CSS bundles are served from an on-disk cache keyed by URL,
+    revalidated with the stored ETag once they are older than ASSET_CACHE_TTL
+  - everything else (documents and xhr/fetch data from any host, 'other')
+    goes to the network untouched
+
+Which hosts the live page loads from has not been recorded yet. Every run
+adds the hosts it saw, with their resource types and how often they were
+blocked, to page_hosts.json in the cache directory; a PAGE_PROFILE=full run
+lists everything the page requests.
+
+mb_from_cache is measured. An aborted request has no size, so the blocked
+bytes are only known for URLs a full profile run has seen (their
+Content-Length, blocked_sizes.json); mb_blocked is 'unknown' as soon as one
+blocked request was never sized.
+
+PAGE_PROFILE=full turns routing off and loads the site as before.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+PAGE_PROFILE = os.getenv("PAGE_PROFILE", "lean")
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join(os.path.dirname(__file__), ".asset_cache"))
+ASSET_CACHE_TTL = int(os.getenv("ASSET_CACHE_TTL", str(6 * 3600)))  # seconds before revalidating
+
+BLOCKED_RESOURCE_TYPES = {'image', 'font', 'media', 'texttrack', 'eventsource', 'websocket', 'manifest', 'ping'}
+CACHED_RESOURCE_TYPES = {'script', 'stylesheet'}
+# The table's data, never blocked whatever host serves it
+DATA_RESOURCE_TYPES = {'document', 'xhr', 'fetch'}
+# Aborts of these are logged the first time per host and run
+LOGGED_RESOURCE_TYPES = {'script', 'xhr', 'fetch'}
+FIRST_PARTY_DOMAINS = ('eurex.com', 'deutsche-boerse.com') + tuple(
+    h.strip() for h in os.getenv("PAGE_PROFILE_ALLOW_HOSTS", "").split(",") if h.strip())
+
+
+def _host(url):
+    return urlparse(url).hostname or ''
+
+
+class PageProfile:
+    def __init__(self, mode=PAGE_PROFILE, cache_dir=ASSET_CACHE_DIR, cache_ttl=ASSET_CACHE_TTL):
+        self.enabled = mode == "lean"
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    # --- stats ------------------------------------------------------------
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {
+                'requests_blocked': 0,
+                'requests_blocked_unsized': 0,
+                'cache_hits': 0,
+                'cache_revalidated': 0,
+                'cache_misses': 0,
+                'bytes_from_cache': 0,
+                'bytes_blocked': 0,      # of the blocked requests with a known size
+                'bytes_downloaded': 0,
+                'time_to_table': [],
+            }
+            self._hosts = {}         # host -> resource type -> [requests, blocked] of this run
+            self._sizes = None       # blocked_sizes.json, loaded on first use
+            self._sizes_changed = False
+
+    def _add(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def record_time_to_table(self, seconds):
+        with self._lock:
+            self.stats['time_to_table'].append(seconds)
+
+    def summary(self):
+        with self._lock:
+            timings = sorted(self.stats['time_to_table'])
+            summary = {k: v for k, v in self.stats.items() if k != 'time_to_table'}
+            summary['hosts'] = len(self._hosts)
+        summary['profile'] = 'lean' if self.enabled else 'full'
+        summary['mb_from_cache'] = round(summary['bytes_from_cache'] / 1024 / 1024, 2)
+        summary['mb_blocked'] = ('unknown' if summary['requests_blocked_unsized']
+                                 else round(summary['bytes_blocked'] / 1024 / 1024, 2))
+        if timings:
+            summary['time_to_table_median_s'] = round(timings[len(timings) // 2], 2)
+            summary['time_to_table_max_s'] = round(timings[-1], 2)
+        return summary
+
+    # --- routing decisions ------------------------------------------------
+
+    def classify(self, request):
+        """'block', 'cache' or 'pass' for a request"""
+        host = _host(request.url)
+        first_party = any(host == d or host.endswith('.' + d) for d in FIRST_PARTY_DOMAINS)
+        if request.resource_type in BLOCKED_RESOURCE_TYPES:
+            return 'block'
+        if request.resource_type in DATA_RESOURCE_TYPES:
+            return 'pass'
+        if not first_party:
+            return 'block'
+        if request.resource_type in CACHED_RESOURCE_TYPES and request.method == 'GET':
+            return 'cache'
+        return 'pass'
+
+    def _note_host(self, request, blocked):
+        """Count the request for its host, call with the lock held; True the first time a host is blocked"""
+        host = _host(request.url)
+        types = self._hosts.setdefault(host, {})
+        first_block = blocked and not any(counts[1] for counts in types.values())
+        counts = types.setdefault(request.resource_type, [0, 0])
+        counts[0] += 1
+        counts[1] += blocked
+        return first_block
+
+    # --- blocked requests -------------------------------------------------
+
+    def _sizes_path(self):
+        return os.path.join(self.cache_dir, 'blocked_sizes.json')
+
+    def _hosts_path(self):
+        return os.path.join(self.cache_dir, 'page_hosts.json')
+
+    def _blocked_sizes(self):
+        """{url: bytes}, call with the lock held"""
+        if self._sizes is None:
+            try:
+                with open(self._sizes_path(), encoding='utf-8') as f:
+                    self._sizes = json.load(f)
+            except (OSError, ValueError):
+                self._sizes = {}
+        return self._sizes
+
+    def _count_blocked(self, request):
+        with self._lock:
+            self.stats['requests_blocked'] += 1
+            size = self._blocked_sizes().get(request.url)
+            if size is None:
+                self.stats['requests_blocked_unsized'] += 1
+            else:
+                self.stats['bytes_blocked'] += size
+            first_block = self._note_host(request, blocked=True)
+        if first_block and request.resource_type in LOGGED_RESOURCE_TYPES:
+            print(f"⚠️ Lean profile blocked {request.resource_type} from {_host(request.url)}: {request.url} "
+                  f"(PAGE_PROFILE_ALLOW_HOSTS if the table needs it)")
+
+    def _count_passed(self, request):
+        with self._lock:
+            self._note_host(request, blocked=False)
+
+    def record_response(self, response):
+        """Full profile: note the host and remember the size of a response the lean profile would block"""
+        with self._lock:
+            self._note_host(response.request, blocked=False)
+        try:
+            size = int(response.headers.get('content-length', ''))
+        except ValueError:
+            return
+        if self.classify(response.request) != 'block':
+            return
+        with self._lock:
+            sizes = self._blocked_sizes()
+            if sizes.get(response.url) != size:
+                sizes[response.url] = size
+                self._sizes_changed = True
+
+    def save_observed(self):
+        """Merge this run's hosts into page_hosts.json and write the sizes recorded by the full profile"""
+        with self._lock:
+            hosts = {h: {t: list(c) for t, c in types.items()} for h, types in self._hosts.items()}
+            sizes = dict(self._sizes) if self._sizes_changed else None
+            self._sizes_changed = False
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if hosts:
+                known = self._load_json(self._hosts_path())
+                for host, types in hosts.items():
+                    for resource_type, (requests, blocked) in types.items():
+                        entry = known.setdefault(host, {}).setdefault(resource_type,
+                                                                      {'requests': 0, 'blocked': 0})
+                        entry['requests'] += requests
+                        entry['blocked'] += blocked
+                self._write_json(self._hosts_path(), known)
+            if sizes is not None:
+                self._write_json(self._sizes_path(), sizes)
+        except OSError as e:
+            print(f"⚠️ Could not write page profile state to {self.cache_dir}: {e}")
+
+    @staticmethod
+    def _load_json(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_json(path, data):
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+    # --- disk cache -------------------------------------------------------
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + '.json'), os.path.join(self.cache_dir, key + '.body')
+
+    def load(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def store(self, url, status, headers, body):
+        if status != 200:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta_path, body_path = self._paths(url)
+        meta = {
+            'url': url,
+            'etag': headers.get('etag'),
+            'content_type': headers.get('content-type'),
+            'stored_at': time.time(),
+        }
+        # Write to temp files and rename so parallel browsers never read half a file
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(body_path + suffix, 'wb') as f:
+            f.write(body)
+        with open(meta_path + suffix, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(body_path + suffix, body_path)
+        os.replace(meta_path + suffix, meta_path)
+
+    def touch(self, url, meta):
+        meta_path, _ = self._paths(url)
+        meta = dict(meta, stored_at=time.time())
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(meta_path + suffix, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + suffix, meta_path)
+
+    def _is_fresh(self, meta):
+        return time.time() - meta.get('stored_at', 0) < self.cache_ttl
+
+    def _serve_cached(self, meta, body, revalidated):
+        self._add('cache_revalidated' if revalidated else 'cache_hits')
+        self._add('bytes_from_cache', len(body))
+        headers = {'content-type': meta['content_type']} if meta.get('content_type') else {}
+        return dict(status=200, headers=headers, body=body)
+
+    # --- route handlers ---------------------------------------------------
+
+    def handle(self, route):
+        """Route handler for sync_playwright pages"""
+        request = route.request
+        action = self.classify(request)
+        if action == 'block':
+            self._count_blocked(request)
+            return route.abort()
+        self._count_passed(request)
+        if action == 'pass':
+            return route.continue_()
+
+        meta, body = self.load(request.url)
+        if meta and self._is_fresh(meta):
+            return route.fulfill(**self._serve_cached(meta, body, revalidated=False))
+
+        headers = dict(request.headers)
+        if meta and meta.get('etag'):
+            headers['if-none-match'] = meta['etag']
+        response = route.fetch(headers=headers)
+        if response.status == 304 and meta:
+            self.touch(request.url, meta)
+            return route.fulfill(**self._serve_cached(meta, body, revalidated=True))
+
+        fetched = response.body()
+        self._add('cache_misses')
+        self._add('bytes_downloaded', len(fetched))
+        self.store(request.url, response.status, response.headers, fetched)
+        return route.fulfill(response=response, body=fetched)
+
+    async def handle_async(self, route):
+        """Route handler for async_playwright pages, same logic as handle"""
+        request = route.request
+        action = self.classify(request)
+        if action == 'block':
+            self._count_blocked(request)
+            return await route.abort()
+        self._count_passed(request)
+        if action == 'pass':
+            return await route.continue_()
+
+        meta, body = self.load(request.url)
+        if meta and self._is_fresh(meta):
+            return await route.fulfill(**self._serve_cached(meta, body, revalidated=False))
+
+        headers = dict(request.headers)
+        if meta and meta.get('etag'):
+            headers['if-none-match'] = meta['etag']
+        response = await route.fetch(headers=headers)
+        if response.status == 304 and meta:
+            self.touch(request.url, meta)
+            return await route.fulfill(**self._serve_cached(meta, body, revalidated=True))
+
+        fetched = await response.body()
+        self._add('cache_misses')
+        self._add('bytes_downloaded', len(fetched))
+        self.store(request.url, response.status, response.headers, fetched)
+        return await route.fulfill(response=response, body=fetched)
+
+    def apply(self, page_or_context):
+        if self.enabled:
+            page_or_context.route("**/*", self.handle)
+        else:
+            page_or_context.on("response", self.record_response)
+
+    async def apply_async(self, page_or_context):
+        if self.enabled:
+            await page_or_context.route("**/*", self.handle_async)
+        else:
+            page_or_context.on("response", self.record_response)
+
+
+# Shared by every browser the crawler launches
+PROFILE = PageProfile()
@@ -0,0 +1,154 @@
+# parquet_archive.py
+"""
+Local Parquet archive of every crawl, for research and backtests without
+querying options_snapshots over the network.
+
+Each prepared batch (db_ingest.prepare_df output) is appended as new files to
+a hive-partitioned dataset:
+
+    <PARQUET_ARCHIVE_DIR>/scrape_date=2025-11-03/expiry_date=2025-11-21/<HHMM>-<id>-0.parquet
+
+with typed columns (timestamps in UTC, float64 prices, int64 counts).
+read_history() loads a date range and/or a set of contracts; the filter is
+pushed down to the partition directories and the Parquet row groups, and
+only the requested columns are read.
+
+    from parquet_archive import read_history
+    df = read_history(start='2025-11-01', end='2025-11-07', option_type='CALL',
+                      columns=['quote_time', 'strike', 'bid', 'ask'])
+"""
+import os
+import uuid
+from datetime import date, datetime, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+PARQUET_ARCHIVE_DIR = os.getenv("PARQUET_ARCHIVE_DIR",
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive", "options"))
+
+ARCHIVE_SCHEMA = pa.schema([
+    ('quote_time', pa.timestamp('us', tz='UTC')),
+    ('crawl_time', pa.timestamp('us', tz='UTC')),
+    ('scrape_date', pa.date32()),
+    ('expiry_date', pa.date32()),
+    ('monthly_weekly', pa.string()),
+    ('option_type', pa.string()),
+    ('strike', pa.float64()),
+    ('last_trade', pa.float64()),
+    ('open_price', pa.float64()),
+    ('high_price', pa.float64()),
+    ('low_price', pa.float64()),
+    ('daily_settlement', pa.float64()),
+    ('open_interest', pa.int64()),
+    ('volume', pa.int64()),
+    ('last_price', pa.float64()),
+    ('bid', pa.float64()),
+    ('ask', pa.float64()),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('scrape_date', pa.date32()), ('expiry_date', pa.date32())]),
+    flavor='hive',
+)
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def archive_prepared(df, base_dir=None, crawl_time=None):
+    """
+    Append a prepared DataFrame (columns as in options_snapshots, plus the
+    scraped 'date') to the archive. Rows without quote_time or expiry_date
+    are left out. crawl_time should be the one the database rows get, so
+    the archive joins options_snapshots (now if not given). Returns the
+    number of rows written.
+    """
+    base_dir = base_dir or PARQUET_ARCHIVE_DIR
+    df = df[df['quote_time'].notna() & df['expiry_date'].notna()]
+    if df.empty:
+        return 0
+
+    df = df.assign(
+        scrape_date=[_as_date(d) for d in df['date']],
+        crawl_time=crawl_time or datetime.now(timezone.utc),
+    )
+    table = pa.Table.from_pandas(df[ARCHIVE_SCHEMA.names], schema=ARCHIVE_SCHEMA, preserve_index=False)
+
+    # One set of new files per call, named by quote time so a day's files sort
+    stamp = df['quote_time'].iloc[0].strftime('%H%M')
+    ds.write_dataset(
+        table, base_dir, format='parquet', partitioning=PARTITIONING,
+        basename_template=f"{stamp}-{uuid.uuid4().hex[:8]}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    return table.num_rows
+
+
+def open_archive(base_dir=None):
+    return ds.dataset(base_dir or PARQUET_ARCHIVE_DIR, format='parquet',
+                      schema=ARCHIVE_SCHEMA, partitioning=PARTITIONING)
+
+
+def history_filter(start=None, end=None, expiry_dates=None, option_type=None, strikes=None, contracts=None):
+    """
+    Dataset filter for read_history, None when nothing is filtered.
+
+    start/end: scrape dates (inclusive), contracts: (expiry_date, option_type, strike) tuples
+    """
+    parts = []
+    if start is not None:
+        parts.append(ds.field('scrape_date') >= _as_date(start))
+    if end is not None:
+        parts.append(ds.field('scrape_date') <= _as_date(end))
+    if expiry_dates is not None:
+        parts.append(ds.field('expiry_date').isin([_as_date(d) for d in expiry_dates]))
+    if option_type is not None:
+        parts.append(ds.field('option_type') == option_type)
+    if strikes is not None:
+        parts.append(ds.field('strike').isin([float(s) for s in strikes]))
+    if contracts:
+        match = None
+        for expiry_date, contract_type, strike in contracts:
+            one = ((ds.field('expiry_date') == _as_date(expiry_date))
+                   & (ds.field('option_type') == contract_type)
+                   & (ds.field('strike') == float(strike)))
+            match = one if match is None else match | one
+        # The expiry list lets whole partition directories be skipped
+        parts.append(ds.field('expiry_date').isin(sorted({_as_date(c[0]) for c in contracts})))
+        parts.append(match)
+
+    expression = None
+    for part in parts:
+        expression = part if expression is None else expression & part
+    return expression
+
+
+# Counts stay integers when some are missing (as prepare_df's Int64)
+_PANDAS_TYPES = {pa.int64(): pd.Int64Dtype()}
+
+def read_history(start=None, end=None, expiry_dates=None, option_type=None, strikes=None, contracts=None,
+                 columns=None, base_dir=None):
+    """
+    Load archived snapshots as a DataFrame sorted by quote_time.
+
+    Only the partitions and row groups matching the filter are read, and only
+    `columns` (all columns by default).
+    """
+    base_dir = base_dir or PARQUET_ARCHIVE_DIR
+    if not os.path.isdir(base_dir):
+        return ARCHIVE_SCHEMA.empty_table().to_pandas(types_mapper=_PANDAS_TYPES.get)
+
+    dataset = open_archive(base_dir)
+    table = dataset.to_table(
+        columns=columns,
+        filter=history_filter(start, end, expiry_dates, option_type, strikes, contracts),
+    )
+    df = table.to_pandas(types_mapper=_PANDAS_TYPES.get)
+    if 'quote_time' in df.columns:
+        df = df.sort_values('quote_time', kind='stable').reset_index(drop=True)
+    return df
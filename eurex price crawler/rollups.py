@@ -0,0 +1,180 @@
+# rollups.py
+"""
+Hourly and daily OHLC bars per contract, derived from options_snapshots.
+
+options_bars_1h holds one bar per (UTC hour, expiry_date, option_type, strike)
+with open/high/low/close of bid, ask, mid ((bid+ask)/2) and last_price, plus
+the last daily_settlement, open_interest and volume of the hour.
+options_bars_1d rolls the hourly bars up to Berlin trading days.
+
+The samples of a bar are the contracts every crawl observed: the snapshots
+written in the hour plus, for the crawls sealed by the delta ingest
+(options_crawls), the unchanged snapshot each observed contract was still on
+(options_snapshot_ranges). With DELTA_INGEST=1 an unchanged contract writes
+no snapshot but still counts as a sample of every crawl that saw it.
+
+Bars are recomputed (not merged) for the hours/days a crawl touched, so a
+re-ingested snapshot with corrected values gives the same bars as a clean
+load. db_ingest calls refresh_for_crawl once per crawl, after its last
+write; this script backfills a range from the existing history:
+
+    python rollups.py --start 2025-10-01 --end 2025-11-01
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytz
+
+from db_pool import DATABASE_URL, POOL, without_statement_timeout
+
+BERLIN = pytz.timezone('Europe/Berlin')
+SERIES = ('bid', 'ask', 'mid', 'last')
+LAST_VALUES = ('daily_settlement', 'open_interest', 'volume')
+KEY = "expiry_date, option_type, strike"
+
+BAR_COLUMNS = ", ".join(
+    [f"{s}_{part}" for s in SERIES for part in ('open', 'high', 'low', 'close')]
+    + list(LAST_VALUES) + ['samples', 'first_quote_time', 'last_quote_time']
+)
+
+def _first(expr, order):
+    return f"(array_agg({expr} ORDER BY {order}) FILTER (WHERE {expr} IS NOT NULL))[1]"
+
+def _last(expr, order):
+    return f"(array_agg({expr} ORDER BY {order} DESC) FILTER (WHERE {expr} IS NOT NULL))[1]"
+
+def _upsert():
+    updates = ",\n      ".join(f"{c} = EXCLUDED.{c}" for c in BAR_COLUMNS.split(", "))
+    return f"""
+    ON CONFLICT (bucket, {KEY}) DO UPDATE SET
+      {updates},
+      updated_at = NOW();
+    """
+
+# Hourly bars from the observed samples: written snapshots, and the snapshot
+# a sealed delta crawl saw unchanged stamped with that crawl's quote_time.
+# UNION drops a written snapshot that its own crawl also observes.
+HOURLY_AGGREGATES = ",\n      ".join(
+    [f"{_first(s, 'quote_time')}, max({s}), min({s}), {_last(s, 'quote_time')}" for s in SERIES]
+    + [_last(v, 'quote_time') for v in LAST_VALUES]
+    + ["count(*)", "min(quote_time)", "max(quote_time)"]
+)
+
+HOURLY_SQL = f"""
+    INSERT INTO options_bars_1h (bucket, {KEY}, {BAR_COLUMNS})
+    SELECT date_trunc('hour', quote_time), {KEY},
+      {HOURLY_AGGREGATES}
+    FROM (
+        SELECT {KEY}, quote_time, daily_settlement, open_interest, volume,
+               bid, ask, (bid + ask) / 2 AS mid, last_price AS last
+        FROM (
+            SELECT {KEY}, quote_time, daily_settlement, open_interest, volume, bid, ask, last_price
+            FROM options_snapshots
+            WHERE quote_time >= %(start)s AND quote_time < %(end)s {{expiry_filter}}
+            UNION
+            SELECT s.expiry_date, s.option_type, s.strike, c.quote_time,
+                   s.daily_settlement, s.open_interest, s.volume, s.bid, s.ask, s.last_price
+            FROM options_crawls c
+            JOIN options_snapshot_ranges r
+              ON r.expiry_date = c.expiry_date AND r.quote_time <= c.quote_time AND r.last_seen >= c.quote_time
+            JOIN options_snapshots s
+              ON s.expiry_date = r.expiry_date AND s.option_type = r.option_type
+             AND s.strike = r.strike AND s.quote_time = r.quote_time
+            WHERE c.quote_time >= %(start)s AND c.quote_time < %(end)s {{crawl_expiry_filter}}
+        ) observed
+    ) s
+    GROUP BY 1, {KEY}
+    {_upsert()}"""
+
+# Daily bars from the hourly ones (Berlin calendar days)
+DAILY_AGGREGATES = ",\n      ".join(
+    [f"{_first(f'{s}_open', 'bucket')}, max({s}_high), min({s}_low), {_last(f'{s}_close', 'bucket')}"
+     for s in SERIES]
+    + [_last(v, 'bucket') for v in LAST_VALUES]
+    + ["sum(samples)", "min(first_quote_time)", "max(last_quote_time)"]
+)
+
+DAILY_SQL = f"""
+    INSERT INTO options_bars_1d (bucket, {KEY}, {BAR_COLUMNS})
+    SELECT date_trunc('day', bucket AT TIME ZONE 'Europe/Berlin') AT TIME ZONE 'Europe/Berlin', {KEY},
+      {DAILY_AGGREGATES}
+    FROM options_bars_1h
+    WHERE bucket >= %(start)s AND bucket < %(end)s {{expiry_filter}}
+    GROUP BY 1, {KEY}
+    {_upsert()}"""
+
+
+def hour_range(first, last):
+    """[start, end) of the UTC hours containing first .. last"""
+    start = first.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    end = last.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    return start, end
+
+def day_range(first, last):
+    """[start, end) of the Berlin days containing first .. last"""
+    start = BERLIN.localize(datetime.combine(first.astimezone(BERLIN).date(), datetime.min.time()))
+    end_day = last.astimezone(BERLIN).date() + timedelta(days=1)
+    end = BERLIN.localize(datetime.combine(end_day, datetime.min.time()))
+    return start, end
+
+def refresh_bars(cur, first, last, expiries=None):
+    """Recompute the hourly and daily bars covering quote times first .. last"""
+    params = {'expiries': expiries}
+    expiry_filter = "AND expiry_date = ANY(%(expiries)s::date[])" if expiries else ""
+
+    crawl_expiry_filter = "AND c.expiry_date = ANY(%(expiries)s::date[])" if expiries else ""
+
+    start, end = hour_range(first, last)
+    cur.execute(HOURLY_SQL.format(expiry_filter=expiry_filter, crawl_expiry_filter=crawl_expiry_filter),
+                dict(params, start=start, end=end))
+    hourly = cur.rowcount
+
+    start, end = day_range(first, last)
+    cur.execute(DAILY_SQL.format(expiry_filter=expiry_filter), dict(params, start=start, end=end))
+    return hourly, cur.rowcount
+
+def refresh_for_crawl(cur, stamps):
+    """Bars for the hours/days and expiries of one crawl, stamps = {expiry_date: quote_time}"""
+    if not stamps:
+        return 0, 0
+    return refresh_bars(cur, min(stamps.values()), max(stamps.values()), sorted(stamps))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", help="First day (YYYY-MM-DD), default: first snapshot")
+    parser.add_argument("--end", help="Last day (YYYY-MM-DD, inclusive), default: last snapshot")
+    args = parser.parse_args()
+
+    if not DATABASE_URL:
+        sys.exit("❌ DATABASE_URL env var not set")
+
+    with POOL.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT min(quote_time), max(quote_time) FROM options_snapshots")
+        first, last = cur.fetchone()
+        if first is None:
+            print("No snapshots to roll up")
+            return
+        if args.start:
+            first = BERLIN.localize(datetime.strptime(args.start, '%Y-%m-%d'))
+        if args.end:
+            last = BERLIN.localize(datetime.strptime(args.end, '%Y-%m-%d') + timedelta(days=1)) - timedelta(seconds=1)
+
+        # One Berlin day per transaction keeps each statement small
+        day = first.astimezone(BERLIN).date()
+        while day <= last.astimezone(BERLIN).date():
+            day_start = BERLIN.localize(datetime.combine(day, datetime.min.time()))
+            day_end = BERLIN.localize(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+            without_statement_timeout(cur)
+            hourly, daily = refresh_bars(cur, day_start, day_end - timedelta(seconds=1))
+            conn.commit()
+            print(f"  {day}: {hourly} hourly, {daily} daily bars")
+            day += timedelta(days=1)
+        cur.close()
+    print("✅ Backfill done")
+
+
+if __name__ == "__main__":
+    main()
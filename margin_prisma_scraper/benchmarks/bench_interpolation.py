@@ -0,0 +1,68 @@
+"""
+Benchmark: estimator requests saved by MARGIN_INTERPOLATE and the error of the
+interpolated margins, replaying a Margin_Result.txt of a full run as the
+estimator.
+
+Every series of the file is priced through price_with_interpolation; the
+interpolated rows are compared with the margins the estimator returned for
+them. Reports requests, validated and fallback gaps, the error distribution
+per field and how many interpolated margins are outside the tolerance.
+
+    python benchmarks/bench_interpolation.py --results Margin_Result.txt --step 4
+"""
+import argparse
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import margin_interpolation
+from margin_interpolation import price_with_interpolation
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Margin_Result.txt')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", default=RESULTS_PATH, help="Margin_Result.txt of a full run")
+    parser.add_argument("--step", type=int, default=margin_interpolation.MARGIN_INTERP_STEP)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    margin_interpolation.MARGIN_INTERP_STEP = args.step
+
+    df = pd.read_csv(args.results, sep='\t').reset_index(drop=True)
+    series = [{'iid': iid, 'contract_date': int(row.contract_date), 'call_put_flag': row.call_put_flag,
+               'exercise_price': float(row.exercise_price)} for iid, row in enumerate(df.itertuples())]
+    truth = {iid: {'iid': iid, 'initial_margin': row.initial_margin, 'component_margin': None,
+                   'premium_margin': row.premium_margin} for iid, row in enumerate(df.itertuples())}
+
+    stats = {}
+    results = price_with_interpolation(series, lambda batch: [truth[s['iid']] for s in batch], stats)
+
+    interpolated = [r for r in results if r['source'] == 'interpolated']
+    print(f"\n{len(series)} series, {stats['requests']} requests ({stats['requests'] / len(series):.1%}), "
+          f"{len(interpolated)} interpolated, {len(series) - len(results)} not priced")
+    print(f"groups {stats['groups']}, gaps validated {stats['validated_gaps']}, priced in full "
+          f"{stats['fallback_gaps']} ({stats['failed_checks']} failed checks), "
+          f"worst check error {stats['worst_check_error']}x tolerance")
+    print(f"\n{'field':<16}{'mean abs EUR':>14}{'p99 abs EUR':>13}{'max abs EUR':>13}{'max rel':>9}"
+          f"{'over tol':>10}")
+    for field in margin_interpolation.CHECKED_FIELDS:
+        errors = np.array([abs(r[field] - truth[r['iid']][field]) for r in interpolated])
+        relative = np.array([abs(r[field] - truth[r['iid']][field]) / max(abs(truth[r['iid']][field]), 1e-9)
+                             for r in interpolated])
+        if not len(errors):
+            continue
+        over = sum(error > margin_interpolation._tolerance(truth[r['iid']][field])
+                   for error, r in zip(errors, interpolated))
+        print(f"{field:<16}{errors.mean():>14.2f}{np.percentile(errors, 99):>13.2f}{errors.max():>13.2f}"
+              f"{relative.max():>9.2%}{over:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark: chunked margin requests (process_etds_chunked) vs the continuous
+AIMD pipeline (process_etds_pipelined) vs the asyncio engine
+(process_etds_async) against a local stand-in for the Prisma estimator.
+
+The stand-in answers POST /estimator after a log-normal latency around
+--latency-ms; above --capacity concurrent requests the latency grows with the
+queue and above 2x --capacity it answers 429, like a rate-limited gateway.
+--error-rate adds random 503s. Reports items/s, requests sent, 429s and the
+concurrency the pipeline settled on.
+
+    python benchmarks/bench_pipeline.py --series 2000 --latency-ms 150 --capacity 30
+    python benchmarks/bench_pipeline.py --designs chunked aimd async --capacity 200
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import margin_downloader
+from margin_downloader import MarginDownloader
+
+
+class FakeEstimator:
+    def __init__(self, latency_ms, capacity, error_rate, seed=1):
+        self.latency = latency_ms / 1000
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.active = 0
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/"
+
+    def start(self):
+        estimator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real gateway
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status, payload = estimator.answer(json.loads(body))
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def answer(self, request):
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            active = self.active
+            latency = self.random.lognormvariate(0, 0.5) * self.latency
+            failed = self.random.random() < self.error_rate
+        try:
+            if active > 2 * self.capacity:
+                with self._lock:
+                    self.throttled += 1
+                return 429, {'message': 'Too Many Requests'}
+            # Requests beyond capacity queue behind the others
+            time.sleep(latency * max(1.0, active / self.capacity))
+            if failed:
+                return 503, {'message': 'Service Unavailable'}
+            iid = request['portfolio_components'][0]['etd_portfolio'][0]['iid']
+            return 200, {'portfolio_margin': [{'initial_margin': 1000.0 + iid % 97}],
+                         'drilldowns': [{'component_margin': 900.0, 'premium_margin': 100.0 + iid % 13}]}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=int, default=150)
+    parser.add_argument("--capacity", type=int, default=30, help="Concurrent requests served without queueing")
+    parser.add_argument("--error-rate", type=float, default=0.005, help="Share of requests answered with a 503")
+    parser.add_argument("--designs", nargs="+", choices=['chunked', 'aimd', 'async'],
+                        default=['chunked', 'aimd'])
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    etd_list = [{'line_no': 1, 'iid': iid, 'net_ls_balance': -1} for iid in range(args.series)]
+
+    runs = []
+    for design in args.designs:
+        estimator = FakeEstimator(args.latency_ms, args.capacity, args.error_rate).start()
+        try:
+            downloader = MarginDownloader("benchmark")
+            downloader.url_base = estimator.url
+            margin_downloader.MARGIN_PIPELINE = design
+            downloader.process_etds(list(etd_list))
+            run = dict(downloader.last_run, requests=estimator.requests, throttled=estimator.throttled)
+            runs.append(run)
+        finally:
+            estimator.stop()
+
+    print(f"\n{'design':<10}{'priced':>8}{'requests':>10}{'429s':>7}{'items/s':>9}{'time s':>8}  concurrency")
+    for r in runs:
+        concurrency = r.get('concurrency', {})
+        concurrency = (f"target {concurrency['target']} (range {concurrency['lowest']}-{concurrency['highest']}), "
+                       f"decreases {concurrency['decreases']}") if concurrency else "-"
+        print(f"{r['design']:<10}{r['priced']:>8}{r['requests']:>10}{r['throttled']:>7}"
+              f"{r['items_per_s'] or 0:>9}{r['elapsed_s']:>8}  {concurrency}")
+    for r in runs[1:]:
+        if runs[0]['items_per_s']:
+            print(f"{r['design']} vs {runs[0]['design']}: {r['items_per_s'] / runs[0]['items_per_s']:.2f}x items/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# margin_async.py
+"""
+asyncio engine for the Prisma margin estimator (MARGIN_PIPELINE=async).
+
+All ETDs are started as coroutines at once, MARGIN_ASYNC_CONCURRENCY of them
+may have a request outstanding. They share one aiohttp session whose
+connector keeps at most MARGIN_ASYNC_CONNECTIONS keep-alive connections open:
+a coroutine whose request finishes hands its connection to the next waiting
+one without a thread or a new TLS handshake per request.
+
+Every attempt has its own deadline (MARGIN_REQUEST_DEADLINE seconds for
+connecting and for the response, time spent waiting for a free connection
+is not counted). 429, 5xx, timeouts and connection errors are retried up to
+MARGIN_ASYNC_ATTEMPTS times after a full-jitter exponential backoff (at least
+Retry-After). After MARGIN_ASYNC_TIMEOUT seconds the remaining coroutines are
+cancelled and the margins priced so far are returned.
+
+Returns the same iid / initial_margin / component_margin / premium_margin
+records as MarginDownloader.process_etds.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+MARGIN_ASYNC_CONCURRENCY = int(os.getenv("MARGIN_ASYNC_CONCURRENCY", "200"))
+MARGIN_ASYNC_CONNECTIONS = int(os.getenv("MARGIN_ASYNC_CONNECTIONS", "16"))
+MARGIN_REQUEST_DEADLINE = float(os.getenv("MARGIN_REQUEST_DEADLINE", "10"))  # seconds per attempt
+MARGIN_ASYNC_ATTEMPTS = int(os.getenv("MARGIN_ASYNC_ATTEMPTS", "4"))
+MARGIN_ASYNC_TIMEOUT = float(os.getenv("MARGIN_ASYNC_TIMEOUT", "600"))  # seconds for the whole run
+
+BACKOFF_BASE = 0.5  # seconds, doubled per attempt
+BACKOFF_CAP = 20.0
+
+
+def _backoff(attempt: int, retry_after: float) -> float:
+    """Full jitter: uniform in [0, min(cap, base * 2^attempt)], never below Retry-After"""
+    return max(retry_after, random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+
+
+async def _estimate(session: aiohttp.ClientSession, url: str, etd: Dict[str, Any],
+                    timeout: aiohttp.ClientTimeout) -> Tuple[Optional[Dict[str, Any]], str, float]:
+    """One estimator request, returns (result, outcome, retry_after)"""
+    payload = {
+        'portfolio_components': [
+            {'type': 'etd_portfolio', 'etd_portfolio': [etd]}
+        ],
+        'clearing_currency': 'EUR'
+    }
+    try:
+        async with session.post(url, json=payload, timeout=timeout) as response:
+            if response.status == 429 or response.status >= 500:
+                try:
+                    retry_after = float(response.headers.get('Retry-After', 0))
+                except ValueError:
+                    retry_after = 0.0
+                await response.read()  # release the connection for reuse
+                return None, 'throttled' if response.status == 429 else 'server_error', retry_after
+            if response.status != 200:
+                text = await response.text()
+                logging.error(f"API error for ETD {etd['iid']}: Status {response.status}, Response: {text}")
+                return None, 'error', 0.0
+            result = await response.json(content_type=None)
+    except asyncio.TimeoutError:
+        return None, 'timeout', 0.0
+    except aiohttp.ClientError as e:
+        logging.error(f"Request error for ETD {etd['iid']}: {e}")
+        return None, 'connection_error', 0.0
+    except ValueError as e:
+        logging.error(f"JSON decode error for ETD {etd['iid']}: {e}")
+        return None, 'error', 0.0
+
+    try:
+        return {
+            'iid': etd['iid'],
+            'initial_margin': result['portfolio_margin'][0]['initial_margin'],
+            'component_margin': result['drilldowns'][0]['component_margin'],
+            'premium_margin': result['drilldowns'][0]['premium_margin']
+        }, 'ok', 0.0
+    except (KeyError, IndexError, TypeError) as e:
+        logging.error(f"Data structure error for ETD {etd['iid']}: {e}")
+        return None, 'error', 0.0
+
+
+async def _process(url_base: str, api_header: Dict[str, str], etd_list: List[Dict[str, Any]],
+                   concurrency: int, connections: int, deadline: float, attempts: int,
+                   total_timeout: float, stats: Dict[str, Any],
+                   on_result: Optional[Callable[[List[Dict[str, Any]]], None]]) -> List[Dict[str, Any]]:
+    url = f"{url_base}estimator"
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=deadline, sock_read=deadline)
+    slots = asyncio.Semaphore(concurrency)
+    outcomes = Counter()
+    results = []
+
+    async def price(etd):
+        for attempt in range(attempts):
+            async with slots:
+                result, outcome, retry_after = await _estimate(session, url, etd, timeout)
+            outcomes[outcome] += 1
+            if result is not None:
+                results.append(result)
+                if on_result:
+                    on_result([result])
+                return
+            if outcome == 'error':
+                break  # 4xx or a malformed answer, a retry gets the same
+            if attempt < attempts - 1:
+                await asyncio.sleep(_backoff(attempt, retry_after))
+        outcomes['failed'] += 1
+
+    connector = aiohttp.TCPConnector(limit=connections, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector, headers=api_header) as session:
+        tasks = [asyncio.create_task(price(etd)) for etd in etd_list]
+        done, pending = await asyncio.wait(tasks, timeout=total_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logging.warning(f"Margin run hit the {total_timeout:.0f}s timeout, cancelled {len(pending)} ETDs")
+        for task in done:
+            if task.exception():
+                logging.error(f"Margin request task failed: {task.exception()!r}")
+
+    stats['outcomes'] = dict(outcomes)
+    stats['requests'] = sum(v for k, v in outcomes.items() if k != 'failed')
+    stats['cancelled'] = len(pending)
+    return results
+
+
+def process_etds_async(url_base: str, api_header: Dict[str, str], etd_list: List[Dict[str, Any]],
+                       concurrency: int = MARGIN_ASYNC_CONCURRENCY, connections: int = MARGIN_ASYNC_CONNECTIONS,
+                       deadline: float = MARGIN_REQUEST_DEADLINE, attempts: int = MARGIN_ASYNC_ATTEMPTS,
+                       total_timeout: float = MARGIN_ASYNC_TIMEOUT,
+                       stats: Optional[Dict[str, Any]] = None,
+                       on_result: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> List[Dict[str, Any]]:
+    """
+    Price etd_list on an event loop, fills stats with the outcome counts if
+    given. on_result is called with each result as it arrives and must not block.
+    """
+    stats = {} if stats is None else stats
+    start = time.time()
+    results = asyncio.run(_process(url_base, api_header, etd_list, concurrency, connections,
+                                   deadline, attempts, total_timeout, stats, on_result))
+    elapsed = time.time() - start
+    logging.info(f"Completed in {elapsed:.1f}s | Average speed: {len(results) / elapsed if elapsed else 0:.1f} "
+                 f"items/sec | Priced {len(results)}/{len(etd_list)} | Outcomes: {stats['outcomes']}"
+                 f" | Cancelled: {stats['cancelled']}")
+    return results
@@ -0,0 +1,173 @@
+# margin_cache.py
+"""
+Persistent margin cache for margin_downloader.py.
+
+Every priced series is stored in MARGIN_CACHE_PATH keyed by its iid, with the
+margin result, when it was priced and a fingerprint of the series attributes
+returned by the series endpoint. A run only posts a series to the estimator
+when it is
+  - new (no entry for the iid),
+  - changed (the series attributes differ from the cached ones),
+  - stale (priced more than MARGIN_CACHE_TTL hours ago), or
+  - near the money: the strike is within MARGIN_ATM_BAND of the expiry's
+    forward, where the margin moves most with the underlying.
+All other series reuse the cached margin.
+
+The forward of an expiry is taken from the cached premium margins: the
+premium of a short call and a short put of the same strike cross where the
+strike equals the forward (put-call parity). Without cached calls and puts for
+an expiry every series of it is a miss anyway.
+
+Entries of series that are no longer listed are dropped on save.
+MARGIN_CACHE=0 prices every series.
+"""
+import hashlib
+import json
+import logging
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+MARGIN_CACHE = os.getenv("MARGIN_CACHE", "1") == "1"
+MARGIN_CACHE_PATH = os.getenv("MARGIN_CACHE_PATH",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), ".margin_cache.json"))
+MARGIN_CACHE_TTL = float(os.getenv("MARGIN_CACHE_TTL", "20"))  # hours
+MARGIN_ATM_BAND = float(os.getenv("MARGIN_ATM_BAND", "0.03"))  # relative distance strike / forward
+
+# Reasons a series is (re)priced, in the order they are checked
+REASONS = ('new', 'changed', 'stale', 'near_money')
+
+
+def series_fingerprint(series):
+    """Hash of the series attributes the margin depends on (everything but the iid)"""
+    attributes = {k: v for k, v in series.items() if k != 'iid'}
+    return hashlib.sha1(json.dumps(attributes, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def expiry_forwards(entries):
+    """{contract_date: forward strike} from the cached premium margins of calls and puts"""
+    premiums = defaultdict(dict)  # (contract_date, strike) -> {'C': .., 'P': ..}
+    for entry in entries.values():
+        if entry.get('premium_margin') is None:
+            continue
+        premiums[(entry['contract_date'], entry['exercise_price'])][entry['call_put_flag']] = \
+            abs(entry['premium_margin'])
+
+    crossings = {}  # contract_date -> (|call - put|, strike)
+    for (contract_date, strike), sides in premiums.items():
+        if 'C' not in sides or 'P' not in sides:
+            continue
+        gap = abs(sides['C'] - sides['P'])
+        if contract_date not in crossings or gap < crossings[contract_date][0]:
+            crossings[contract_date] = (gap, strike)
+    return {contract_date: strike for contract_date, (_, strike) in crossings.items()}
+
+
+class MarginCache:
+    def __init__(self, path=None, ttl_hours=MARGIN_CACHE_TTL, atm_band=MARGIN_ATM_BAND, enabled=MARGIN_CACHE):
+        self.path = path or MARGIN_CACHE_PATH
+        self.ttl = ttl_hours * 3600
+        self.atm_band = atm_band
+        self.enabled = enabled
+        self.entries = self._load() if enabled else {}
+        self.stats = Counter()
+
+    def _load(self):
+        """{str(iid): entry}, empty without a usable cache file"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                cache = json.load(f)
+            entries = cache['entries']
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def plan(self, list_series):
+        """
+        Split the listed series into (to_price, cached_results): the series
+        that have to be posted to the estimator and the cached margin results
+        of all others, in the shape call_margin_api returns.
+        """
+        now = datetime.now(timezone.utc)
+        forwards = expiry_forwards(self.entries)
+        to_price, cached = [], []
+        self.stats = Counter(series=len(list_series))
+        for series in list_series:
+            reason = self._reason(series, self.entries.get(str(series['iid'])), forwards, now)
+            if reason:
+                self.stats[reason] += 1
+                to_price.append(series)
+            else:
+                self.stats['hits'] += 1
+                entry = self.entries[str(series['iid'])]
+                cached.append({'iid': series['iid'], 'initial_margin': entry['initial_margin'],
+                               'component_margin': entry['component_margin'],
+                               'premium_margin': entry['premium_margin']})
+        return to_price, cached
+
+    def _reason(self, series, entry, forwards, now):
+        if not self.enabled or entry is None:
+            return 'new'
+        if entry.get('fingerprint') != series_fingerprint(series):
+            return 'changed'
+        try:
+            age = (now - datetime.fromisoformat(entry['priced_at'])).total_seconds()
+        except (KeyError, TypeError, ValueError):
+            return 'stale'
+        if age > self.ttl:
+            return 'stale'
+        forward = forwards.get(series.get('contract_date'))
+        strike = series.get('exercise_price')
+        if forward and strike is not None and abs(strike / forward - 1) <= self.atm_band:
+            return 'near_money'
+        return None
+
+    def fallback(self, series):
+        """Cached result of a series whose repricing failed, None if it was never priced"""
+        entry = self.entries.get(str(series['iid']))
+        if not entry or entry.get('fingerprint') != series_fingerprint(series):
+            return None
+        self.stats['fallbacks'] += 1
+        return {'iid': series['iid'], 'initial_margin': entry['initial_margin'],
+                'component_margin': entry['component_margin'], 'premium_margin': entry['premium_margin']}
+
+    def update(self, series_by_iid, results):
+        """Store freshly priced results"""
+        priced_at = datetime.now(timezone.utc).isoformat()
+        for result in results:
+            series = series_by_iid[result['iid']]
+            self.entries[str(result['iid'])] = {
+                'iid': result['iid'],
+                'contract_date': series.get('contract_date'),
+                'call_put_flag': series.get('call_put_flag'),
+                'exercise_price': series.get('exercise_price'),
+                'fingerprint': series_fingerprint(series),
+                'priced_at': priced_at,
+                'initial_margin': result['initial_margin'],
+                'component_margin': result['component_margin'],
+                'premium_margin': result['premium_margin'],
+            }
+
+    def save(self, listed_iids):
+        """Write the entries of the listed series, delisted series are dropped"""
+        if not self.enabled:
+            return
+        listed = {str(iid) for iid in listed_iids}
+        entries = {iid: entry for iid, entry in self.entries.items() if iid in listed}
+        cache = {'saved_at': datetime.now(timezone.utc).isoformat(), 'entries': entries}
+        try:
+            # Write to a temp file and rename so a crashed run never leaves half a cache
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(cache, f)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as e:
+            logging.warning(f"Could not write margin cache {self.path}: {e}")
+
+    def summary(self):
+        series = self.stats['series']
+        requested = sum(self.stats[r] for r in REASONS)
+        summary = {'series': series, 'hits': self.stats['hits'], 'requested': requested}
+        summary.update({r: self.stats[r] for r in REASONS})
+        summary['fallbacks'] = self.stats['fallbacks']
+        summary['hit_rate'] = round(self.stats['hits'] / series, 3) if series else None
+        return summary
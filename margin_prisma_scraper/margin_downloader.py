@@ -1,14 +1,14 @@
 import requests
 import json
-import datetime
 import pandas as pd
 import concurrent.futures
+import heapq
 import time
-from typing import List, Dict, Any
+from collections import Counter, deque
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 import os
-import psycopg2
-from psycopg2.extras import execute_values
+import sys
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from dotenv import load_dotenv
@@ -16,6 +16,23 @@ from dotenv import load_dotenv
 # Load environment variables from parent directory's .env file
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'eurex price crawler', '.env'))
 
+# Shared connection pool lives next to the crawler's database code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eurex price crawler'))
+from db_pool import POOL
+from margin_cache import MarginCache
+from margin_interpolation import MARGIN_INTERPOLATE, price_with_interpolation
+from margin_pipeline import AIMDController, TokenBucket, MARGIN_MAX_IN_FLIGHT
+from margin_store import MarginWriter, margin_frame, write_margins
+
+# aimd: continuous pipeline with adaptive concurrency, async: asyncio engine (margin_async),
+# chunked: fixed chunks with a pause between them
+MARGIN_PIPELINE = os.getenv("MARGIN_PIPELINE", "aimd")
+# Write margins to the database while they are priced (margin_store.MarginWriter)
+MARGIN_STREAM = os.getenv("MARGIN_STREAM", "1") == "1"
+# Seconds after which no new estimator requests are started, so the run finishes
+# (cache, Margin_Result.txt, last writes) inside the workflow's 15 minute timeout
+MARGIN_RUN_BUDGET = float(os.getenv("MARGIN_RUN_BUDGET", "720"))
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -30,24 +47,30 @@ class MarginDownloader:
     def __init__(self, api_key: str):
         self.url_base = "https://api.developer.deutsche-boerse.com/prod/prisma-margin-estimator-2-0/2.0.0/"
         self.api_header = {"X-DBP-APIKEY": api_key}
+        self.last_run = {}
+        self.on_results = None   # called with each batch of results as it arrives
+        self.deadline = None     # time.monotonic() after which no new requests are started
         self.session = self._create_session()
+        # The pipeline has to see 429s and 5xx to adjust its concurrency, so no status retries here
+        self.pipeline_session = self._create_session(retry_status=False, pool_size=MARGIN_MAX_IN_FLIGHT)
 
-    def _create_session(self) -> requests.Session:
+    def _create_session(self, retry_status: bool = True, pool_size: int = 25) -> requests.Session:
         """Create a session with retry mechanism and proper connection pooling"""
         session = requests.Session()
         retry_strategy = Retry(
             total=3,
             backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504]
+            status_forcelist=[429, 500, 502, 503, 504] if retry_status else []
         )
         # Increase max pool size and configure connection pooling
         adapter = HTTPAdapter(
             max_retries=retry_strategy,
-            pool_connections=25,  # Base pool size
-            pool_maxsize=25,      # Max pool size
-            pool_block=True       # Block when pool is full instead of discarding
+            pool_connections=pool_size,  # Base pool size
+            pool_maxsize=pool_size,      # Max pool size
+            pool_block=True              # Block when pool is full instead of discarding
         )
         session.mount("https://", adapter)
+        session.mount("http://", adapter)
         return session
 
     def get_series(self, product: str = 'ODAX') -> Dict[str, Any]:
@@ -118,7 +141,175 @@ class MarginDownloader:
                 logging.error(f"Data structure error for ETD {etd['iid']}: {e}")
                 return None
 
+    def _estimate(self, etd: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], str, float, float]:
+        """
+        One estimator request without retries, for the pipeline.
+        Returns (result, outcome, latency, retry_after) with outcome one of
+        ok, throttled (429), server_error (5xx), timeout, error.
+        """
+        start = time.perf_counter()
+        try:
+            response = self.pipeline_session.post(
+                f"{self.url_base}estimator",
+                headers=self.api_header,
+                json={
+                    'portfolio_components': [
+                        {'type': 'etd_portfolio', 'etd_portfolio': [etd]}
+                    ],
+                    'clearing_currency': 'EUR'
+                },
+                timeout=10
+            )
+        except requests.exceptions.Timeout:
+            return None, 'timeout', time.perf_counter() - start, 0.0
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Request error for ETD {etd['iid']}: {e}")
+            return None, 'error', time.perf_counter() - start, 0.0
+        latency = time.perf_counter() - start
+
+        if response.status_code == 429 or response.status_code >= 500:
+            try:
+                retry_after = float(response.headers.get('Retry-After', 0))
+            except ValueError:
+                retry_after = 0.0
+            return None, 'throttled' if response.status_code == 429 else 'server_error', latency, retry_after
+        if response.status_code != 200:
+            logging.error(f"API error for ETD {etd['iid']}: Status {response.status_code}, Response: {response.text}")
+            return None, 'error', latency, 0.0
+        try:
+            result = response.json()
+            return {
+                'iid': etd['iid'],
+                'initial_margin': result['portfolio_margin'][0]['initial_margin'],
+                'component_margin': result['drilldowns'][0]['component_margin'],
+                'premium_margin': result['drilldowns'][0]['premium_margin']
+            }, 'ok', latency, 0.0
+        except (json.JSONDecodeError, KeyError, IndexError) as e:
+            logging.error(f"Bad response for ETD {etd['iid']}: {e}. Raw response: {response.text[:200]}...")
+            return None, 'error', latency, 0.0
+
+    def _emit(self, results: List[Dict[str, Any]]):
+        if self.on_results and results:
+            self.on_results(results)
+
+    def _out_of_time(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
     def process_etds(self, etd_list: List[Dict[str, Any]], max_workers: int = 15) -> List[Dict[str, Any]]:
+        """Price all ETDs with the design selected by MARGIN_PIPELINE"""
+        if MARGIN_PIPELINE == "chunked":
+            return self.process_etds_chunked(etd_list, max_workers)
+        if MARGIN_PIPELINE == "async":
+            return self.process_etds_async(etd_list)
+        return self.process_etds_pipelined(etd_list)
+
+    def process_etds_async(self, etd_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Price all ETDs with the asyncio engine, hundreds of requests over a few keep-alive connections"""
+        # aiohttp is only needed for this engine
+        from margin_async import MARGIN_ASYNC_TIMEOUT, process_etds_async
+
+        stats = {}
+        start_total = time.time()
+        kwargs = {}
+        if self.deadline is not None:
+            kwargs['total_timeout'] = max(0.0, min(MARGIN_ASYNC_TIMEOUT, self.deadline - time.monotonic()))
+        result_list = process_etds_async(self.url_base, self.api_header, etd_list, stats=stats,
+                                         on_result=self.on_results, **kwargs)
+        total_time = time.time() - start_total
+        self.last_run = dict(stats, design='async', items=len(etd_list), priced=len(result_list),
+                             elapsed_s=round(total_time, 2),
+                             items_per_s=round(len(result_list) / total_time, 1) if total_time else None)
+        return result_list
+
+    def process_etds_pipelined(self, etd_list: List[Dict[str, Any]], max_attempts: int = 3,
+                               retry_delay: float = 2.0) -> List[Dict[str, Any]]:
+        """
+        Keep controller.target requests in flight on one long-lived pool,
+        starting the next request as soon as one completes (see margin_pipeline)
+        """
+        controller = AIMDController()
+        bucket = TokenBucket()
+        pending = deque(sorted(etd_list, key=lambda x: x['iid']))
+        retries = []      # heap of (not_before, seq, etd, attempt)
+        in_flight = {}    # future -> (etd, attempt, epoch)
+        result_list = []
+        outcomes = Counter()
+        seq = 0
+        total_items = len(etd_list)
+        start_total = last_log = time.time()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=controller.maximum) as executor:
+            while pending or retries or in_flight:
+                if self._out_of_time() and (pending or retries):
+                    outcomes['out_of_time'] += len(pending) + len(retries)
+                    logging.warning(f"Run budget used up, {len(pending) + len(retries)} ETDs not requested")
+                    pending.clear()
+                    retries.clear()
+                    if not in_flight:
+                        break
+                # Fill the window, due retries first
+                while len(in_flight) < controller.target:
+                    if retries and retries[0][0] <= time.monotonic():
+                        _, _, etd, attempt = heapq.heappop(retries)
+                    elif pending:
+                        etd, attempt = pending.popleft(), 1
+                    else:
+                        break
+                    bucket.acquire()
+                    future = executor.submit(self._estimate, etd)
+                    in_flight[future] = (etd, attempt, controller.epoch)
+
+                if not in_flight:
+                    # Only retries waiting for their backoff
+                    time.sleep(max(0.0, retries[0][0] - time.monotonic()))
+                    continue
+
+                done, _ = concurrent.futures.wait(in_flight, timeout=1.0,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                batch = []
+                for future in done:
+                    etd, attempt, epoch = in_flight.pop(future)
+                    result, outcome, latency, retry_after = future.result()
+                    outcomes[outcome] += 1
+                    if outcome == 'ok':
+                        controller.on_success(latency, epoch)
+                        batch.append(result)
+                        continue
+                    if outcome in ('throttled', 'server_error', 'timeout'):
+                        controller.on_congestion(outcome, epoch)
+                    if attempt < max_attempts:
+                        seq += 1
+                        not_before = time.monotonic() + max(retry_after, retry_delay * attempt)
+                        heapq.heappush(retries, (not_before, seq, etd, attempt + 1))
+                    else:
+                        outcomes['failed'] += 1
+                        logging.error(f"Giving up on ETD {etd['iid']} after {attempt} attempts ({outcome})")
+                result_list.extend(batch)
+                self._emit(batch)
+
+                if time.time() - last_log >= 10:
+                    last_log = time.time()
+                    logging.info(f"Progress: {len(result_list) / total_items:.1%} | In flight: {len(in_flight)}"
+                                 f"/{controller.target} | Items/sec: "
+                                 f"{len(result_list) / (last_log - start_total):.1f} | Outcomes: {dict(outcomes)}")
+
+        total_time = time.time() - start_total
+        self.last_run = {
+            'design': 'aimd',
+            'items': total_items,
+            'priced': len(result_list),
+            'elapsed_s': round(total_time, 2),
+            'items_per_s': round(len(result_list) / total_time, 1) if total_time else None,
+            'requests': sum(v for k, v in outcomes.items() if k not in ('failed', 'out_of_time')),
+            'outcomes': dict(outcomes),
+            'concurrency': controller.summary(),
+        }
+        logging.info(f"Completed in {total_time:.1f}s | Average speed: {self.last_run['items_per_s']} items/sec | "
+                     f"Priced {len(result_list)}/{total_items} | Outcomes: {dict(outcomes)} | "
+                     f"Concurrency: {controller.summary()}")
+        return result_list
+
+    def process_etds_chunked(self, etd_list: List[Dict[str, Any]], max_workers: int = 15) -> List[Dict[str, Any]]:
         """Process ETDs with highly optimized parallel execution and dynamic chunking"""
         result_list = []
         initial_chunk_size = 100
@@ -161,6 +352,9 @@ class MarginDownloader:
         start_total = time.time()
         
         while items_processed < total_items:
+            if self._out_of_time():
+                logging.warning(f"Run budget used up, {total_items - items_processed} ETDs not requested")
+                break
             chunk = etd_list[items_processed:items_processed + current_chunk_size]
             chunk_start = time.time()
             
@@ -170,6 +364,7 @@ class MarginDownloader:
             
             chunk_results = process_chunk(chunk)
             result_list.extend(chunk_results)
+            self._emit(chunk_results)
             
             # Calculate metrics
             chunk_time = time.time() - chunk_start
@@ -201,8 +396,15 @@ class MarginDownloader:
                 time.sleep(delay)
         
         total_time = time.time() - start_total
-        logging.info(f"Completed in {total_time:.1f}s | Average speed: {total_items/total_time:.1f} items/sec | "
-                    f"Final success rate: {success_count/total_count:.2%}")
+        self.last_run = {
+            'design': 'chunked',
+            'items': total_items,
+            'priced': len(result_list),
+            'elapsed_s': round(total_time, 2),
+            'items_per_s': round(len(result_list) / total_time, 1) if total_time else None,
+        }
+        logging.info(f"Completed in {total_time:.1f}s | Average speed: {items_processed/total_time:.1f} items/sec | "
+                    f"Final success rate: {success_count/max(total_count, 1):.2%}")
         
         return result_list
 
@@ -213,59 +415,30 @@ def save_to_database(df: pd.DataFrame) -> bool:
     This function:
     1. Converts contract_date from YYYYMMDD to a proper date
     2. Converts call_put_flag from C/P to CALL/PUT
-    3. Upserts the data (insert or update if exists)
+    3. Merges the data with COPY, rows whose margins did not change are not
+       rewritten (see margin_store)
     """
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
+    if not os.environ.get('DATABASE_URL'):
         logging.error("DATABASE_URL not found in environment variables")
         return False
 
+    conn = None
     try:
-        conn = psycopg2.connect(database_url)
+        conn = POOL.getconn()
         cursor = conn.cursor()
-
-        # Prepare data for insertion
-        records = []
-        for _, row in df.iterrows():
-            # Convert YYYYMMDD to YYYY-MM-DD date
-            contract_str = str(int(row['contract_date']))
-            expiry_date = f"{contract_str[:4]}-{contract_str[4:6]}-{contract_str[6:8]}"
-
-            # Convert C/P to CALL/PUT
-            option_type = 'CALL' if row['call_put_flag'] == 'C' else 'PUT'
-
-            records.append((
-                expiry_date,
-                option_type,
-                float(row['exercise_price']),
-                float(row['initial_margin']) if pd.notna(row['initial_margin']) else None,
-                float(row['premium_margin']) if pd.notna(row['premium_margin']) else None,
-            ))
-
-        # Upsert query - insert or update on conflict
-        upsert_sql = """
-            INSERT INTO option_margins (expiry_date, option_type, strike, initial_margin, premium_margin, updated_at)
-            VALUES %s
-            ON CONFLICT (expiry_date, option_type, strike)
-            DO UPDATE SET
-                initial_margin = EXCLUDED.initial_margin,
-                premium_margin = EXCLUDED.premium_margin,
-                updated_at = NOW()
-        """
-
-        # Add updated_at to each record
-        records_with_timestamp = [r + (datetime.datetime.now(datetime.timezone.utc),) for r in records]
-
-        execute_values(cursor, upsert_sql, records_with_timestamp)
+        frame = margin_frame(df)
+        changed = write_margins(cursor, frame)
         conn.commit()
 
-        logging.info(f"Successfully saved {len(records)} margin records to database")
+        logging.info(f"Successfully saved {len(frame)} margin records to database ({changed} inserted or changed)")
         cursor.close()
-        conn.close()
+        POOL.putconn(conn)
         return True
 
     except Exception as e:
         logging.error(f"Error saving to database: {e}", exc_info=True)
+        if conn is not None:
+            POOL.putconn(conn, close=True)
         return False
 
 
@@ -274,26 +447,72 @@ def main():
         # Initialize downloader
         api_key = os.environ.get('PRISMA_API_KEY', 'd73a57e8-de0f-44a9-9c5b-819049743ba6')
         downloader = MarginDownloader(api_key)
+        downloader.deadline = time.monotonic() + MARGIN_RUN_BUDGET
         
         # Get series data
         logging.info("Fetching series data...")
         series = downloader.get_series()
         
-        # Prepare ETD list
+        list_series = series['list_series']
+        logging.info(f"Found {len(list_series)} ODAX products")
+
+        # Only new, changed, stale and near-the-money series go to the estimator
+        cache = MarginCache()
+        to_price, result_list = cache.plan(list_series)
         etd_list = [
             {'line_no': 1, 'iid': product['iid'], 'net_ls_balance': -1}
-            for product in series['list_series']
+            for product in to_price
         ]
         
-        logging.info(f"Found {len(etd_list)} ODAX products")
-        
+        # Results go to the database in batches while the rest is still being priced
+        writer = None
+        if MARGIN_STREAM and os.environ.get('DATABASE_URL'):
+            writer = MarginWriter({product['iid']: product for product in list_series}).start()
+            writer.put(result_list)
+            downloader.on_results = writer.put
+
         # Process ETDs
-        logging.info("Starting margin calculation...")
-        result_list = downloader.process_etds(etd_list)
+        logging.info(f"Starting margin calculation for {len(etd_list)} series "
+                     f"({len(result_list)} served from the margin cache)...")
+        if MARGIN_INTERPOLATE and etd_list:
+            # Price a sample of the strikes per expiry/type, interpolate the rest
+            priced = price_with_interpolation(to_price, lambda batch: downloader.process_etds([
+                {'line_no': 1, 'iid': product['iid'], 'net_ls_balance': -1} for product in batch
+            ]))
+        else:
+            priced = downloader.process_etds(etd_list) if etd_list else []
+        # Only estimator results are cached, interpolated margins are recomputed every run
+        cache.update({product['iid']: product for product in to_price},
+                     [result for result in priced if result.get('source', 'computed') == 'computed'])
+        result_list.extend(priced)
+
+        # A failed repricing keeps the last known margin of the series
+        priced_iids = {result['iid'] for result in priced}
+        late = [result for result in priced if result.get('source') == 'interpolated']
+        for product in to_price:
+            if product['iid'] not in priced_iids:
+                fallback = cache.fallback(product)
+                if fallback:
+                    result_list.append(fallback)
+                    late.append(fallback)
+        if writer:
+            # Estimator results were written as they arrived
+            writer.put(late)
+            writer.close()
+
+        cache.save(product['iid'] for product in list_series)
+        stats = cache.summary()
+        logging.info(f"Margin cache: {stats['hits']}/{stats['series']} hits "
+                     f"({stats['hit_rate'] or 0:.1%}) | requested {stats['requested']} "
+                     f"(new {stats['new']}, changed {stats['changed']}, stale {stats['stale']}, "
+                     f"near the money {stats['near_money']}) | fallbacks {stats['fallbacks']}")
         
         # Convert to DataFrames
         data_odax = pd.json_normalize(series, record_path=['list_series'])
         margin_result = pd.DataFrame(result_list)
+        if 'source' not in margin_result:
+            margin_result['source'] = 'computed'
+        margin_result['source'] = margin_result['source'].fillna('computed')
         
         # Merge results
         merged_result = data_odax.merge(margin_result, on="iid")
@@ -307,7 +526,8 @@ def main():
             "call_put_flag",
             "exercise_price",
             "initial_margin",
-            "premium_margin"
+            "premium_margin",
+            "source"
         ]]
         
         # Save results to text file (backup)
@@ -315,10 +535,21 @@ def main():
         logging.info("Results saved to Margin_Result.txt")
 
         # Save to database for the dashboard
-        if save_to_database(merged_result):
+        if writer and writer.saved_all:
+            logging.info("Results were saved to the database while pricing")
+        elif writer:
+            # Rows the writer could not save: the merge skips the ones it did
+            logging.warning(f"Margin writer left {writer.stats['unsaved']} results unsaved, "
+                            f"saving the full result set")
+            if save_to_database(merged_result):
+                logging.info("Results saved to database")
+            else:
+                logging.warning("Failed to save to database - check DATABASE_URL environment variable")
+        elif save_to_database(merged_result):
             logging.info("Results also saved to database")
         else:
             logging.warning("Failed to save to database - check DATABASE_URL environment variable")
+        logging.info(f"Database pool: {POOL.summary()}")
 
     except Exception as e:
         logging.error(f"An error occurred: {e}", exc_info=True)
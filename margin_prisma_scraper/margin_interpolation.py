@@ -0,0 +1,213 @@
+# margin_interpolation.py
+"""
+Price a sampled subset of the strike grid and interpolate the rest
+(MARGIN_INTERPOLATE=1).
+
+Within one expiry and call/put flag the initial margin is almost flat and the
+premium margin is a smooth function of the strike, so most strikes can be
+interpolated from their neighbours. Per expiry/type group:
+
+  1. Sample: the outermost strikes and every MARGIN_INTERP_STEP-th strike.
+  2. Refine: where the second divided differences of the sampled margins
+     bound the linear interpolation error (|f''| * h^2 / 8) above the
+     tolerance, price the middle strike of the gap as well. Repeated up to
+     MARGIN_INTERP_ROUNDS times, so the samples get denser where the curve
+     bends (around the money) and stay sparse in the linear wings.
+  3. Validate every gap: price the strike nearest the middle of each gap
+     between priced strikes and compare it with the linear interpolation
+     between the gap's ends. If it is off by more than
+     max(MARGIN_INTERP_REL_TOL * |margin|, MARGIN_INTERP_ABS_TOL EUR), or
+     its request failed, every strike of that gap is priced.
+  4. Interpolate the remaining strikes linearly between the priced ones.
+
+Every result carries source = 'computed' (priced by the estimator) or
+'interpolated'. Groups with fewer than MARGIN_INTERP_MIN_STRIKES strikes are
+priced in full. Strikes outside the range of priced strikes (their edge
+request failed) are not extrapolated, strikes of a failed gap whose own
+request failed are not interpolated.
+"""
+import logging
+import math
+import os
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+MARGIN_INTERPOLATE = os.getenv("MARGIN_INTERPOLATE", "0") == "1"
+MARGIN_INTERP_STEP = int(os.getenv("MARGIN_INTERP_STEP", "4"))
+MARGIN_INTERP_ROUNDS = int(os.getenv("MARGIN_INTERP_ROUNDS", "3"))
+MARGIN_INTERP_REL_TOL = float(os.getenv("MARGIN_INTERP_REL_TOL", "0.01"))
+MARGIN_INTERP_ABS_TOL = float(os.getenv("MARGIN_INTERP_ABS_TOL", "5"))  # EUR
+MARGIN_INTERP_MIN_STRIKES = int(os.getenv("MARGIN_INTERP_MIN_STRIKES", "10"))
+
+FIELDS = ('initial_margin', 'component_margin', 'premium_margin')
+CHECKED_FIELDS = ('initial_margin', 'premium_margin')  # the ones stored in option_margins
+
+
+def _tolerance(value):
+    return max(MARGIN_INTERP_REL_TOL * abs(value), MARGIN_INTERP_ABS_TOL)
+
+
+def _values(result, field):
+    value = result.get(field)
+    return float(value) if value is not None else math.nan
+
+
+class _Group:
+    """Series of one expiry and call/put flag, sorted by strike"""
+
+    def __init__(self, series):
+        self.series = sorted(series, key=lambda s: s['exercise_price'])
+        self.strikes = [float(s['exercise_price']) for s in self.series]
+        self.results = {}  # index -> computed result
+        self.blocked = set()  # indices that must not be interpolated
+
+    def knots(self):
+        indices = sorted(self.results)
+        return indices, np.array([self.strikes[i] for i in indices])
+
+    def interpolate(self, index, field):
+        indices, strikes = self.knots()
+        values = np.array([_values(self.results[i], field) for i in indices])
+        return float(np.interp(self.strikes[index], strikes, values))
+
+    def inside(self, index):
+        indices, _ = self.knots()
+        return bool(indices) and indices[0] < index < indices[-1]
+
+    def between(self, left, right, index, field):
+        """Linear interpolation of field at index from the results at left and right"""
+        x0, x1 = self.strikes[left], self.strikes[right]
+        y0, y1 = _values(self.results[left], field), _values(self.results[right], field)
+        return y0 + (y1 - y0) * (self.strikes[index] - x0) / (x1 - x0)
+
+    def gaps(self):
+        """(left, right, check) per gap between priced strikes, check = the strike nearest its middle"""
+        indices, strikes = self.knots()
+        gaps = []
+        for k in range(len(indices) - 1):
+            left, right = indices[k], indices[k + 1]
+            if right - left < 2:
+                continue
+            middle = (strikes[k] + strikes[k + 1]) / 2
+            gaps.append((left, right, min(range(left + 1, right), key=lambda i: abs(self.strikes[i] - middle))))
+        return gaps
+
+    def refinements(self):
+        """Middle strikes of the gaps whose linear interpolation error bound exceeds the tolerance"""
+        indices, strikes = self.knots()
+        picks = []
+        for k in range(len(indices) - 1):
+            left, right = indices[k], indices[k + 1]
+            if right - left < 2:
+                continue
+            h = strikes[k + 1] - strikes[k]
+            for field in CHECKED_FIELDS:
+                values = [_values(self.results[i], field) for i in indices]
+                curvature = 0.0
+                # Second divided differences of the neighbouring knot triples
+                for a in (k - 1, k):
+                    if a < 0 or a + 2 >= len(indices):
+                        continue
+                    x0, x1, x2 = strikes[a], strikes[a + 1], strikes[a + 2]
+                    y0, y1, y2 = values[a], values[a + 1], values[a + 2]
+                    second = 2 * ((y2 - y1) / (x2 - x1) - (y1 - y0) / (x1 - x0)) / (x2 - x0)
+                    if not math.isnan(second):
+                        curvature = max(curvature, abs(second))
+                if curvature * h * h / 8 > _tolerance((values[k] + values[k + 1]) / 2):
+                    picks.append((left + right) // 2)
+                    break
+        return picks
+
+
+def price_with_interpolation(to_price: List[Dict[str, Any]],
+                             price: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+                             stats: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    """
+    Margins of the series in to_price (series records of the series
+    endpoint), pricing only part of them with price(series) -> results.
+    """
+    stats = {} if stats is None else stats
+    counts = Counter()
+    groups = defaultdict(list)
+    for series in to_price:
+        groups[(series.get('contract_date'), series.get('call_put_flag'))].append(series)
+    groups = [_Group(series) for series in groups.values()]
+
+    def run(requests):
+        """Price (group, index) pairs in one batch, results land in group.results"""
+        if not requests:
+            return
+        by_iid = {group.series[i]['iid']: (group, i) for group, i in requests}
+        counts['requests'] += len(requests)
+        for result in price([group.series[i] for group, i in requests]):
+            group, i = by_iid[result['iid']]
+            group.results[i] = result
+
+    # 1. Coarse sample (small groups in full)
+    requests = []
+    for group in groups:
+        n = len(group.series)
+        if n < MARGIN_INTERP_MIN_STRIKES:
+            requests += [(group, i) for i in range(n)]
+        else:
+            requests += [(group, i) for i in sorted(set(range(0, n, MARGIN_INTERP_STEP)) | {n - 1})]
+    run(requests)
+
+    # 2. Denser where the margins bend
+    large = [g for g in groups if len(g.series) >= MARGIN_INTERP_MIN_STRIKES]
+    for _ in range(MARGIN_INTERP_ROUNDS):
+        requests = [(group, i) for group in large for i in group.refinements()]
+        if not requests:
+            break
+        run(requests)
+
+    # 3. Check every gap at its middle, price the gaps that fail in full
+    checks = [(group, gap) for group in large for gap in group.gaps()]
+    run([(group, check) for group, (_, _, check) in checks])
+
+    worst = 0.0
+    fallback = []
+    for group, (left, right, check) in checks:
+        failed = check not in group.results
+        if failed:
+            counts['failed_checks'] += 1
+        else:
+            for field in CHECKED_FIELDS:
+                actual = _values(group.results[check], field)
+                error = abs(group.between(left, right, check, field) - actual)
+                worst = max(worst, error / _tolerance(actual))
+                failed = failed or error > _tolerance(actual)
+        if failed:
+            counts['fallback_gaps'] += 1
+            unpriced = [i for i in range(left + 1, right) if i not in group.results]
+            group.blocked.update(unpriced)
+            fallback += [(group, i) for i in unpriced]
+        else:
+            counts['validated_gaps'] += 1
+    run(fallback)
+
+    # 4. Interpolate the rest
+    results = []
+    for group in groups:
+        for i, series in enumerate(group.series):
+            if i in group.results:
+                results.append(dict(group.results[i], source='computed'))
+            elif group.inside(i) and i not in group.blocked:
+                result = {'iid': series['iid'], 'source': 'interpolated'}
+                for field in FIELDS:
+                    value = group.interpolate(i, field)
+                    result[field] = None if math.isnan(value) else value
+                results.append(result)
+                counts['interpolated'] += 1
+
+    stats.update(series=len(to_price), requests=counts['requests'], interpolated=counts['interpolated'],
+                 groups=len(groups), validated_gaps=counts['validated_gaps'],
+                 fallback_gaps=counts['fallback_gaps'], failed_checks=counts['failed_checks'],
+                 worst_check_error=round(worst, 2))  # in units of the tolerance
+    logging.info(f"Interpolation: priced {counts['requests']}/{len(to_price)} series, interpolated "
+                 f"{counts['interpolated']} | gaps validated {counts['validated_gaps']}, priced in full "
+                 f"{counts['fallback_gaps']} ({counts['failed_checks']} failed checks) | "
+                 f"worst check error {worst:.2f}x tolerance")
+    return results
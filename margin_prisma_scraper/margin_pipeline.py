@@ -0,0 +1,107 @@
+# margin_pipeline.py
+"""
+Flow control for the continuous margin request pipeline of margin_downloader.py.
+
+Instead of fixed chunks with a barrier and a sleep after each, the downloader
+keeps AIMDController.target requests in flight at all times on one long-lived
+thread pool and starts the next request as soon as one completes. The target
+follows additive-increase / multiplicative-decrease like TCP congestion
+control:
+  - every successful response adds 1/target (about +1 per round of requests),
+  - a 429, a 5xx, a timeout or a p90 latency above MARGIN_LATENCY_P90 seconds
+    multiplies it by MARGIN_AIMD_DECREASE.
+Congestion signals of requests sent before the last decrease are ignored, so
+one burst of 429s halves the window once and not once per response.
+
+TokenBucket caps the request rate independently at MARGIN_RATE requests/s.
+"""
+import os
+import statistics
+import threading
+import time
+from collections import Counter, deque
+
+MARGIN_INITIAL_IN_FLIGHT = int(os.getenv("MARGIN_INITIAL_IN_FLIGHT", "15"))
+MARGIN_MIN_IN_FLIGHT = int(os.getenv("MARGIN_MIN_IN_FLIGHT", "2"))
+MARGIN_MAX_IN_FLIGHT = int(os.getenv("MARGIN_MAX_IN_FLIGHT", "40"))
+MARGIN_AIMD_DECREASE = float(os.getenv("MARGIN_AIMD_DECREASE", "0.5"))
+MARGIN_LATENCY_P90 = float(os.getenv("MARGIN_LATENCY_P90", "2.0"))  # seconds
+MARGIN_RATE = float(os.getenv("MARGIN_RATE", "100"))  # requests per second, 0 = unlimited
+
+LATENCY_WINDOW = 50  # responses the latency percentile is taken over
+
+
+class TokenBucket:
+    """Blocking rate limiter: `rate` tokens per second, at most `burst` saved up"""
+
+    def __init__(self, rate=MARGIN_RATE, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AIMDController:
+    """Number of requests to keep in flight, adjusted from the outcome of each response"""
+
+    def __init__(self, initial=MARGIN_INITIAL_IN_FLIGHT, minimum=MARGIN_MIN_IN_FLIGHT,
+                 maximum=MARGIN_MAX_IN_FLIGHT, decrease=MARGIN_AIMD_DECREASE, latency_p90=MARGIN_LATENCY_P90):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.latency_p90 = latency_p90
+        self.window = float(min(max(initial, minimum), maximum))
+        self.epoch = 0  # bumped on every decrease
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.all_latencies = []
+        self.decreases = Counter()
+        self.lowest = self.highest = self.window
+
+    @property
+    def target(self):
+        return int(self.window)
+
+    def on_success(self, latency, epoch):
+        self.latencies.append(latency)
+        self.all_latencies.append(latency)
+        if (len(self.latencies) == LATENCY_WINDOW
+                and statistics.quantiles(self.latencies, n=10)[-1] > self.latency_p90):
+            self.on_congestion('latency', epoch)
+            return
+        self.window = min(self.maximum, self.window + 1 / self.window)
+        self.highest = max(self.highest, self.window)
+
+    def on_congestion(self, reason, epoch):
+        """Multiplicative decrease, once per epoch"""
+        if epoch != self.epoch:
+            return
+        self.window = max(self.minimum, self.window * self.decrease)
+        self.lowest = min(self.lowest, self.window)
+        self.epoch += 1
+        self.decreases[reason] += 1
+        # Latencies measured at the old window say nothing about the new one
+        self.latencies.clear()
+
+    def summary(self):
+        summary = {'target': self.target, 'lowest': int(self.lowest), 'highest': int(self.highest),
+                   'decreases': dict(self.decreases)}
+        if len(self.all_latencies) >= 2:
+            deciles = statistics.quantiles(self.all_latencies, n=10)
+            summary['latency_p50_s'] = round(statistics.median(self.all_latencies), 3)
+            summary['latency_p90_s'] = round(deciles[-1], 3)
+        return summary
@@ -0,0 +1,235 @@
+# margin_store.py
+"""
+Set-based persistence of margin results into option_margins.
+
+Results are converted column-wise (YYYYMMDD contract dates to DATE, C/P to
+CALL/PUT), streamed with COPY into a session-local staging table and merged
+with one INSERT ... SELECT ... ON CONFLICT. The merge only touches rows whose
+initial_margin, premium_margin or source changed (IS DISTINCT FROM), so
+updated_at is the time the margin last changed and an unchanged run writes
+no row versions. If the COPY path fails the batch is retried with
+execute_values and the same merge condition.
+
+MarginWriter writes results in batches while the estimator requests are
+still running: every MARGIN_WRITER_BATCH results or MARGIN_WRITER_FLUSH_SECONDS,
+so a run cut off by the workflow timeout keeps what it priced until then.
+A failed flush keeps its results for the next one; saved_all tells the
+caller whether it has to save the full result set itself.
+"""
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List
+
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from db_pool import POOL
+
+MARGIN_WRITER_BATCH = int(os.getenv("MARGIN_WRITER_BATCH", "500"))
+MARGIN_WRITER_FLUSH_SECONDS = float(os.getenv("MARGIN_WRITER_FLUSH_SECONDS", "10"))
+
+MARGIN_COLUMNS = "expiry_date, option_type, strike, initial_margin, premium_margin, source"
+
+STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS option_margins_staging (
+        expiry_date DATE NOT NULL,
+        option_type VARCHAR(4) NOT NULL,
+        strike NUMERIC NOT NULL,
+        initial_margin NUMERIC,
+        premium_margin NUMERIC,
+        source VARCHAR(12) NOT NULL
+    ) ON COMMIT DELETE ROWS;
+    """
+
+# Rows whose margins did not change are left alone
+MERGE_CLAUSE = """
+    ON CONFLICT (expiry_date, option_type, strike)
+    DO UPDATE SET
+        initial_margin = EXCLUDED.initial_margin,
+        premium_margin = EXCLUDED.premium_margin,
+        source = EXCLUDED.source,
+        updated_at = NOW()
+    WHERE option_margins.initial_margin IS DISTINCT FROM EXCLUDED.initial_margin
+       OR option_margins.premium_margin IS DISTINCT FROM EXCLUDED.premium_margin
+       OR option_margins.source IS DISTINCT FROM EXCLUDED.source
+    """
+
+MERGE_SQL = f"""
+    INSERT INTO option_margins ({MARGIN_COLUMNS}, updated_at)
+    SELECT DISTINCT ON (expiry_date, option_type, strike) {MARGIN_COLUMNS}, NOW()
+    FROM option_margins_staging
+    {MERGE_CLAUSE}"""
+
+INSERT_SQL = f"""
+    INSERT INTO option_margins ({MARGIN_COLUMNS}, updated_at)
+    VALUES %s
+    {MERGE_CLAUSE}"""
+
+
+def margin_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """option_margins rows from a frame with contract_date, call_put_flag, exercise_price and the margins"""
+    frame = pd.DataFrame({
+        'expiry_date': pd.to_datetime(df['contract_date'].astype('int64').astype(str), format='%Y%m%d').dt.date,
+        'option_type': df['call_put_flag'].map({'C': 'CALL', 'P': 'PUT'}),
+        'strike': df['exercise_price'].astype(float),
+        'initial_margin': pd.to_numeric(df['initial_margin'], errors='coerce'),
+        'premium_margin': pd.to_numeric(df['premium_margin'], errors='coerce'),
+        'source': df['source'].fillna('computed') if 'source' in df else 'computed',
+    })
+    # Last result wins when a series was priced twice in one batch
+    return frame.drop_duplicates(['expiry_date', 'option_type', 'strike'], keep='last')
+
+
+def copy_margins(cur, frame: pd.DataFrame) -> int:
+    """COPY frame into the staging table and merge it, returns rows inserted or changed"""
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cur.execute(STAGING_SQL)
+    cur.execute("TRUNCATE option_margins_staging")
+    cur.copy_expert(f"COPY option_margins_staging ({MARGIN_COLUMNS}) FROM STDIN WITH (FORMAT csv)", buffer)
+    cur.execute(MERGE_SQL)
+    return cur.rowcount
+
+
+def write_margins(cur, frame: pd.DataFrame) -> int:
+    """Merge frame into option_margins with COPY, execute_values if that fails"""
+    cur.execute("SAVEPOINT margin_copy")
+    try:
+        changed = copy_margins(cur, frame)
+        cur.execute("RELEASE SAVEPOINT margin_copy")
+        return changed
+    except Exception as e:
+        cur.execute("ROLLBACK TO SAVEPOINT margin_copy")
+        logging.warning(f"COPY of margins failed, falling back to INSERT ... VALUES: {e}")
+    records = list(frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None))
+    execute_values(cur, INSERT_SQL, records, page_size=1000)
+    return cur.rowcount
+
+
+_STOP = object()
+
+
+class MarginWriter:
+    """
+    Background writer for margin results (the dicts call_margin_api returns).
+    series maps iid -> series record, for the contract attributes of a result.
+    """
+
+    def __init__(self, series: Dict[Any, Dict[str, Any]], batch=MARGIN_WRITER_BATCH,
+                 flush_seconds=MARGIN_WRITER_FLUSH_SECONDS):
+        self.series = pd.DataFrame.from_records(
+            [{'iid': iid, 'contract_date': s.get('contract_date'), 'call_put_flag': s.get('call_put_flag'),
+              'exercise_price': s.get('exercise_price')} for iid, s in series.items()],
+            columns=['iid', 'contract_date', 'call_put_flag', 'exercise_price'])
+        self.batch = batch
+        self.flush_seconds = flush_seconds
+        # Unbounded: a run is a few thousand small results, producers never wait for the database
+        self.queue = queue.Queue()
+        self.stats = {'received': 0, 'written': 0, 'changed': 0, 'flushes': 0, 'failed_flushes': 0, 'db_s': 0.0}
+        self._pending = []  # received, not written yet (failed flushes are retried)
+        self._finished = False
+        self._thread = threading.Thread(target=self._run, name="margin-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def put(self, results: List[Dict[str, Any]]):
+        if results:
+            self.queue.put(list(results))
+
+    def close(self):
+        """Flush everything still queued and stop the writer thread"""
+        self.queue.put(_STOP)
+        self._thread.join()
+        # Results the writer still held or never got to (after it stopped on an error)
+        unsaved = len(self._pending)
+        while not self.queue.empty():
+            batch = self.queue.get_nowait()
+            if batch is not _STOP:
+                unsaved += len(batch)
+        self.stats['unsaved'] = unsaved
+        self.stats['unchanged'] = self.stats['written'] - self.stats['changed']
+        logging.info(f"Margin writer: {self.stats['written']} results in {self.stats['flushes']} flushes "
+                     f"({self.stats['failed_flushes']} failed), {self.stats['changed']} inserted or changed, "
+                     f"{self.stats['unchanged']} unchanged, {self.stats['unsaved']} not saved, "
+                     f"DB {self.stats['db_s']:.1f}s")
+        return self.stats
+
+    @property
+    def saved_all(self):
+        """True once close() returned and every result made it to the database"""
+        return self._finished and not self._pending
+
+    def _run(self):
+        conn = None
+        last_flush = time.time()
+        try:
+            while True:
+                timeout = max(0.0, self.flush_seconds - (time.time() - last_flush))
+                try:
+                    batch = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    batch = None
+                if batch is _STOP:
+                    break
+                if batch:
+                    self._pending.extend(batch)
+                    self.stats['received'] += len(batch)
+                if self._pending and (len(self._pending) >= self.batch
+                                      or time.time() - last_flush >= self.flush_seconds):
+                    conn = self._flush(conn)
+                    last_flush = time.time()
+                elif not self._pending:
+                    last_flush = time.time()
+            if self._pending:
+                conn = self._flush(conn)
+            self._finished = True
+        except Exception as e:
+            logging.error(f"Margin writer stopped, the remaining results are not saved: {e}", exc_info=True)
+        finally:
+            if conn is not None:
+                POOL.putconn(conn)
+
+    def _flush(self, conn):
+        """
+        Write everything pending. A failed flush keeps its results for the
+        next one; returns the connection to go on with (None to get a new one).
+        """
+        start = time.time()
+        results = self._pending
+        try:
+            # A dropped connection is swapped for a fresh one from the pool
+            if conn is not None and conn.closed:
+                POOL.putconn(conn, close=True)
+                conn = None
+            if conn is None:
+                conn = POOL.getconn()
+            frame = margin_frame(pd.DataFrame(results).merge(self.series, on='iid'))
+            cur = conn.cursor()
+            try:
+                changed = write_margins(cur, frame)
+                conn.commit()
+            finally:
+                cur.close()
+            self._pending = []
+            self.stats['written'] += len(results)
+            self.stats['changed'] += changed
+            self.stats['flushes'] += 1
+        except Exception as e:
+            self.stats['failed_flushes'] += 1
+            logging.error(f"Margin writer flush of {len(results)} results failed, kept for the next flush: {e}")
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    POOL.putconn(conn, close=True)
+                    conn = None
+        finally:
+            self.stats['db_s'] += time.time() - start
+        return conn